@@ -0,0 +1,45 @@
+# 播放地址解密微基准：对比逐条新建 AES 对象（旧实现）、复用解密器逐条解密、decrypt_many 批量解密的单条耗时
+# 用法：python -m benchmarks.decrypt_bench [数量 ...]，默认 10000 100000
+import base64
+import sys
+import time
+from Crypto.Cipher import AES
+from utils.utils import key, decrypt_url, decrypt_many
+
+
+def _make_ciphertexts(count):
+    cipher = AES.new(key, AES.MODE_ECB)
+    ciphertexts = []
+    for i in range(count):
+        data = f'https://aod.cos.tx.xmcdn.com/storages/{i:08x}/audio.m4a?sign={i * 7919:x}&timestamp={i}'.encode()
+        pad_len = 16 - len(data) % 16
+        ciphertexts.append(base64.urlsafe_b64encode(cipher.encrypt(data + bytes([pad_len]) * pad_len)).decode().rstrip('='))
+    return ciphertexts
+
+
+def _legacy_decrypt_url(ciphertext):
+    """旧实现：每次调用都新建 AES 对象，不校验填充"""
+    ciphertext_bytes = base64.urlsafe_b64decode(ciphertext + "==")
+    decrypted = AES.new(key, AES.MODE_ECB).decrypt(ciphertext_bytes)
+    return decrypted[:-decrypted[-1]].decode('utf-8')
+
+
+def _timeit(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def run(count):
+    ciphertexts = _make_ciphertexts(count)
+    legacy_time, expected = _timeit(lambda: [_legacy_decrypt_url(c) for c in ciphertexts])
+    single_time, single = _timeit(lambda: [decrypt_url(c) for c in ciphertexts])
+    batch_time, batch = _timeit(lambda: decrypt_many(ciphertexts))
+    assert single == expected and batch == expected
+    for name, elapsed in (('每次新建AES', legacy_time), ('复用解密器', single_time), ('decrypt_many', batch_time)):
+        print(f'{count:>8} 条  {name:<14} 总计 {elapsed:.3f}s  单条 {elapsed / count * 1e6:.2f}µs')
+
+
+if __name__ == '__main__':
+    for n in [int(arg) for arg in sys.argv[1:]] or [10000, 100000]:
+        run(n)
@@ -0,0 +1,112 @@
+# 下载写入路径基准：在子进程中用 http.server 提供一个本地文件，对比旧实现（iter_content 8KB + 每块一条进度日志）
+# 与 M4ADownloader 的流式路径（预分配缓冲区 readinto + 进度节流）在不同块大小下的吞吐量（MB/s）和每 GB 的 CPU 时间
+# 用法：python -m benchmarks.download_bench [文件大小MB] [--runs 3] [--chunk-sizes 262144 524288 1048576]
+import argparse
+import hashlib
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from downloader.downloader import M4ADownloader
+from utils import http_client
+from utils.rate_limiter import configure_limiter
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _start_server(directory):
+    """在独立进程中启动静态文件服务器，避免服务端开销计入本进程 CPU 时间"""
+    port = _free_port()
+    process = subprocess.Popen([sys.executable, '-m', 'http.server', str(port), '--bind', '127.0.0.1',
+                                '--directory', directory], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f'http://127.0.0.1:{port}'
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(base + '/', timeout=1).close()
+            return process, base
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError('本地 HTTP 服务启动失败')
+
+
+def _null_log(msg, level='info'):
+    pass
+
+
+def _legacy_download(url, output_file, log_func=_null_log):
+    """旧实现：8KB 分块，每块写文件、更新 MD5 并格式化一条进度日志"""
+    response = http_client.get(url, 'cdn', stream=True)
+    response.raise_for_status()
+    total = int(response.headers.get('content-length', 0))
+    md5 = hashlib.md5()
+    downloaded = 0
+    with open(output_file, 'wb') as file:
+        for chunk in response.iter_content(chunk_size=8192):
+            if chunk:
+                file.write(chunk)
+                md5.update(chunk)
+                downloaded += len(chunk)
+                if total > 0:
+                    percent = downloaded * 100 // total
+                    log_func(f"\r下载进度: {percent}% ({downloaded // 1024}KB/{total // 1024}KB)", level='info')
+    return md5.hexdigest()
+
+
+def _measure(func, size, runs):
+    """返回 (最佳 MB/s, 对应的每 GB CPU 秒)"""
+    best = None
+    for _ in range(runs):
+        wall, cpu = time.perf_counter(), time.process_time()
+        func()
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        result = (size / wall / 2 ** 20, cpu * 2 ** 30 / size)
+        if best is None or result[0] > best[0]:
+            best = result
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='下载写入路径基准')
+    parser.add_argument('size_mb', nargs='?', type=int, default=256, help='测试文件大小（MB）')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--chunk-sizes', type=int, nargs='+', default=[256 * 1024, 512 * 1024, 1024 * 1024])
+    args = parser.parse_args(argv)
+
+    # 基准只关心写入路径本身，放开音频 CDN 的请求限速
+    configure_limiter('cdn', rate=1000, burst=1000, max_rate=1000)
+    with tempfile.TemporaryDirectory() as directory:
+        size = args.size_mb * 2 ** 20
+        with open(os.path.join(directory, 'track.m4a'), 'wb') as f:
+            f.write(os.urandom(size))
+        process, base = _start_server(directory)
+        url = base + '/track.m4a'
+        output = os.path.join(directory, 'out.m4a')
+        try:
+            print(f"{'写入路径':<28}{'MB/s':>10}{'CPU s/GB':>12}")
+            speed, cpu = _measure(lambda: _legacy_download(url, output), size, args.runs)
+            print(f"{'旧实现 8KB + 每块进度':<28}{speed:>10.1f}{cpu:>12.2f}")
+            for chunk_size in args.chunk_sizes:
+                downloader = M4ADownloader(chunk_size=chunk_size)
+
+                def run():
+                    if os.path.exists(output):
+                        os.remove(output)
+                    downloader._download_once(url, output, log_func=_null_log)
+
+                speed, cpu = _measure(run, size, args.runs)
+                print(f"{f'readinto {chunk_size // 1024}KB + 进度节流':<28}{speed:>10.1f}{cpu:>12.2f}")
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+# 界面响应基准：下载进行时测量 Tk 事件循环的延迟。每 10ms 安排一次 after 回调，记录实际触发时间比预期晚了多少，
+# 同时由后台线程产生下载负载（日志、字节进度、专辑进度），对比：
+#   legacy   旧做法：工作线程对每条日志/进度直接 root.after(0, ...)
+#   dispatch 现做法：日志经 UiDispatcher 队列批量执行，进度经事件总线合并
+# 指定 --album-id 时改为真实下载该专辑（需要网络），负载来自 AlbumDownloader 本身
+# 用法：python -m benchmarks.gui_latency_bench [--seconds 10] [--workers 4] [--album-id 12345]（需要图形界面环境）
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def _probe(root, seconds, interval_ms=10):
+    """在事件循环中每 interval_ms 毫秒触发一次回调，返回每次的延迟（毫秒）"""
+    lateness = []
+    deadline = time.perf_counter() + seconds
+
+    def tick(expected):
+        now = time.perf_counter()
+        lateness.append(max(now - expected, 0) * 1000)
+        if now < deadline:
+            root.after(interval_ms, tick, time.perf_counter() + interval_ms / 1000)
+        else:
+            root.quit()
+
+    root.after(interval_ms, tick, time.perf_counter() + interval_ms / 1000)
+    root.mainloop()
+    return lateness
+
+
+def _synthetic_load(app, mode, workers, stop):
+    """模拟下载线程：每个线程约每 2ms 一块数据、每 50 块一条日志"""
+    from downloader.events import BytesProgress, AlbumProgress
+    import tkinter as tk
+
+    def legacy_append(msg):
+        app.log_text.config(state='normal')
+        app.log_text.insert(tk.END, msg + '\n', 'info')
+        app.log_text.see(tk.END)
+        app.log_text.config(state='disabled')
+
+    def worker(n):
+        done = 0
+        chunk = 0
+        while not stop.is_set():
+            done += 8192
+            chunk += 1
+            if mode == 'legacy':
+                percent = done * 100 // (64 * 2 ** 20)
+                app.root.after(0, lambda p=percent: app.progress_var.set(p))
+                if chunk % 50 == 0:
+                    app.root.after(0, legacy_append, f'[线程{n}] 已下载 {done // 1024}KB')
+            else:
+                app.events.publish(BytesProgress(f'track{n}.m4a', done, 64 * 2 ** 20))
+                if chunk % 50 == 0:
+                    app.events.publish(AlbumProgress(0, chunk // 50, 1000, f'track{n}.m4a'))
+                    app.log(f'[线程{n}] 已下载 {done // 1024}KB')
+            time.sleep(0.002)
+
+    threads = [threading.Thread(target=worker, args=(n,), daemon=True) for n in range(workers)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def run(mode, seconds, workers, album_id=None):
+    import tkinter as tk
+    from gui.gui import XimalayaGUI
+    root = tk.Tk()
+    app = XimalayaGUI(root, default_download_dir=tempfile.mkdtemp(prefix='gui-bench-'))
+    stop = threading.Event()
+    if album_id:
+        from downloader.album_download import AlbumDownloader
+        downloader = AlbumDownloader(album_id, log_func=app.log, save_dir=app.default_download_dir,
+                                     max_workers=workers, events=app.events)
+        threading.Thread(target=downloader.download_album, daemon=True).start()
+    else:
+        _synthetic_load(app, mode, workers, stop)
+    lateness = _probe(root, seconds)
+    stop.set()
+    root.destroy()
+    return lateness
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='下载进行时的界面事件循环延迟')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--album-id', type=int, default=None, help='真实下载该专辑（只测 dispatch 模式）')
+    args = parser.parse_args(argv)
+    if sys.platform != 'win32' and sys.platform != 'darwin' and not os.environ.get('DISPLAY'):
+        print('需要图形界面环境（DISPLAY），可在桌面环境或 xvfb-run 下运行')
+        return 2
+    modes = ['dispatch'] if args.album_id else ['legacy', 'dispatch']
+    print(f"{'模式':<12}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'max(ms)':>10}{'采样':>8}")
+    for mode in modes:
+        lateness = run(mode, args.seconds, args.workers, args.album_id)
+        print(f"{mode:<12}{_percentile(lateness, 0.5):>10.1f}{_percentile(lateness, 0.95):>10.1f}"
+              f"{_percentile(lateness, 0.99):>10.1f}{max(lateness or [0]):>10.1f}{len(lateness):>8}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+# 启动耗时基准：用 python -X importtime 在全新子进程中导入各入口模块，统计累计导入耗时，
+# 并检查不该在导入时加载的重型依赖（requests / Crypto / tkinter / PIL / dotenv）
+# 用法：python -m benchmarks.import_bench [模块 ...] [--runs 5] [--check] [--max-ms 毫秒]
+# --check 时任一模块导入了禁止的依赖（或超过 --max-ms）就以退出码 1 结束，可放在 CI / cron 前做回归检查
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 入口模块 -> 导入时不应加载的重型依赖
+ENTRY_POINTS = {
+    'main': ('requests', 'Crypto', 'tkinter', 'PIL', 'dotenv'),
+    'cli': ('requests', 'Crypto', 'tkinter', 'PIL', 'dotenv'),
+    'fetcher.album_fetcher': ('requests', 'Crypto', 'tkinter', 'PIL', 'dotenv'),
+    'fetcher.track_fetcher': ('requests', 'Crypto', 'tkinter', 'PIL', 'dotenv'),
+    'fetcher.track_info_fetcher': ('requests', 'Crypto', 'tkinter', 'PIL', 'dotenv'),
+    'fetcher.history_fetch': ('requests', 'Crypto', 'tkinter', 'PIL', 'dotenv'),
+    'utils.ximalaya_xmsign': ('requests', 'Crypto', 'tkinter', 'PIL', 'dotenv'),
+    'downloader.album_download': ('Crypto', 'tkinter', 'PIL', 'dotenv'),
+    'downloader.batch_download': ('Crypto', 'tkinter', 'PIL', 'dotenv'),
+}
+
+
+def parse_importtime(stderr):
+    """解析 -X importtime 的输出，返回 {模块名: 累计耗时(微秒)}"""
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue  # 表头
+        cumulative[parts[2].strip()] = int(parts[1])
+    return cumulative
+
+
+def measure(module):
+    """在全新子进程中导入 module，返回 (累计导入耗时毫秒, 已导入的全部顶层包)"""
+    code = f'import sys, {module}; print(" ".join(sorted({{m.split(".")[0] for m in sys.modules}})))'
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    cumulative = parse_importtime(result.stderr)
+    return cumulative.get(module, 0) / 1000, set(result.stdout.split())
+
+
+def heavy_imports(module, forbidden=None):
+    """返回导入 module 时被加载的禁止依赖"""
+    forbidden = ENTRY_POINTS.get(module, ()) if forbidden is None else forbidden
+    _, loaded = measure(module)
+    return sorted(name for name in forbidden if name in loaded)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='入口模块导入耗时基准')
+    parser.add_argument('modules', nargs='*', default=list(ENTRY_POINTS))
+    parser.add_argument('--runs', type=int, default=5, help='每个模块测量次数，取最小值')
+    parser.add_argument('--check', action='store_true', help='导入了禁止的依赖时以退出码 1 结束')
+    parser.add_argument('--max-ms', type=float, default=None, help='单个模块累计导入耗时上限（毫秒）')
+    args = parser.parse_args(argv)
+
+    failed = False
+    print(f"{'模块':<28}{'最小(ms)':>10}{'中位(ms)':>10}  重型依赖")
+    for module in args.modules:
+        samples = []
+        loaded = set()
+        for _ in range(max(args.runs, 1)):
+            elapsed, loaded = measure(module)
+            samples.append(elapsed)
+        samples.sort()
+        heavy = sorted(name for name in ENTRY_POINTS.get(module, ()) if name in loaded)
+        over = args.max_ms is not None and samples[0] > args.max_ms
+        failed = failed or bool(heavy) or over
+        print(f"{module:<28}{samples[0]:>10.1f}{samples[len(samples) // 2]:>10.1f}  "
+              f"{','.join(heavy) or '-'}{'  超出上限' if over else ''}")
+    return 1 if args.check and failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,59 @@
+# 断点续传判断基准：在临时目录中生成 N 个音频文件，对比
+#   旧实现   os.listdir + 每个候选文件 os.path.getsize，按 {idx:03d}_{title}.m4a 文件名匹配
+#   索引首次 没有 track_index.json，一次 scandir 建索引并按文件名补入
+#   索引续传 已有 track_index.json，一次 scandir 核对后按 trackId 字典查找
+# 用法：python -m benchmarks.resume_bench [--files 5000] [--runs 5]
+import argparse
+import os
+import tempfile
+import time
+from downloader.track_index import TrackIndex
+
+
+def _legacy(directory, names):
+    files = set(os.listdir(directory))
+    return sum(1 for name in names if name in files and os.path.getsize(os.path.join(directory, name)) > 1024 * 10)
+
+
+def _indexed(directory, names):
+    index = TrackIndex(directory)
+    done = sum(1 for track_id, name in enumerate(names, start=1) if index.lookup(track_id, name) is not None)
+    index.close()
+    return done
+
+
+def _measure(func, runs):
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='断点续传时判断已下载音频的耗时')
+    parser.add_argument('--files', type=int, default=5000)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args(argv)
+    with tempfile.TemporaryDirectory() as directory:
+        names = [f'{i:03d}_Track {i}.m4a' for i in range(1, args.files + 1)]
+        for name in names:
+            with open(os.path.join(directory, name), 'wb') as f:
+                f.truncate(1024 * 16)
+        index_file = os.path.join(directory, TrackIndex.INDEX_NAME)
+
+        def first_run():
+            if os.path.exists(index_file):
+                os.remove(index_file)
+            assert _indexed(directory, names) == args.files
+
+        print(f"{'判断方式':<12}{'耗时(ms)':>12}")
+        print(f"{'旧实现':<12}{_measure(lambda: _legacy(directory, names), args.runs):>12.1f}")
+        print(f"{'索引首次':<12}{_measure(first_run, args.runs):>12.1f}")
+        print(f"{'索引续传':<12}{_measure(lambda: _indexed(directory, names), args.runs):>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
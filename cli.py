@@ -0,0 +1,262 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+# 命令行入口：不导入 tkinter / PIL，可在无图形界面的服务器和 cron 中运行
+# 用法示例：
+#   python cli.py info 12345
+#   python cli.py album 12345 -o downloads -j 4 --incremental
+#   python cli.py album albums.txt --progress jsonl
+#   python cli.py track 67890 --album-id 12345
+#   python cli.py history --output history.jsonl
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_BLOCKED = 3
+
+
+class Reporter:
+    """
+    日志与进度输出：text 为人类可读的纯文本，jsonl 为每行一个 JSON 事件，便于其他程序解析。
+    下载事件（downloader.events）经合并分发后交给 on_event：jsonl 模式原样输出，
+    text 模式只显示专辑进度，以及输出到终端时的单文件字节进度
+    """
+    def __init__(self, fmt='text', stream=None, quiet=False):
+        self.fmt = fmt
+        self.stream = stream or sys.stdout
+        self.quiet = quiet
+        self._tty = hasattr(self.stream, 'isatty') and self.stream.isatty()
+
+    def emit(self, event):
+        event.setdefault('time', round(time.time(), 3))
+        self.stream.write(json.dumps(event, ensure_ascii=False) + '\n')
+        self.stream.flush()
+
+    def log(self, msg, level='info'):
+        msg = str(msg)
+        transfer = msg.strip().startswith('下载进度:')
+        if self.fmt == 'jsonl':
+            if not transfer:
+                self.emit({'type': 'log', 'level': level, 'msg': msg.strip()})
+            return
+        if transfer:
+            if self._tty and not self.quiet:
+                self.stream.write('\r' + msg.strip())
+                self.stream.flush()
+            return
+        if self.quiet and level not in ('warning', 'error'):
+            return
+        prefix = '' if level == 'info' else f'[{level}] '
+        self.stream.write(prefix + msg.strip('\r') + '\n')
+        self.stream.flush()
+
+    def progress(self, current, total, name=None):
+        if self.fmt == 'jsonl':
+            self.emit({'type': 'progress', 'current': current, 'total': total, 'name': name})
+        elif not self.quiet:
+            self.stream.write(f'进度 {current}/{total} {name or ""}\n')
+            self.stream.flush()
+
+    def on_event(self, event):
+        from downloader.events import AlbumProgress, BytesProgress
+        if self.fmt == 'jsonl':
+            self.emit(event.to_dict())
+        elif isinstance(event, AlbumProgress):
+            self.progress(event.current, event.total, event.filename)
+        elif isinstance(event, BytesProgress) and event.total and self._tty and not self.quiet:
+            self.stream.write(f'\r下载进度: {event.done * 100 // event.total}% '
+                              f'({event.done // 1024}KB/{event.total // 1024}KB) {os.path.basename(event.path)}')
+            self.stream.flush()
+
+    def result(self, data):
+        if self.fmt == 'jsonl':
+            self.emit({'type': 'result', **data})
+        else:
+            for key, value in data.items():
+                self.stream.write(f'{key}: {value}\n')
+            self.stream.flush()
+
+
+def _rate_arg(value):
+    """--rate cdn=4 -> ('cdn', 4.0)"""
+    from utils.rate_limiter import DEFAULT_LIMITS
+    name, sep, rate = value.partition('=')
+    name = name.strip()
+    if not sep or name not in DEFAULT_LIMITS:
+        raise argparse.ArgumentTypeError(f'限速格式应为 类别=每秒请求数，类别可选 {"/".join(DEFAULT_LIMITS)}: {value}')
+    try:
+        return name, float(rate)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'无效的速率: {value}')
+
+
+def _apply_rates(rates):
+    from utils.rate_limiter import configure_limiter
+    for name, rate in rates or []:
+        configure_limiter(name, rate=rate, max_rate=rate)
+
+
+def cmd_info(args, reporter):
+    from fetcher.album_fetcher import fetch_album
+    from fetcher.track_fetcher import fetch_album_tracks
+    album = fetch_album(args.album_id)
+    if not album:
+        reporter.log(f'获取专辑信息失败: {args.album_id}', level='error')
+        return EXIT_FAILED
+    tracks = fetch_album_tracks(args.album_id, 1, 20, resolve_urls=False)
+    reporter.result({
+        'albumId': album.albumId,
+        'albumTitle': album.albumTitle,
+        'totalCount': tracks[0].totalCount if tracks else 0,
+        'createDate': album.createDate,
+        'updateDate': album.updateDate,
+        'cover': album.cover,
+    })
+    return EXIT_OK
+
+
+def cmd_album(args, reporter):
+    from downloader.batch_download import read_album_ids
+    album_ids = []
+    for source in args.albums:
+        # 每个参数可以是专辑ID、专辑链接或专辑列表文件
+        album_ids.extend(i for i in read_album_ids(source) if i not in album_ids)
+    if not album_ids:
+        reporter.log('没有需要下载的专辑', level='warning')
+        return EXIT_OK
+    common = dict(log_func=reporter.log, save_dir=args.output, delay=args.delay, segments=args.segments,
+                  state_db=args.state_db, incremental=args.incremental)
+    if len(album_ids) == 1:
+        from downloader.album_download import AlbumDownloader
+        downloader = AlbumDownloader(album_ids[0], max_workers=args.workers, events=args.events, **common)
+        downloader.download_album()
+        results = {album_ids[0]: downloader.summary()}
+    else:
+        from downloader.batch_download import BatchDownloader
+        results = BatchDownloader(album_ids, progress_func=reporter.progress, max_workers=args.workers,
+                                  max_per_album=args.max_per_album, events=args.events, **common).run()
+    for album_id, summary in results.items():
+        reporter.result({'albumId': album_id, **summary})
+    return _album_exit_code(results)
+
+
+def _album_exit_code(results):
+    """单专辑与批量下载共用的退出码规则：风控优先；有失败、未完成或未能获取曲目的专辑时为失败"""
+    if any(r['blocked'] for r in results.values()):
+        return EXIT_BLOCKED
+    if any(r['failed'] or r['pending'] or r['total'] is None for r in results.values()):
+        return EXIT_FAILED
+    return EXIT_OK
+
+
+def cmd_track(args, reporter):
+    from downloader.single_track_download import download_single_track
+    ok = download_single_track(args.track_id, album_id=args.album_id, filename=args.filename,
+                               log_func=reporter.log, save_dir=args.output, segments=args.segments,
+                               state_db=args.state_db, events=args.events)
+    return EXIT_OK if ok else EXIT_FAILED
+
+
+def cmd_history(args, reporter):
+    from fetcher.history_fetch import fetch_listen_history, resolve_history_url
+    tracks = fetch_listen_history()
+    out = open(args.output, 'w', encoding='utf-8') if args.output else None
+    try:
+        for track in tracks:
+            record = {'itemTitle': track.item_title, 'childTitle': track.child_title,
+                      'itemId': track.item_id, 'childId': track.child_id}
+            if args.resolve_urls:
+                record['url'] = resolve_history_url(track)
+            if out:
+                out.write(json.dumps(record, ensure_ascii=False) + '\n')
+            elif reporter.fmt == 'jsonl':
+                reporter.emit({'type': 'history', **record})
+            else:
+                reporter.stream.write(f"{track}{' ' + record['url'] if 'url' in record else ''}\n")
+    finally:
+        if out:
+            out.close()
+    reporter.log(f'收听历史共 {len(tracks)} 条' + (f'，已导出到 {args.output}' if args.output else ''), level='info')
+    return EXIT_OK
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='ximalaya', description='喜马拉雅专辑/音频下载（命令行版）')
+    parser.add_argument('--progress', choices=['text', 'jsonl'], default='text', help='输出格式：text 或每行一个 JSON 事件')
+    parser.add_argument('-q', '--quiet', action='store_true', help='text 模式下只输出警告和错误')
+    parser.add_argument('--rate', action='append', type=_rate_arg, metavar='类别=速率',
+                        help='各接口类别的每秒请求数上限，如 --rate baseinfo=0.5 --rate cdn=4（listing/baseinfo/cdn）')
+    parser.add_argument('--metrics-file', default=None, help='结束时写入 Prometheus 文本格式的指标文件')
+    parser.add_argument('--metrics-port', type=int, default=None, help='运行期间在 127.0.0.1:端口/metrics 提供指标')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    info = subparsers.add_parser('info', help='查看专辑信息')
+    info.add_argument('album_id', type=int)
+    info.set_defaults(func=cmd_info)
+
+    album = subparsers.add_parser('album', help='下载一个或多个专辑')
+    album.add_argument('albums', nargs='+', help='专辑ID，或每行一个专辑ID/链接的文件')
+    album.add_argument('-o', '--output', default='downloads', help='下载目录（默认 downloads）')
+    album.add_argument('-j', '--workers', type=int, default=4, help='并发下载数（多个专辑时为全局上限）')
+    album.add_argument('--max-per-album', type=int, default=None, help='批量下载时单个专辑的并发上限')
+    album.add_argument('--segments', type=int, default=1, help='单个音频分段并行下载的段数')
+    album.add_argument('--delay', type=float, default=0, help='下载延迟（秒），每次下载前按该间隔限速，只作用于本次运行')
+    album.add_argument('--incremental', action='store_true', help='增量同步，只下载新增音频')
+    album.add_argument('--state-db', default=None, help='SQLite 下载状态库路径')
+    album.set_defaults(func=cmd_album)
+
+    track = subparsers.add_parser('track', help='下载单个音频')
+    track.add_argument('track_id', type=int)
+    track.add_argument('--album-id', type=int, default=None)
+    track.add_argument('-o', '--output', default='downloads', help='保存目录（默认 downloads）')
+    track.add_argument('--filename', default=None, help='保存文件名，默认使用音频标题')
+    track.add_argument('--segments', type=int, default=1)
+    track.add_argument('--state-db', default=None)
+    track.set_defaults(func=cmd_track)
+
+    history = subparsers.add_parser('history', help='导出收听历史（需配置 XIMALAYA_COOKIES）')
+    history.add_argument('--output', default=None, help='导出为 JSON Lines 文件')
+    history.add_argument('--resolve-urls', action='store_true', help='同时解析播放地址（每条一次 baseInfo 请求）')
+    history.set_defaults(func=cmd_history)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    reporter = Reporter(args.progress, quiet=args.quiet)
+    _apply_rates(args.rate)
+    from downloader.events import EventBus, CoalescingDispatcher
+    # 下载线程只发布事件，由后台分发线程每 0.5 秒合并输出一次
+    dispatcher = CoalescingDispatcher(reporter.on_event, interval=0.5)
+    args.events = EventBus()
+    args.events.subscribe(dispatcher)
+    dispatcher.start()
+    server = None
+    if args.metrics_port:
+        from utils.metrics import registry
+        server = registry.serve(args.metrics_port)
+    try:
+        return args.func(args, reporter)
+    except KeyboardInterrupt:
+        reporter.log('已中断', level='warning')
+        return EXIT_FAILED
+    except Exception as e:
+        reporter.log(f'{args.command} 执行失败: {e}', level='error')
+        return EXIT_FAILED
+    finally:
+        dispatcher.stop()
+        if server is not None:
+            server.shutdown()
+        if args.metrics_file:
+            from utils.metrics import registry
+            registry.write_prometheus(args.metrics_file)
+
+# 如需在其他模块调用命令行入口，请使用：
+# from cli import main
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,27 +1,76 @@
+import asyncio
 import os
 import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
 from fetcher.album_fetcher import fetch_album
-from fetcher.track_fetcher import fetch_album_tracks
+from fetcher.track_fetcher import fetch_album_tracks, BlockedException
+from downloader import async_engine
 from downloader.downloader import M4ADownloader
+from downloader.events import (TrackQueued, TrackStarted, TrackCompleted, TrackFailed, Blocked,
+                               AlbumProgress, AlbumFinished)
+from downloader.progress_store import ProgressStore
+from downloader.state_db import StateDB
+from downloader.track_index import TrackIndex
+from utils.rate_limiter import delay_limiter as make_delay_limiter
+from utils.url_cache import UrlExpiredError
+from utils import metrics
+from utils.config import get_env
+
+
+@dataclass
+class DownloadPlan:
+    jobs: list  # [(page, track_id, filename, idx, last_error)]
+    downloaded: int  # 已完成的音频数
+    total_count: Optional[int]
+    page_size: int
+    last_track_id: Optional[str] = None
 
 
 class AlbumDownloader:
-    def __init__(self, album_id, log_func=print, delay=0, save_dir=None, progress_func=None, album=None, total_count=None):
+    def __init__(self, album_id, log_func=print, delay=0, save_dir=None, progress_func=None, album=None, total_count=None,
+                 max_workers=1, segments=1, state_db=None, incremental=False, events=None, resolve_workers=1,
+                 delay_limiter=None):
         self.album_id = int(album_id)
         self.log = log_func
         self.album = album if album is not None else None
         self.tracks = []
         self.save_dir = save_dir  # 支持外部传递下载目录
-        self.downloader = M4ADownloader()
+        self.segments = segments  # 单个音频分段并行下载的段数
+        self.events = events  # 可选的事件总线（downloader.events.EventBus），发布曲目与进度事件
+        self.downloader = M4ADownloader(segments=segments, events=events)
         self.delay = delay  # 下载延迟（秒）
         self.progress_func = progress_func
         self._total_count_override = total_count
         self._partial_files = set()  # 跟踪部分下载的文件
+        self.max_workers = max(int(max_workers or 1), 1)  # 并发下载线程数
+        self.resolve_workers = max(int(resolve_workers or 1), 1)  # 流水线中解析播放地址的线程数
+        # 下载延迟换算为本次下载自己的限速器（批量下载时由 BatchDownloader 传入共享的一个），不改动全局的 cdn 限速器
+        self._delay_limiter = delay_limiter if delay_limiter is not None else make_delay_limiter(delay)
+        self._progress_lock = threading.RLock()  # 保护进度字典、进度文件和计数
+        self._local = threading.local()  # 每个下载线程独立的 M4ADownloader
+        self._blocked = False
+        self._resolved_urls = {}  # track_id -> 已解析的播放地址，每个track只解析一次
+        self._store = None  # 进度存储（快照 + 追加日志）
+        self._index = None  # 本地 trackId -> 文件索引，plan_downloads 时建立
+        self.state_db = StateDB.open(state_db)  # 可选的 SQLite 下载状态库（实例或路径）
+        self.incremental = incremental  # 增量同步：只拉取上次同步之后新增的音频
+        self._metrics_since = None  # 开始处理本专辑时的指标快照
+        self._started_at = None
+        self._total_count = None  # 扫描到第一页后确定的音频总数，流水线中的下载任务使用
+        self._downloaded = 0
+        self._plan = None  # 本次运行的下载计划，未能扫描曲目时为 None
+        self._failed_log = []  # 本次运行多次重试后仍失败的音频
 
     def fetch_album_info(self):
+        self._metrics_since = metrics.registry.snapshot()
+        self._started_at = time.time()
         # 如果已传入album对象则直接用，无需重复获取
-        if self.album is None:
-            self.album = fetch_album(self.album_id)
+        if self.album is None or self.incremental:
+            # 增量同步需要最新的 updateDate，向服务器确认（未变化时为 304）
+            self.album = fetch_album(self.album_id, ttl=0 if self.incremental else None)
         if not self.album:
             self.log('获取专辑信息失败', level='error')
             return False
@@ -32,15 +81,18 @@ class AlbumDownloader:
         else:
             self.save_dir = os.path.join('downloads', safe_album_title)
         os.makedirs(self.save_dir, exist_ok=True)
+        if self.state_db:
+            self.state_db.upsert_album(self.album_id, title=self.album.albumTitle, save_dir=self.save_dir,
+                                       update_date=self.album.updateDate)
         self.log(f'专辑：{self.album.albumTitle}，准备下载...', level='info')
         return True
 
     def save_album_info(self):
         """保存专辑封面和专辑信息到下载目录，并生成可读的 markdown 文件"""
         import json
-        import requests
         import re
         from html import unescape
+        from utils.image_cache import get_image_cache
         # 只保存 Album 数据类已有字段
         album_info = {
             'albumId': getattr(self.album, 'albumId', None),
@@ -90,246 +142,570 @@ class AlbumDownloader:
             self.log(f'保存专辑markdown信息失败: {e}', level='error')
         # 下载封面图片
         cover_url = getattr(self.album, 'cover', None)
-        if cover_url:
+        cover_path = os.path.join(self.save_dir, 'cover.jpg')
+        if cover_url and not (self.incremental and os.path.exists(cover_path)):
             try:
-                resp = requests.get(cover_url, timeout=10)
-                if resp.status_code == 200:
-                    with open(os.path.join(self.save_dir, 'cover.jpg'), 'wb') as f:
-                        f.write(resp.content)
-                else:
-                    self.log(f'封面下载失败，状态码: {resp.status_code}', level='warning')
+                # 经共享的封面缓存：界面已预览过的封面直接复制，不再请求
+                get_image_cache().save_to(cover_url, cover_path)
             except Exception as e:
                 self.log(f'下载封面失败: {e}', level='warning')
 
     def _get_progress_file(self):
         return os.path.join(self.save_dir, 'download_progress.json')
 
+    def _get_store(self):
+        if self._store is None:
+            self._store = ProgressStore(self.save_dir, log_func=self.log)
+        return self._store
+
     def load_progress(self):
-        import json
-        progress_file = self._get_progress_file()
-        if os.path.exists(progress_file):
+        """返回进度字典（快照 + 日志重放），同一次下载内多次调用返回同一个对象"""
+        store = self._get_store()
+        if store.data is None:
             try:
-                with open(progress_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                return store.load()
             except Exception:
-                return {}
-        return {}
+                store.data = {}
+        return store.data
 
     def save_progress(self, progress):
-        import json
-        import tempfile
-        import time
-        progress_file = self._get_progress_file()
-        max_retries = 3
-        retry_delay = 0.5
-        
-        for attempt in range(1, max_retries + 1):
+        """用完整进度字典覆盖并压缩为快照；下载过程中的单条状态变化走追加日志"""
+        self._get_store().replace(progress)
+
+    def _publish(self, event):
+        if self.events is not None:
+            self.events.publish(event)
+
+    def _set_blocked(self, reason=''):
+        """记录风控状态"""
+        first = not self._blocked
+        self._blocked = True
+        self._get_store().set('blocked', True)
+        if first:
+            self._publish(Blocked(self.album_id, reason))
+
+    @property
+    def blocked(self):
+        return self._blocked
+
+    def summary(self):
+        """本次运行的结果摘要，字段与批量下载的 results 相同；pending 为既未下载完成也未判定失败的音频数"""
+        total = self._plan.total_count if self._plan else None
+        failed = len(self._failed_log)
+        return {
+            'albumTitle': getattr(self.album, 'albumTitle', '') if self.album else '',
+            'total': total,
+            'downloaded': self._downloaded,
+            'failed': failed,
+            'pending': max(total - self._downloaded - failed, 0) if total else 0,
+            'blocked': self._blocked,
+        }
+
+    def close_progress(self):
+        """结束时把追加日志压缩为快照，并保存本地文件索引"""
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+        if self._index is not None:
             try:
-                # Windows兼容的原子写入方式
-                dir_name = os.path.dirname(progress_file)
-                tmp_file = None
-                try:
-                    # 显式创建临时文件并确保关闭
-                    tf = tempfile.NamedTemporaryFile(
-                        'w', encoding='utf-8', 
-                        dir=dir_name, 
-                        delete=False
-                    )
-                    tmp_file = tf.name
-                    json.dump(progress, tf, ensure_ascii=False, indent=2)
-                    tf.flush()
-                    os.fsync(tf.fileno())
-                    tf.close()  # 显式关闭文件句柄
-                    
-                    # 尝试重命名
-                    os.replace(tmp_file, progress_file)
-                    return  # 成功则直接返回
-                except Exception as e:
-                    if tmp_file and os.path.exists(tmp_file):
-                        try:
-                            os.remove(tmp_file)
-                        except:
-                            pass
-                    if attempt == max_retries:
-                        raise
-                    time.sleep(retry_delay * attempt)
-            except Exception as e:
-                if attempt == max_retries:
-                    self.log(f'保存进度失败(尝试{attempt}次): {e}', level='error')
-                    raise
-                time.sleep(retry_delay * attempt)
+                self._index.close()
+            except OSError as e:
+                self.log(f'保存文件索引失败: {e}', level='warning')
+
+    def write_metrics(self):
+        """
+        把本专辑运行期间的各阶段指标写入专辑目录的 download_metrics.json；
+        配置了 XIMALAYA_METRICS_FILE 时同时刷新 Prometheus 文本文件。
+        指标是进程级的，批量下载时摘要中包含同一时段其他专辑的请求
+        """
+        if not self.save_dir or self._metrics_since is None:
+            return None
+        try:
+            summary = metrics.registry.write_summary(
+                os.path.join(self.save_dir, 'download_metrics.json'), since=self._metrics_since,
+                album_id=self.album_id, album_title=getattr(self.album, 'albumTitle', ''),
+                elapsed_seconds=round(time.time() - self._started_at, 3),
+                downloaded=getattr(self, '_downloaded', 0), blocked=self._blocked)
+            prometheus_file = get_env('XIMALAYA_METRICS_FILE')
+            if prometheus_file:
+                metrics.registry.write_prometheus(prometheus_file)
+            return summary
+        except OSError as e:
+            self.log(f'保存下载指标失败: {e}', level='warning')
+            return None
 
     def fetch_and_download_tracks(self):
-        import json
-        import time
+        try:
+            self._fetch_and_download_tracks()
+        finally:
+            self.close_progress()
+            self.write_metrics()
+
+    def _fetch_page(self, page, page_size, ttl=None):
+        """拉取一页曲目元数据，风控时记录状态并返回 None"""
+        try:
+            if self._blocked:
+                raise BlockedException('操作因风控被阻止')
+            # 列表只取元数据，播放地址在下载时按需解析
+            return fetch_album_tracks(self.album_id, page, page_size, resolve_urls=False, ttl=ttl)
+        except BlockedException as be:
+            self.log(f'检测到风控，已暂停下载：{be}', level='error')
+            self._set_blocked(str(be))
+            return None
+
+    def _scan_page(self, page, page_tracks, idx, progress, done_paths, failed_tracks, on_job=None):
+        """
+        逐个检查一页曲目的完成情况（进度记录 -> 状态库 -> 本地文件索引），未完成的加入 failed_tracks
+        （并交给 on_job，流水线据此立即开始解析和下载），返回 (下一个 idx, 本页已完成数, 本页最后一个 track_id)
+        """
+        page_key = str(page)
+        tracks_progress = progress.get(page_key, {}).get('tracks', {})
+        downloaded = 0
+        track_id = None
+        page_jobs = []
+        for track in page_tracks:
+            safe_title = re.sub(r'[\\/:*?"<>|]', '_', getattr(track, 'title', str(getattr(track, 'trackId', idx))))
+            filename = f'{idx:03d}_{safe_title}.m4a'
+            filepath = os.path.join(self.save_dir, filename)
+            track_id = str(getattr(track, 'trackId', idx))
+            if getattr(track, 'url', ''):
+                self._resolved_urls[track_id] = track.url
+            track_status = tracks_progress.get(track_id, {})
+            # 已完成
+            if track_status.get('done'):
+                downloaded += 1
+                idx += 1
+                continue
+            # 本地索引中已有该 trackId（曲目换页、改名后沿用已下载的文件），或目录中有同名且大于10KB的文件；
+            # 状态库记录的已完成文件也要在本次下载目录中实际存在才算数（换了下载目录或删了文件时重新下载）
+            done_path = done_paths.get(int(track_id))
+            indexed = self._index.lookup(track_id, os.path.basename(done_path) if done_path else filename)
+            if indexed is not None:
+                filename = indexed['filename']
+                self._store.update_track(page_key, track_id, {'url': '', 'done': True, 'filename': filename})
+                if self.state_db and done_path is None:
+                    self.state_db.mark_done(track_id, self.album_id, path=os.path.join(self.save_dir, filename),
+                                            size=indexed['size'], md5=indexed.get('md5'),
+                                            idx=idx, title=track.title, filename=filename)
+                downloaded += 1
+                idx += 1
+                continue
+            # 未完成或失败
+            if track_status.get('partial_bytes'):
+                self.log(f'[{idx}] 发现未完成下载({track_status["partial_bytes"] // 1024}KB)，将从断点继续: {filename}', level='info')
+            if self.state_db:
+                self.state_db.upsert_track(track_id, self.album_id, idx=idx, title=track.title, filename=filename, path=filepath)
+            if track_id not in tracks_progress:
+                # 先以未完成状态记入进度：并发下载时同页先完成的音频不会在邻居还在下载时把整页标记为完成
+                self._store.update_track(page_key, track_id, {'url': '', 'done': False, 'filename': filename})
+            page_jobs.append((page, track_id, filename, idx, track_status.get('error', '')))
+            idx += 1
+        # 整页都记入进度后再交给下载，避免先完成的音频在邻居尚未记入时把整页标记为完成
+        failed_tracks.extend(page_jobs)
+        if on_job is not None:
+            for job in page_jobs:
+                on_job(job)
+        return idx, downloaded, track_id
+
+    @staticmethod
+    def _page_track_count(total_count, page, page_size):
+        """第 page 页实际的音频数（总数未知时为 0）"""
+        if not total_count:
+            return 0
+        return max(min(page_size, total_count - (page - 1) * page_size), 0)
+
+    def _page_complete(self, progress, page, expected):
+        """
+        不请求分页就跳过整页前，逐个 trackId 核对：本页记录的音频数不少于该页实际的音频数，
+        且每个都已完成、文件仍在本地索引中。页的 done 标记不单独决定是否跳过
+        """
+        tracks = progress.get(str(page), {}).get('tracks', {})
+        if not expected or len(tracks) < expected:
+            return False
+        return all(state.get('done') and self._index.lookup(track_id, state.get('filename')) is not None
+                   for track_id, state in tracks.items())
+
+    def _tracks_complete(self, progress, total_count):
+        """
+        按 trackId 汇总各页的记录（曲目换页后同一 trackId 可能记在多页）：已完成且文件仍在索引中的不少于 total_count 个，
+        且没有未完成的音频
+        """
+        done, pending = set(), set()
+        for key, page_progress in progress.items():
+            if not key.isdigit():
+                continue
+            for track_id, state in page_progress.get('tracks', {}).items():
+                if state.get('done') and self._index.lookup(track_id, state.get('filename')) is not None:
+                    done.add(track_id)
+                else:
+                    pending.add(track_id)
+        return len(done) >= total_count and not pending - done
+
+    def _record_sync(self, total_count, page_size, last_track_id=None):
+        """记录本次同步时专辑的 updateDate / totalCount，供下次增量同步比较"""
+        update_date = getattr(self.album, 'updateDate', None)
+        self._get_store().set('sync', {'updateDate': update_date, 'totalCount': total_count,
+                                       'pageSize': page_size, 'lastTrackId': last_track_id})
+        if self.state_db:
+            self.state_db.upsert_album(self.album_id, update_date=update_date, total_count=total_count)
+
+    def _incremental_scan(self, progress, page_size, done_paths, on_job=None):
+        """
+        增量同步：与上次记录的 updateDate / totalCount 比较，只从尾页开始拉取新增的曲目。
+        返回 (failed_tracks, 已完成数, total_count, 最后一个 track_id)；无法增量时返回 None，回退为完整扫描
+        """
+        sync = progress.get('sync') or {}
+        old_total = sync.get('totalCount')
+        if not old_total or sync.get('pageSize') != page_size:
+            self.log('没有可用的同步记录，执行完整扫描', level='info')
+            return None
+        old_pages = (old_total + page_size - 1) // page_size
+        # 上次有未完成的音频时走完整扫描，以便补下失败的音频
+        if not self._tracks_complete(progress, old_total):
+            self.log('上次同步有未完成的音频，执行完整扫描', level='info')
+            return None
+        if sync.get('updateDate') and sync.get('updateDate') == getattr(self.album, 'updateDate', None):
+            self.log(f'专辑未更新（{sync["updateDate"]}），共 {old_total} 个音频，无需同步', level='info')
+            return [], old_total, old_total, sync.get('lastTrackId')
+        # 专辑有更新：从上次的尾页开始向后拉取
+        tail_tracks = self._fetch_page(old_pages, page_size, ttl=0)
+        if not tail_tracks:
+            return None
+        total_count = tail_tracks[0].totalCount or old_total
+        last_pos = (old_total - 1) % page_size
+        if total_count < old_total or len(tail_tracks) <= last_pos or (
+                sync.get('lastTrackId') and str(tail_tracks[last_pos].trackId) != str(sync['lastTrackId'])):
+            result = None
+            if total_count > old_total and sync.get('lastTrackId'):
+                result = self._incremental_head_scan(progress, page_size, done_paths, on_job, old_total, total_count,
+                                                     {old_pages: tail_tracks}, sync['lastTrackId'])
+            if result is None:
+                self.log('专辑曲目有删除或顺序变化，回退为完整扫描', level='warning')
+            return result
+        total_pages = (total_count + page_size - 1) // page_size
+        self._total_count = total_count
+        self.log(f'增量同步：上次 {old_total} 个音频，当前 {total_count} 个，新增 {total_count - old_total} 个', level='info')
+        failed_tracks = []
+        downloaded = old_total
+        last_track_id = sync.get('lastTrackId')
+        for page in range(old_pages, total_pages + 1):
+            page_tracks = tail_tracks if page == old_pages else self._fetch_page(page, page_size, ttl=0)
+            if not page_tracks:
+                self.log('检测到风控或接口异常，已暂停下载。请稍后重启程序。', level='error')
+                self._set_blocked()
+                break
+            start = (page - 1) * page_size
+            if page == old_pages:
+                # 尾页中上次已完成的部分不再检查
+                page_tracks = page_tracks[old_total - start:]
+                start = old_total
+            _, page_downloaded, last_track_id = self._scan_page(page, page_tracks, start + 1, progress, done_paths,
+                                                                failed_tracks, on_job)
+            downloaded += page_downloaded
+            if progress.get(str(page), {}).get('done') and any(job[0] == page for job in failed_tracks):
+                # 上次已完成的尾页出现了新音频，取消完成标记
+                self._store.mark_page_done(page, False)
+        return failed_tracks, downloaded, total_count, last_track_id
+
+    def _incremental_head_scan(self, progress, page_size, done_paths, on_job, old_total, total_count, pages,
+                               last_track_id):
+        """
+        新音频排在最前（按时间倒序的专辑）：上次的最后一个音频移到了新的末尾，新增的是开头 total_count - old_total 个。
+        开头这些音频都不在本地索引中、紧随其后的音频已下载时才按此处理，返回值同 _incremental_scan；否则返回 None
+        """
+        def fetch(page):
+            if page not in pages:
+                pages[page] = self._fetch_page(page, page_size, ttl=0)
+            return pages[page]
+
+        added = total_count - old_total
+        new_tail = fetch((total_count + page_size - 1) // page_size)
+        last_pos = (total_count - 1) % page_size
+        if not new_tail or len(new_tail) <= last_pos or str(new_tail[last_pos].trackId) != str(last_track_id):
+            return None
+        head = []
+        for page in range(1, added // page_size + 2):
+            page_tracks = fetch(page)
+            if not page_tracks:
+                return None
+            head.extend(page_tracks)
+        if len(head) <= added or self._index.lookup(head[added].trackId) is None or any(
+                self._index.lookup(track.trackId) is not None for track in head[:added]):
+            return None
+        self._total_count = total_count
+        self.log(f'增量同步（新音频在前）：上次 {old_total} 个音频，当前 {total_count} 个，新增 {added} 个', level='info')
+        failed_tracks = []
+        downloaded = old_total
+        for page in range(1, (added + page_size - 1) // page_size + 1):
+            start = (page - 1) * page_size
+            _, page_downloaded, _ = self._scan_page(page, head[start:min(added, start + page_size)], start + 1, progress,
+                                                    done_paths, failed_tracks, on_job)
+            downloaded += page_downloaded
+            if progress.get(str(page), {}).get('done') and any(job[0] == page for job in failed_tracks):
+                self._store.mark_page_done(page, False)
+        return failed_tracks, downloaded, total_count, last_track_id
+
+    PIPELINE_QUEUE_SIZE = 20  # 扫描阶段最多领先解析阶段的任务数
+
+    def _fetch_and_download_tracks(self):
+        """
+        流水线：扫描分页 -> 解析播放地址 -> 下载，由 asyncio 引擎（downloader.async_engine）驱动，
+        阻塞的请求在线程池中执行，本方法在调用线程中运行一个事件循环直到专辑下载结束
+        """
+        asyncio.run(async_engine.download_tracks(self))
+
+    def _resolve_job(self, job):
+        """解析阶段：提前解析播放地址，下载阶段直接使用；失败时留给下载阶段按原有逻辑重试或跳过"""
+        page, track_id, filename, idx, _ = job
+        if self._blocked or self._resolved_urls.get(track_id):
+            return
+        try:
+            url = self._get_downloader().get_track_download_url(int(track_id), self.album_id)
+        except BlockedException as e:
+            self.log(f'[{idx}] 检测到风控，已暂停下载：{e}', level='error')
+            self._set_blocked(str(e))
+            return
+        except Exception as e:
+            self.log(f'[{idx}] 解析播放地址失败，下载时重试: {e}', level='warning')
+            return
+        if url:
+            self._resolved_urls[track_id] = url
+
+    def plan_downloads(self, on_job=None):
+        """
+        扫描曲目（增量或完整），返回待下载任务 DownloadPlan（全部已完成时任务为空）；风控时返回 None。
+        download_album 与批量下载共用；传入 on_job 时每发现一个待下载任务立即回调（流水线下载）
+        """
         page_size = 20
+        self._downloaded = 0
+        self._total_count = None
+        if on_job is not None:
+            sink = on_job
+
+            def on_job(job):
+                self._publish(TrackQueued(self.album_id, job[1], job[2], job[3]))
+                sink(job)
         progress = self.load_progress()
-        downloaded_files = set(os.listdir(self.save_dir))
+        # 一次 scandir 建立 trackId -> 文件索引，之后每个曲目的判断都是字典查找
+        self._index = TrackIndex(self.save_dir)
+        # 风控检测标志
+        self._blocked = False
+        # 状态库中文件位于本次下载目录的已完成track（一次索引查询）
+        done_paths = self.state_db.done_track_paths(self.album_id, self.save_dir) if self.state_db else {}
+        trust_pages = True  # 已完成的页可以不请求直接跳过
+        if self.incremental:
+            result = self._incremental_scan(progress, page_size, done_paths, on_job)
+            if result is not None:
+                failed_tracks, downloaded, total_count, last_track_id = result
+                return self._make_plan(failed_tracks, downloaded, total_count, page_size, last_track_id,
+                                       queued=on_job is not None)
+            # 无法增量同步时曲目顺序可能已经变化，每一页都请求并逐个 trackId 核对
+            trust_pages = False
         failed_tracks = []  # [(page, track_id, filename, idx, error_log)]
         total_count = None
-        idx_map = {}  # track_id -> idx
         # 先获取第一页，拿到总数
-        # 风控检测标志
-        self._blocked = False
-        from fetcher.track_fetcher import BlockedException
-        def fetch_album_tracks_with_block_check(album_id, page, page_size):
-            try:
-                if self._blocked:
-                    raise BlockedException('操作因风控被阻止')
-                tracks = fetch_album_tracks(album_id, page, page_size)
-                return tracks
-            except BlockedException as be:
-                self.log(f'检测到风控，已暂停下载：{be}', level='error')
-                progress = self.load_progress()
-                progress['blocked'] = True
-                self.save_progress(progress)
-                self._blocked = True
-                return None
-
-        first_page_tracks = fetch_album_tracks_with_block_check(self.album_id, 1, page_size)
+        first_page_tracks = self._fetch_page(1, page_size)
         if not first_page_tracks:
             self.log('未获取到专辑曲目，可能被风控，请稍后重试', level='error')
             # 记录风控状态
-            progress = self.load_progress()
-            progress['blocked'] = True
-            self.save_progress(progress)
-            self._blocked = True
-            return
+            self._set_blocked()
+            return None
         # 优先使用传递的总数
-        if self._total_count_override is not None and self._total_count_override > 0:
+        if self._total_count_override is not None and self._total_count_override > 0 and not self.incremental:
             total_count = self._total_count_override
         elif hasattr(first_page_tracks[0], 'totalCount'):
             total_count = first_page_tracks[0].totalCount
+        self._total_count = total_count
         # 计算总页数
         total_pages = (total_count + page_size - 1) // page_size if total_count else 1
         # 统计所有已完成的track数
         downloaded = 0
+        last_track_id = None
         # 统计所有未完成的track
         idx = 1
-        # 优化：直接跳到未完成的最小页码
+        # 优化：直接跳到未完成的最小页码（逐个 trackId 核对后才跳过）
         min_unfinished_page = None
         for page in range(1, total_pages + 1):
-            page_key = str(page)
-            page_progress = progress.get(page_key, {})
-            tracks_progress = page_progress.get('tracks', {})
-            if not page_progress.get('done'):
+            expected = self._page_track_count(total_count, page, page_size)
+            if not trust_pages or not self._page_complete(progress, page, expected):
                 min_unfinished_page = page
                 break
             idx += page_size
+            downloaded += expected
         if min_unfinished_page is None:
             self.log('所有音频已完成，无需下载', level='info')
-            return
+            return self._make_plan([], total_count or 0, total_count, page_size, None)
         # 从未完成的最小页码开始遍历
         page = min_unfinished_page
         while page <= total_pages:
-            page_key = str(page)
-            page_progress = progress.get(page_key, {})
-            tracks_progress = page_progress.get('tracks', {})
             # 只请求未完成页
             if page == 1:
                 page_tracks = first_page_tracks
             else:
-                if page_progress.get('done'):
+                expected = self._page_track_count(total_count, page, page_size)
+                if trust_pages and self._page_complete(progress, page, expected):
                     idx += page_size
+                    downloaded += expected
                     page += 1
                     continue
-                page_tracks = fetch_album_tracks_with_block_check(self.album_id, page, page_size)
+                page_tracks = self._fetch_page(page, page_size)
             if not page_tracks:
                 self.log('检测到风控或接口异常，已暂停下载。请稍后重启程序。', level='error')
-                progress['blocked'] = True
-                self.save_progress(progress)
-                self._blocked = True
+                self._set_blocked()
                 break
-            for i, track in enumerate(page_tracks):
-                safe_title = re.sub(r'[\\/:*?"<>|]', '_', getattr(track, 'title', str(getattr(track, 'trackId', idx))))
-                filename = f'{idx:03d}_{safe_title}.m4a'
-                filepath = os.path.join(self.save_dir, filename)
-                track_id = str(getattr(track, 'trackId', idx))
-                idx_map[track_id] = idx
-                track_status = tracks_progress.get(track_id, {})
-                # 已完成
-                if track_status.get('done'):
-                    downloaded += 1
-                    idx += 1
-                    continue
-                # 文件已存在且大于10KB，视为完成
-                if filename in downloaded_files and os.path.getsize(filepath) > 1024 * 10:
-                    tracks_progress[track_id] = {'url': '', 'done': True, 'filename': filename}
-                    self.save_progress(progress)
-                    downloaded += 1
-                    idx += 1
-                    continue
-                # 未完成或失败
-                failed_tracks.append((page, track_id, filename, idx, track_status.get('error', '')))
-                idx += 1
+            idx, page_downloaded, page_last_id = self._scan_page(page, page_tracks, idx, progress, done_paths,
+                                                                 failed_tracks, on_job)
+            downloaded += page_downloaded
+            if page == total_pages:
+                last_track_id = page_last_id
             page += 1
-        # 2. 优先补下所有未完成/失败的track，支持指数退避
-        failed_log = []
+        return self._make_plan(failed_tracks, downloaded, total_count, page_size, last_track_id,
+                               queued=on_job is not None)
+
+    def _make_plan(self, failed_tracks, downloaded, total_count, page_size, last_track_id, queued=False):
         if self._blocked:
             self.log('下载已因风控暂停，未完成的音频请稍后重启程序继续。', level='error')
-            progress = self.load_progress()
-            progress['blocked'] = True
-            self.save_progress(progress)
-            return
+            self._set_blocked()
+            return None
+        # 流水线中扫描期间已有音频下载完成，已完成数在此基础上累加
+        with self._progress_lock:
+            self._downloaded += downloaded
+        if self.events is not None and not queued:
+            for page, track_id, filename, idx, _ in failed_tracks:
+                self._publish(TrackQueued(self.album_id, track_id, filename, idx))
+        return DownloadPlan(failed_tracks, downloaded, total_count, page_size, last_track_id)
 
-        for page, track_id, filename, idx, last_error in failed_tracks:
-            page_key = str(page)
-            page_progress = progress.get(page_key, {})
-            if 'tracks' not in page_progress:
-                page_progress['tracks'] = {}
-            error_detail = ''
-            for attempt in range(5):
-                try:
-                    if self.progress_func and total_count:
-                        self.progress_func(downloaded+1, total_count, filename)
-                    self.log(f'[{idx}/{total_count or "?"}] 下载: {filename} (第{attempt+1}次尝试)', level='info')
-                    self.downloader.download_track_by_id(int(track_id), self.album_id, os.path.join(self.save_dir, filename), log_func=self.log)
-                    self.log(f'[{idx}] 下载完成: {filename}', level='info')
-                    page_progress['tracks'][track_id] = {'url': '', 'done': True, 'filename': filename}
-                    self.save_progress(progress)
-                    downloaded += 1
-                    if self.progress_func and total_count:
-                        self.progress_func(downloaded, total_count, filename)
-                    break
-                except Exception as e:
-                    error_detail = str(e)
-                    self.log(f'[{idx}] 下载失败: {e}', level='warning')
-                    if self.progress_func and total_count:
-                        self.progress_func(downloaded, total_count, filename)
-                    page_progress['tracks'][track_id] = {'url': '', 'done': False, 'error': error_detail, 'filename': filename}
-                    self.save_progress(progress)
-                    # 指数退避
-                    sleep_time = min(2 ** attempt, 30)
-                    time.sleep(sleep_time)
-                    if attempt == 4:
-                        self.log(f'[{idx}] 多次失败，跳过: {filename}', level='error')
-                        failed_log.append({'page': page, 'track_id': track_id, 'filename': filename, 'idx': idx, 'error': error_detail})
-            # 标记本页是否全部完成
-            tracks_progress = page_progress['tracks']
-            all_done = all(t.get('done') for t in tracks_progress.values()) and len(tracks_progress) >= 1
-            if all_done:
-                page_progress['done'] = True
-            progress[page_key] = page_progress
-            self.save_progress(progress)
+    def download_job(self, job, plan, failed_log):
+        """下载计划中的单个任务，可在任意线程中调用"""
+        self._download_failed_track(job, plan.total_count, failed_log)
+
+    def finish_downloads(self, plan, failed_log):
+        """汇总下载结果；全部成功后记录同步状态"""
+        total_count = plan.total_count
+        if self._blocked:
+            self.log('下载已因风控暂停，未完成的音频请稍后重启程序继续。', level='error')
+            self._publish(AlbumFinished(self.album_id, self._downloaded, total_count, len(failed_log), True))
+            return
         if failed_log:
             self.log('\n以下音频多次下载失败，请手动排查：', level='error')
-            for item in failed_log:
+            for item in sorted(failed_log, key=lambda x: x['idx']):
                 self.log(f"[页码:{item['page']}, idx:{item['idx']}, track_id:{item['track_id']}] {item['filename']}\n错误信息: {item['error']}", level='error')
+        elif total_count:
+            self._record_sync(total_count, plan.page_size, plan.last_track_id)
         self.log('专辑下载完成', level='info')
+        self._publish(AlbumFinished(self.album_id, self._downloaded, total_count, len(failed_log), False))
         if self.progress_func and total_count:
             self.progress_func(total_count, total_count, '专辑下载完成')
 
-    def download_album(self):
-        if not self.fetch_album_info():
+    def _get_downloader(self):
+        """主线程沿用 self.downloader，其余下载线程各自持有一个实例，避免共享请求节流状态"""
+        if threading.current_thread() is threading.main_thread():
+            return self.downloader
+        downloader = getattr(self._local, 'downloader', None)
+        if downloader is None:
+            downloader = M4ADownloader(segments=self.segments, events=self.events)
+            self._local.downloader = downloader
+        return downloader
+
+    def _report_progress(self, total_count, filename, started=False):
+        if not total_count or (self.progress_func is None and self.events is None):
             return
-        self.save_album_info()
-        self.log('开始下载专辑音频...')
-        try:
-            self.fetch_and_download_tracks()
-        except Exception as e:
-            self.log(f'下载过程中发生错误: {e}', level='error')
-            self.cleanup_partial_downloads()
-            raise
+        with self._progress_lock:
+            current = min(self._downloaded + 1 if started else self._downloaded, total_count)
+        if self.progress_func:
+            self.progress_func(current, total_count, filename)
+        self._publish(AlbumProgress(self.album_id, current, total_count, filename))
+
+    def _download_failed_track(self, job, total_count, failed_log):
+        """下载单个未完成的track（带指数退避重试），可在多个线程中并发执行"""
+        import time
+        page, track_id, filename, idx, last_error = job
+        page_key = str(page)
+        store = self._get_store()
+        error_detail = ''
+        downloader = self._get_downloader()
+        for attempt in range(5):
+            if self._blocked:
+                return
+            try:
+                self._report_progress(total_count, filename, started=True)
+                self._publish(TrackStarted(self.album_id, track_id, filename, idx, attempt + 1))
+                self.log(f'[{idx}/{total_count or "?"}] 下载: {filename} (第{attempt+1}次尝试)', level='info')
+                if self.state_db:
+                    self.state_db.mark_downloading(track_id, self.album_id)
+                url = self._resolved_urls.get(track_id)
+                if not url:
+                    url = downloader.get_track_download_url(int(track_id), self.album_id)
+                    if not url:
+                        # 无有效播放链接（如付费未购买），重试无意义
+                        error_detail = '未获取到下载URL'
+                        self.log(f'[{idx}] 跳过: {filename}，无有效播放链接', level='error')
+                        store.update_track(page_key, track_id, {'url': '', 'done': False, 'error': error_detail, 'filename': filename})
+                        if self.state_db:
+                            self.state_db.mark_failed(track_id, self.album_id, error=error_detail)
+                        with self._progress_lock:
+                            failed_log.append({'page': page, 'track_id': track_id, 'filename': filename, 'idx': idx, 'error': error_detail})
+                        self._publish(TrackFailed(self.album_id, track_id, filename, error_detail, True))
+                        return
+                    self._resolved_urls[track_id] = url
+                filepath = os.path.join(self.save_dir, filename)
+                if self._delay_limiter is not None:
+                    self._delay_limiter.acquire()
+                downloader.download_track_by_id(int(track_id), self.album_id, filepath, log_func=self.log, url=url)
+                self.log(f'[{idx}] 下载完成: {filename}', level='info')
+                store.update_track(page_key, track_id, {'url': '', 'done': True, 'filename': filename})
+                size = os.path.getsize(filepath) if os.path.exists(filepath) else None
+                md5 = downloader.checksums.get(filepath)
+                if self._index is not None and size is not None:
+                    self._index.record(track_id, filename, size, md5)
+                if self.state_db:
+                    self.state_db.mark_done(track_id, self.album_id, path=filepath, size=size, md5=md5)
+                self._publish(TrackCompleted(self.album_id, track_id, filename, filepath, size))
+                self._mark_page_done(page_key)
+                with self._progress_lock:
+                    self._downloaded += 1
+                self._report_progress(total_count, filename)
+                return
+            except BlockedException as e:
+                # 风控时立即停止所有线程，避免并发请求加重风控
+                self.log(f'[{idx}] 检测到风控，已暂停下载：{e}', level='error')
+                store.update_track(page_key, track_id, {'url': '', 'done': False, 'error': str(e), 'filename': filename})
+                if self.state_db:
+                    self.state_db.mark_failed(track_id, self.album_id, error=str(e), blocked=True)
+                self._set_blocked(str(e))
+                return
+            except Exception as e:
+                error_detail = str(e)
+                if isinstance(e, UrlExpiredError):
+                    # 重新解析后的地址仍失效，下次尝试不再复用本地记住的地址
+                    self._resolved_urls.pop(track_id, None)
+                self.log(f'[{idx}] 下载失败: {e}', level='warning')
+                self._report_progress(total_count, filename)
+                # 记录 .part 已下载的字节数，重启后从该位置继续
+                part_file = M4ADownloader.part_file(os.path.join(self.save_dir, filename))
+                partial_bytes = os.path.getsize(part_file) if os.path.exists(part_file) else 0
+                store.update_track(page_key, track_id, {'url': '', 'done': False, 'error': error_detail, 'filename': filename,
+                                                        'partial_bytes': partial_bytes})
+                if self.state_db:
+                    self.state_db.mark_failed(track_id, self.album_id, error=error_detail, partial_bytes=partial_bytes)
+                self._publish(TrackFailed(self.album_id, track_id, filename, error_detail, attempt == 4))
+                if attempt == 4:
+                    self.log(f'[{idx}] 多次失败，跳过: {filename}', level='error')
+                    with self._progress_lock:
+                        failed_log.append({'page': page, 'track_id': track_id, 'filename': filename, 'idx': idx, 'error': error_detail})
+                    return
+                # 指数退避
+                metrics.inc('retries', stage='track')
+                sleep_time = min(2 ** attempt, 30)
+                time.sleep(sleep_time)
+
+    def _mark_page_done(self, page_key):
+        """标记本页是否全部完成"""
+        self._get_store().mark_page_done_if_complete(page_key)
+
+    def download_album(self):
+        """同步入口：在调用线程中运行 async_engine.download_album"""
+        asyncio.run(async_engine.download_album(self))
 
     def cleanup_partial_downloads(self):
         """清理未完成的部分下载文件"""
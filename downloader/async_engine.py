@@ -0,0 +1,197 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+
+
+# 基于 asyncio 的下载引擎：扫描分页、解析播放地址、下载 三个阶段都是协程，经有界的 asyncio.Queue 衔接，
+# 每个阶段的并发由信号量限制。阻塞的 HTTP 请求仍由 AlbumDownloader / M4ADownloader 完成，
+# 在共享的有界线程池中执行，因此进度存储、状态库、文件索引、事件与单线程下载完全一致；
+# 线程数只取决于各阶段的并发上限，不随专辑数或曲目数增长
+
+
+@asynccontextmanager
+async def _slot(semaphore):
+    if semaphore is None:
+        yield
+    else:
+        async with semaphore:
+            yield
+
+
+async def _run(executor, func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(func, *args, **kwargs))
+
+
+async def download_tracks(album, executor=None, listing_slots=None, resolve_slots=None, download_slots=None,
+                          stop=None):
+    """
+    扫描并下载一个专辑的音频，返回 DownloadPlan（风控时为 None）。
+    扫描出第一个待下载的曲目后即开始解析和下载，队列有界，扫描不会远远跑在下载前面；
+    多个专辑共用时传入同一个 executor 与各阶段的信号量，stop 为共享的 asyncio.Event，任一专辑触发风控后其余专辑随之暂停
+    """
+    loop = asyncio.get_running_loop()
+    own_executor = executor is None
+    if own_executor:
+        workers = 1 + album.resolve_workers + album.max_workers
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='album-dl')
+    resolve_queue = asyncio.Queue(maxsize=album.PIPELINE_QUEUE_SIZE)
+    download_queue = asyncio.Queue(maxsize=album.max_workers * 2)
+    failed_log = album._failed_log = []
+    resolvers_left = [album.resolve_workers]
+
+    def on_job(job):
+        # 扫描在线程池中运行，经事件循环放入有界队列；队列已满时扫描线程在此等待
+        asyncio.run_coroutine_threadsafe(resolve_queue.put(job), loop).result()
+
+    def check_stop():
+        if stop is None:
+            return
+        if album.blocked:
+            stop.set()
+        elif stop.is_set():
+            album._set_blocked('其他专辑触发风控')
+
+    async def list_stage():
+        try:
+            async with _slot(listing_slots):
+                return await _run(executor, album.plan_downloads, on_job=on_job)
+        finally:
+            for _ in range(album.resolve_workers):
+                await resolve_queue.put(None)
+
+    async def resolve_stage():
+        try:
+            while True:
+                job = await resolve_queue.get()
+                if job is None:
+                    return
+                check_stop()
+                async with _slot(resolve_slots):
+                    await _run(executor, album._resolve_job, job)
+                await download_queue.put(job)
+        finally:
+            resolvers_left[0] -= 1
+            if resolvers_left[0] == 0:
+                for _ in range(album.max_workers):
+                    await download_queue.put(None)
+
+    async def download_stage():
+        while True:
+            job = await download_queue.get()
+            if job is None:
+                return
+            check_stop()
+            try:
+                async with _slot(download_slots):
+                    await _run(executor, album._download_failed_track, job, album._total_count, failed_log)
+            except Exception as e:
+                # 下载协程不能退出，否则上游阶段会阻塞在已满的队列上
+                album.log(f'[{job[3]}] 下载出错: {e}', level='error')
+                with album._progress_lock:
+                    failed_log.append({'page': job[0], 'track_id': job[1], 'filename': job[2], 'idx': job[3],
+                                       'error': str(e)})
+            check_stop()
+
+    if album.max_workers > 1:
+        album.log(f'并发下载: 边扫描边下载, 并发数 {album.max_workers}', level='info')
+    try:
+        planned = asyncio.ensure_future(list_stage())
+        await asyncio.gather(*[download_stage() for _ in range(album.max_workers)],
+                             *[resolve_stage() for _ in range(album.resolve_workers)])
+        plan = album._plan = await planned
+    finally:
+        if own_executor:
+            # 正常结束时所有任务都已完成；出错时不等待可能阻塞在队列上的扫描线程
+            executor.shutdown(wait=False)
+    check_stop()
+    if plan is not None:
+        album.finish_downloads(plan, failed_log)
+    return plan
+
+
+async def download_album(album, executor=None, listing_slots=None, resolve_slots=None, download_slots=None,
+                         stop=None):
+    """
+    异步下载整个专辑：获取专辑信息，专辑信息与封面在后台保存，同时运行下载流水线；返回 album.summary()
+    """
+    async with _slot(listing_slots):
+        found = await _run(executor, album.fetch_album_info)
+    if not found:
+        return album.summary()
+
+    async def save_info():
+        async with _slot(listing_slots):
+            await _run(executor, album.save_album_info)
+
+    info = asyncio.ensure_future(save_info())
+    album.log('开始下载专辑音频...')
+    try:
+        await download_tracks(album, executor, listing_slots, resolve_slots, download_slots, stop)
+    except Exception as e:
+        album.log(f'下载过程中发生错误: {e}', level='error')
+        album.cleanup_partial_downloads()
+        raise
+    finally:
+        album.close_progress()
+        album.write_metrics()
+        await info
+    return album.summary()
+
+
+async def download_albums(album_ids, log_func=print, save_dir=None, listing_concurrency=2, resolve_concurrency=4,
+                          download_concurrency=8, max_per_album=None, max_active_albums=None, delay=0, segments=1,
+                          state_db=None, incremental=False, events=None):
+    """
+    在一个事件循环中下载多个专辑，返回 {album_id: 结果摘要}（字段与 BatchDownloader.results 相同）。
+    各阶段的并发上限对所有专辑全局生效，线程池大小为三者之和；任一专辑触发风控时其余专辑随之暂停
+    """
+    from downloader.album_download import AlbumDownloader
+    from downloader.batch_download import read_album_ids
+    from downloader.state_db import StateDB
+    from utils.rate_limiter import delay_limiter
+
+    album_ids = read_album_ids(album_ids)
+    state_db = StateDB.open(state_db)
+    limiter = delay_limiter(delay)  # 所有专辑共用一个下载延迟限速器
+    listing_slots = asyncio.Semaphore(listing_concurrency)
+    resolve_slots = asyncio.Semaphore(resolve_concurrency)
+    download_slots = asyncio.Semaphore(download_concurrency)
+    # 同时处于下载中的专辑数，避免一次打开几百个专辑的进度日志
+    album_slots = asyncio.Semaphore(max_active_albums or download_concurrency * 2)
+    stop = asyncio.Event()
+    results = {}
+    workers = listing_concurrency + resolve_concurrency + download_concurrency
+
+    async def run_one(album_id):
+        album = AlbumDownloader(album_id, log_func=log_func, delay=delay, save_dir=save_dir,
+                                max_workers=max_per_album or download_concurrency, segments=segments,
+                                state_db=state_db, incremental=incremental, events=events, delay_limiter=limiter)
+        async with album_slots:
+            if stop.is_set():
+                results[album_id] = dict(album.summary(), blocked=True)
+                return
+            try:
+                results[album_id] = await download_album(album, executor, listing_slots, resolve_slots,
+                                                         download_slots, stop)
+            except Exception as e:
+                log_func(f'[专辑 {album_id}] 下载失败: {e}', level='error')
+                results[album_id] = album.summary()
+            if album.blocked:
+                stop.set()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='async-dl') as executor:
+        await asyncio.gather(*[run_one(album_id) for album_id in album_ids])
+    if stop.is_set():
+        log_func('批量下载因风控暂停，请稍后重新运行继续未完成的专辑。', level='error')
+    return {album_id: results[album_id] for album_id in album_ids}
+
+
+def run_albums(album_ids, **kwargs):
+    """download_albums 的同步入口"""
+    return asyncio.run(download_albums(album_ids, **kwargs))
+
+
+# 如需在其他模块调用 asyncio 引擎，请使用：
+# from downloader.async_engine import download_albums, run_albums
@@ -0,0 +1,214 @@
+import os
+import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from downloader.album_download import AlbumDownloader
+from downloader.state_db import StateDB
+from utils.rate_limiter import delay_limiter
+
+
+def read_album_ids(source):
+    """
+    解析专辑ID：接受ID列表、逗号/空白分隔的字符串或文件路径。
+    文件每行一个专辑ID或专辑链接（如 https://www.ximalaya.com/album/12345），# 之后为注释，重复的ID只保留一个
+    """
+    if isinstance(source, (str, os.PathLike)) and os.path.isfile(source):
+        with open(source, 'r', encoding='utf-8') as f:
+            items = f.read().splitlines()
+    elif isinstance(source, str):
+        items = re.split(r'[\s,]+', source)
+    else:
+        items = [str(item) for item in source]
+    album_ids = []
+    for item in items:
+        item = item.split('#', 1)[0].strip()
+        if not item:
+            continue
+        match = re.search(r'album/(\d+)', item) or re.fullmatch(r'\d+', item)
+        if not match:
+            raise ValueError(f'无法识别的专辑ID: {item}')
+        album_id = int(match.group(1) if match.groups() else match.group(0))
+        if album_id not in album_ids:
+            album_ids.append(album_id)
+    return album_ids
+
+
+class _AlbumTask:
+    """批量下载中单个专辑的调度状态"""
+    def __init__(self, album_id, downloader):
+        self.album_id = album_id
+        self.downloader = downloader
+        self.state = 'new'  # new -> preparing -> ready -> finishing -> done
+        self.plan = None
+        self.pending = deque()
+        self.running = 0
+        self.failed_log = []
+
+
+class BatchDownloader:
+    """
+    多专辑批量下载：所有专辑共用一个下载线程池（max_workers 为全局并发上限），
+    调度器在各专辑之间轮转取任务，保证每个专辑公平地分到下载名额，max_per_album 可限制单个专辑的并发。
+    HTTP 连接池与各接口的限速器本来就是全局共享的；目录结构、album_info.json 与封面与 AlbumDownloader 完全一致
+    """
+    def __init__(self, album_ids, log_func=print, save_dir=None, max_workers=4, max_per_album=None, delay=0,
+                 segments=1, state_db=None, incremental=False, progress_func=None, max_active_albums=None, events=None):
+        self.album_ids = read_album_ids(album_ids)
+        self.log = log_func
+        self.save_dir = save_dir
+        self.max_workers = max(int(max_workers or 1), 1)
+        self.max_per_album = max_per_album or self.max_workers
+        # 同时处于下载中的专辑数，避免一次打开几百个专辑的进度日志
+        self.max_active_albums = max_active_albums or self.max_workers * 2
+        self.delay = delay
+        self._delay_limiter = delay_limiter(delay)  # 所有专辑共用一个下载延迟限速器
+        self.segments = segments
+        self.state_db = StateDB.open(state_db)
+        self.incremental = incremental
+        self.progress_func = progress_func
+        self.events = events  # 所有专辑共用的事件总线
+        self.results = {}
+        self._cond = threading.Condition()
+        self._tasks = []
+        self._cursor = 0
+        self._blocked = False
+        self._finished = 0
+
+    def _make_downloader(self, album_id):
+        return AlbumDownloader(album_id, log_func=self.log, delay=self.delay, save_dir=self.save_dir,
+                               segments=self.segments, state_db=self.state_db, incremental=self.incremental,
+                               events=self.events, delay_limiter=self._delay_limiter)
+
+    def _next_work(self):
+        """
+        按轮转顺序取下一项工作：(task, None) 表示准备该专辑（拉取信息与曲目），(task, job) 表示下载一个音频；
+        全部完成或遇到风控时返回 None
+        """
+        with self._cond:
+            while True:
+                if self._blocked:
+                    return None
+                active = sum(1 for t in self._tasks if t.state in ('preparing', 'ready', 'finishing'))
+                count = len(self._tasks)
+                for k in range(count):
+                    task = self._tasks[(self._cursor + k) % count]
+                    work = None
+                    if task.state == 'new' and active < self.max_active_albums:
+                        task.state = 'preparing'
+                        work = (task, None)
+                    elif task.state == 'ready' and task.pending and task.running < self.max_per_album:
+                        task.running += 1
+                        work = (task, task.pending.popleft())
+                    if work:
+                        self._cursor = (self._cursor + k + 1) % count
+                        return work
+                if all(t.state == 'done' for t in self._tasks):
+                    return None
+                self._cond.wait()
+
+    def _prepare(self, task):
+        downloader = task.downloader
+        plan = None
+        try:
+            if downloader.fetch_album_info():
+                downloader.save_album_info()
+                plan = downloader.plan_downloads()
+        except Exception as e:
+            self.log(f'[专辑 {task.album_id}] 准备下载失败: {e}', level='error')
+        with self._cond:
+            task.plan = plan
+            task.pending = deque(plan.jobs if plan else [])
+            task.state = 'ready'
+            if downloader.blocked:
+                self._blocked = True
+            self._cond.notify_all()
+        if plan:
+            title = getattr(downloader.album, 'albumTitle', task.album_id)
+            self.log(f'[专辑 {task.album_id}] {title}: 待下载 {len(plan.jobs)} 个音频', level='info')
+
+    def _download(self, task, job):
+        try:
+            task.downloader.download_job(job, task.plan, task.failed_log)
+        finally:
+            with self._cond:
+                task.running -= 1
+                if task.downloader.blocked:
+                    self._blocked = True
+                self._cond.notify_all()
+
+    def _maybe_finish(self, task):
+        """专辑的所有任务都结束后汇总结果、压缩进度"""
+        with self._cond:
+            if task.state != 'ready' or task.pending or task.running:
+                return
+            task.state = 'finishing'
+        self._finish(task)
+
+    def _finish(self, task):
+        downloader = task.downloader
+        try:
+            # 还有未执行的任务（因风控提前结束）时不记录同步状态
+            if task.plan and not task.pending:
+                downloader.finish_downloads(task.plan, task.failed_log)
+        finally:
+            downloader.close_progress()
+            downloader.write_metrics()
+            album = downloader.album
+            total = task.plan.total_count if task.plan else None
+            pending = len(task.pending) + task.running
+            blocked = downloader.blocked or (self._blocked and (pending > 0 or task.plan is None))
+            with self._cond:
+                task.state = 'done'
+                self._finished += 1
+                finished = self._finished
+                self.results[task.album_id] = {
+                    'albumTitle': getattr(album, 'albumTitle', '') if album else '',
+                    'total': total,
+                    'downloaded': getattr(downloader, '_downloaded', 0),
+                    'failed': len(task.failed_log),
+                    'pending': pending,
+                    'blocked': blocked,
+                }
+                self._cond.notify_all()
+            if self.progress_func:
+                self.progress_func(finished, len(self._tasks), getattr(album, 'albumTitle', str(task.album_id)))
+
+    def _worker(self):
+        while True:
+            work = self._next_work()
+            if work is None:
+                return
+            task, job = work
+            if job is None:
+                self._prepare(task)
+            else:
+                self._download(task, job)
+            self._maybe_finish(task)
+
+    def run(self):
+        """下载全部专辑，返回 {album_id: 结果摘要}"""
+        self._tasks = [_AlbumTask(album_id, self._make_downloader(album_id)) for album_id in self.album_ids]
+        self.log(f'批量下载: {len(self._tasks)} 个专辑, 全局线程数 {self.max_workers}', level='info')
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='batch-dl') as executor:
+            futures = [executor.submit(self._worker) for _ in range(self.max_workers)]
+            for future in futures:
+                future.result()
+        # 因风控提前结束时，收尾尚未完成的专辑，保存其进度
+        for task in self._tasks:
+            if task.state in ('new', 'preparing', 'ready'):
+                task.state = 'finishing'
+                self._finish(task)
+        if self._blocked:
+            self.log('批量下载已因风控暂停，未完成的专辑请稍后重新运行继续。', level='error')
+        done = sum(1 for r in self.results.values() if r['total'] is not None and not r['failed'] and not r['pending'])
+        self.log(f'批量下载结束: {done}/{len(self._tasks)} 个专辑已完成', level='info')
+        return self.results
+
+
+def batch_download(album_ids, log_func=print, **kwargs):
+    """批量下载专辑，album_ids 可为ID列表或每行一个专辑ID的文件路径"""
+    return BatchDownloader(album_ids, log_func=log_func, **kwargs).run()
+
+# 如需在其他模块调用批量下载，请使用：
+# from downloader.batch_download import BatchDownloader, batch_download
@@ -1,54 +1,158 @@
 import requests
 import time
 import hashlib
+import io
 import os
-from requests.exceptions import HTTPError, Timeout, ConnectionError, RequestException
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from requests.exceptions import HTTPError, Timeout, ConnectionError, RequestException, ChunkedEncodingError
+from urllib3.exceptions import ProtocolError, ReadTimeoutError, SSLError as Urllib3SSLError
 from fetcher.track_fetcher import BlockedException
+from downloader.events import BytesProgress
+from utils import http_client
+from utils.rate_limiter import get_limiter
+from utils.url_cache import get_url_cache, UrlExpiredError
+from utils import metrics
+
+# 每次从连接读取的块大小，256KB~1MB 时 Python 层的循环、写入与 MD5 调用次数可降低两个数量级
+DEFAULT_CHUNK_SIZE = 512 * 1024
+# 下载进度最短输出间隔（秒）
+DEFAULT_PROGRESS_INTERVAL = 0.5
+
+
+class ProgressThrottle:
+    """
+    下载进度节流：距上次输出超过 interval 秒，或新增字节数达到 min_bytes 时才输出一次“下载进度”，
+    下载完成时总会输出；线程安全，分段下载的各线程共用一个。
+    on_update(done, total) 用于发布结构化事件，log_func 为 None 时不再输出进度字符串
+    """
+    def __init__(self, total, log_func=print, done=0, interval=DEFAULT_PROGRESS_INTERVAL, min_bytes=None, on_update=None):
+        self.total = total
+        self.log_func = log_func
+        self.on_update = on_update
+        self.done = done
+        self.interval = interval
+        self.min_bytes = min_bytes
+        self._lock = threading.Lock()
+        self._last_time = time.monotonic()
+        self._last_done = done
+
+    def update(self, size):
+        with self._lock:
+            self.done += size
+            done = self.done
+            now = time.monotonic()
+            due = (now - self._last_time >= self.interval
+                   or (self.min_bytes is not None and done - self._last_done >= self.min_bytes)
+                   or (self.total > 0 and done >= self.total))
+            if not due:
+                return
+            self._last_time = now
+            self._last_done = done
+        if self.on_update:
+            self.on_update(done, self.total)
+        if self.log_func and self.total > 0:
+            self.log_func(f"\r下载进度: {done * 100 // self.total}% ({done // 1024}KB/{self.total // 1024}KB)", level='info')
+
 
 class M4ADownloader:
-    def __init__(self, max_retries=3, retry_delay=3, connect_timeout=10):
+    def __init__(self, max_retries=3, retry_delay=3, connect_timeout=10, segments=1, min_segment_size=4 * 1024 * 1024,
+                 chunk_size=DEFAULT_CHUNK_SIZE, progress_interval=DEFAULT_PROGRESS_INTERVAL, progress_bytes=None,
+                 events=None):
         self.max_retries = max_retries
         self.retry_delay = retry_delay  # 延迟时间由上层(GUI)控制
         self.connect_timeout = connect_timeout
+        self.segments = max(int(segments or 1), 1)  # 分段并行下载的段数，1 表示单连接
+        self.min_segment_size = min_segment_size  # 每段最小字节数，小文件不分段
+        self.chunk_size = max(int(chunk_size or DEFAULT_CHUNK_SIZE), 8192)
+        self.progress_interval = progress_interval  # 下载进度输出的最短间隔（秒）
+        self.progress_bytes = progress_bytes  # 或每新增多少字节输出一次，None 表示只按时间
+        self.events = events  # 事件总线，设置后字节进度以 BytesProgress 事件发布，不再输出进度字符串
         self._partial_files = set()  # 跟踪部分下载的文件
-        self._last_request_time = 0  # 记录上次请求时间
+        self.checksums = {}  # output_file -> 下载完成文件的MD5
+
+    @staticmethod
+    def part_file(output_file):
+        """未完成下载的临时文件，下载完整后才重命名为 output_file"""
+        return output_file + '.part'
 
+    @staticmethod
+    def _check_expired(response):
+        """CDN 返回 403/410 说明播放地址已过期，重试同一地址没有意义"""
+        if response.status_code in (403, 410):
+            response.close()
+            raise UrlExpiredError(f"播放地址已失效(HTTP {response.status_code})")
+
+    @staticmethod
+    def _parse_content_range(value):
+        """解析 'bytes start-end/total'，total 未知时返回 None"""
+        match = re.match(r'bytes\s+(\d+)-(\d+)/(\d+|\*)', value or '')
+        if not match:
+            return None
+        start, end, total = match.groups()
+        return int(start), int(end), (int(total) if total != '*' else None)
+
+    def _iter_body(self, response):
+        """
+        逐块产出响应体。未压缩的响应直接从底层连接 readinto 到预分配的缓冲区，
+        产出的 memoryview 复用同一块内存，只在下一次迭代前有效（写入和 MD5 都在此之前完成）；
+        其他情况回退为 iter_content。
+        直接读底层连接时按 iter_content 的方式把 urllib3 的异常转换为 requests 异常，连接中断时才会重试并断点续传
+        """
+        raw = getattr(response, 'raw', None)
+        if isinstance(raw, io.IOBase) and response.headers.get('Content-Encoding', 'identity').lower() == 'identity':
+            buffer = bytearray(self.chunk_size)
+            view = memoryview(buffer)
+            try:
+                while True:
+                    size = raw.readinto(buffer)
+                    if not size:
+                        break
+                    yield view[:size]
+            except ProtocolError as e:
+                raise ChunkedEncodingError(e)
+            except ReadTimeoutError as e:
+                raise ConnectionError(e)
+            except Urllib3SSLError as e:
+                raise requests.exceptions.SSLError(e)
+            return
+        for chunk in response.iter_content(chunk_size=self.chunk_size):
+            if chunk:
+                yield chunk
+
+    def _progress(self, total, log_func, output_file, done=0):
+        on_update = None
+        if self.events is not None:
+            publish = self.events.publish
+            log_func = None
+
+            def on_update(done, total):
+                publish(BytesProgress(output_file, done, total))
+
+        return ProgressThrottle(total, log_func, done=done, interval=self.progress_interval,
+                                min_bytes=self.progress_bytes, on_update=on_update)
+
+    @metrics.timed('download')
     def _download_once(self, url, output_file, log_func=print):
         """
         单次下载，不做重试，由外部处理异常
+        数据先写入 .part 文件，已有 .part 时通过 Range 请求从断点继续，完整后再重命名
         """
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
-            'Referer': 'https://www.ximalaya.com/',
-            'Accept': 'audio/webm,audio/ogg,audio/wav,audio/*;q=0.9,application/ogg;q=0.7,video/*;q=0.6,*/*;q=0.5',
-            'Accept-Language': 'zh-CN,zh;q=0.9,en-US;q=0.8,en;q=0.7',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Sec-Fetch-Dest': 'audio',
-            'Sec-Fetch-Mode': 'no-cors',
-            'Sec-Fetch-Site': 'cross-site',
-            'Pragma': 'no-cache',
-            'Cache-Control': 'no-cache',
-            # 'Cookie': '',  # 如有需要可在此处补充
-        }
         self._partial_files.add(output_file)
-        
-        # 自定义SSL上下文
-        import ssl
-        ssl_context = ssl.create_default_context()
-        ssl_context.check_hostname = False
-        ssl_context.verify_mode = ssl.CERT_NONE
-        
+        part_file = self.part_file(output_file)
+        offset = os.path.getsize(part_file) if os.path.exists(part_file) else 0
+        headers = {'Range': f'bytes={offset}-'} if offset else None
+
         for attempt in range(3):
             try:
-                response = requests.get(
+                # 请求头、证书校验由共享客户端的 cdn 类别统一配置，连接可跨音频复用
+                response = http_client.get(
                     url,
+                    "cdn",
+                    headers=headers,
                     stream=True,
                     timeout=(self.connect_timeout, 20),
-                    verify=False,
-                    headers=headers,
-                    cert=None,
-                    proxies=None,
                     allow_redirects=True
                 )
                 break
@@ -56,60 +160,180 @@ class M4ADownloader:
                 if attempt == 2:
                     raise
                 log_func(f"SSL连接错误(尝试{attempt+1}/3): {e}", level='warning')
+                metrics.inc('retries', stage='connect')
                 time.sleep(1 * (attempt + 1))
             except requests.exceptions.RequestException as e:
                 if attempt == 2:
                     raise
                 log_func(f"请求错误(尝试{attempt+1}/3): {e}", level='warning')
+                metrics.inc('retries', stage='connect')
                 time.sleep(1 * (attempt + 1))
-        response.raise_for_status()
-        total = int(response.headers.get('content-length', 0))
-        downloaded = 0
-        with open(output_file, 'wb') as file:
+        # 校验或写入出错时也要关闭流式响应，连接才能归还连接池
+        try:
+            if offset and response.status_code == 416:
+                # 断点超出文件范围：.part 可能已完整，否则作废重下
+                match = re.match(r'bytes\s+\*/(\d+)', response.headers.get('Content-Range', ''))
+                if match and int(match.group(1)) == offset:
+                    response.close()
+                    return self._finish_download(part_file, output_file, offset, None, log_func)
+                os.remove(part_file)
+                raise Exception(f"断点续传位置无效({offset}字节)，已删除临时文件，将重新下载")
+            self._check_expired(response)
+            response.raise_for_status()
             md5 = hashlib.md5()
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    file.write(chunk)
-                    md5.update(chunk)
-                    downloaded += len(chunk)
-                    if total > 0:
-                        percent = downloaded * 100 // total
-                        log_func(f"\r下载进度: {percent}% ({downloaded // 1024}KB/{total // 1024}KB)", level='info')
-        
+            if offset and response.status_code == 206:
+                content_range = self._parse_content_range(response.headers.get('Content-Range'))
+                if not content_range or content_range[0] != offset:
+                    os.remove(part_file)
+                    raise Exception(f"Content-Range 与断点不一致: {response.headers.get('Content-Range')}")
+                length = int(response.headers.get('content-length', 0))
+                total = content_range[2] or (offset + length if length else 0)
+                mode = 'ab'
+                log_func(f"断点续传: 从 {offset // 1024}KB 处继续下载 {os.path.basename(output_file)}", level='info')
+                # 续传时先把已有部分计入MD5
+                with open(part_file, 'rb') as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                        md5.update(chunk)
+            else:
+                if offset:
+                    log_func("服务器不支持断点续传，从头开始下载", level='warning')
+                offset = 0
+                total = int(response.headers.get('content-length', 0))
+                mode = 'wb'
+            progress = self._progress(total, log_func, output_file, done=offset)
+            try:
+                with open(part_file, mode) as file:
+                    for chunk in self._iter_body(response):
+                        file.write(chunk)
+                        md5.update(chunk)
+                        progress.update(len(chunk))
+            finally:
+                metrics.inc('bytes', progress.done - offset, stage='download')
+        finally:
+            response.close()
+        return self._finish_download(part_file, output_file, total, md5, log_func)
+
+    def _finish_download(self, part_file, output_file, total, md5, log_func=print):
+        """校验 .part 文件大小，完整后重命名为正式文件"""
         # 验证文件完整性
-        file_size = os.path.getsize(output_file)
-        if total > 0 and file_size != total:
+        file_size = os.path.getsize(part_file)
+        if total and file_size != total:
+            if file_size > total:
+                # 超出预期长度说明临时文件已损坏，不能再续传
+                os.remove(part_file)
             raise Exception(f"文件大小不匹配: 预期 {total} 字节, 实际 {file_size} 字节")
-            
+        if md5 is None:
+            md5 = hashlib.md5()
+            with open(part_file, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    md5.update(chunk)
+        os.replace(part_file, output_file)
+        self.checksums[output_file] = md5.hexdigest()
         log_func(f"\n文件已成功下载并保存为: {output_file} (MD5: {md5.hexdigest()})", level='info')
         self._partial_files.discard(output_file)
         return True
 
+    def _probe_range_support(self, url):
+        """用 Range: bytes=0-0 探测文件总长度，服务器不支持 Range 时返回 None"""
+        response = http_client.get(url, "cdn", headers={'Range': 'bytes=0-0'}, stream=True,
+                                   timeout=(self.connect_timeout, 20), allow_redirects=True)
+        try:
+            self._check_expired(response)
+            if response.status_code != 206:
+                return None
+            content_range = self._parse_content_range(response.headers.get('Content-Range'))
+            return content_range[2] if content_range else None
+        finally:
+            response.close()
+
+    @metrics.timed('download_segment')
+    def _download_segment(self, url, part_file, start, end, progress):
+        """下载 [start, end] 字节区间，按位置写入预分配的 .part 文件"""
+        response = http_client.get(url, "cdn", headers={'Range': f'bytes={start}-{end}'}, stream=True,
+                                   timeout=(self.connect_timeout, 20), allow_redirects=True)
+        position = start
+        try:
+            self._check_expired(response)
+            response.raise_for_status()
+            content_range = self._parse_content_range(response.headers.get('Content-Range'))
+            if response.status_code != 206 or not content_range or content_range[0] != start:
+                raise Exception(f"分段 {start}-{end} 未返回正确的 Content-Range: {response.headers.get('Content-Range')}")
+            with open(part_file, 'r+b') as file:
+                fd = file.fileno()
+                for chunk in self._iter_body(response):
+                    if position + len(chunk) > end + 1:
+                        raise Exception(f"分段 {start}-{end} 返回数据超出范围")
+                    if hasattr(os, 'pwrite'):
+                        os.pwrite(fd, chunk, position)
+                    else:
+                        file.seek(position)
+                        file.write(chunk)
+                    position += len(chunk)
+                    progress.update(len(chunk))
+        finally:
+            response.close()
+            metrics.inc('bytes', position - start, stage='download')
+        if position != end + 1:
+            raise Exception(f"分段 {start}-{end} 不完整: 实际写入 {position - start} 字节")
+
+    def _download_segmented(self, url, output_file, log_func=print):
+        """
+        分段并行下载：探测总长度后切分为 segments 个区间并行拉取，写入预分配文件，
+        服务器不支持 Range 或文件较小时回退为单连接下载
+        """
+        total = self._probe_range_support(url)
+        if not total or total < self.min_segment_size * 2:
+            if total is None:
+                log_func("服务器不支持 Range，回退为单连接下载", level='info')
+            return self._download_once(url, output_file, log_func=log_func)
+        segments = min(self.segments, total // self.min_segment_size)
+        part_file = self.part_file(output_file)
+        self._partial_files.add(output_file)
+        step = total // segments
+        ranges = [(i * step, total - 1 if i == segments - 1 else (i + 1) * step - 1) for i in range(segments)]
+        log_func(f"分段下载: {os.path.basename(output_file)} ({total // 1024}KB, {segments} 段)", level='info')
+        progress = self._progress(total, log_func, output_file)
+
+        try:
+            # 预分配完整大小，各分段按偏移直接写入
+            with open(part_file, 'wb') as file:
+                file.truncate(total)
+            with ThreadPoolExecutor(max_workers=segments, thread_name_prefix='m4a-seg') as executor:
+                futures = [executor.submit(self._download_segment, url, part_file, start, end, progress)
+                           for start, end in ranges]
+                for future in futures:
+                    future.result()
+            return self._finish_download(part_file, output_file, total, None, log_func)
+        except Exception:
+            # 预分配文件中间有空洞，不能用于断点续传，失败时直接删除
+            if os.path.exists(part_file):
+                os.remove(part_file)
+            raise
+
     def download_m4a(self, url, output_file, log_func=print):
         for attempt in range(1, self.max_retries + 1):
             try:
-                # 控制请求频率
-                now = time.time()
-                if now - self._last_request_time < self.retry_delay:  # 使用统一延迟设置
-                    wait_time = self.retry_delay - (now - self._last_request_time)
-                    log_func(f"等待{wait_time:.1f}秒避免风控...", level='info')
-                    time.sleep(wait_time)
-                
-                self._last_request_time = time.time()
+                # 已有 .part 时走单连接断点续传，否则大文件可分段并行下载
+                if self.segments > 1 and not os.path.exists(self.part_file(output_file)):
+                    return self._download_segmented(url, output_file, log_func=log_func)
                 return self._download_once(url, output_file, log_func=log_func)
             except BlockedException as e:
                 log_func(f"\n风控触发: {e}", level='error')
                 raise  # 向上抛出风控异常
+            except UrlExpiredError:
+                raise  # 由上层重新解析播放地址
             except requests.exceptions.RequestException as e:
                 error_msg = str(e)
                 if hasattr(e, 'response') and e.response:
                     try:
                         error_data = e.response.json()
                         if error_data.get('ret') == 1001:  # 风控错误码
+                            get_limiter("cdn").on_blocked()
                             log_func(f"\n风控触发({attempt}/{self.max_retries}): {error_data.get('msg')}", level='warning')
                             if attempt < self.max_retries:
                                 wait_time = self.retry_delay * attempt  # 指数退避
                                 log_func(f"等待{wait_time}秒后重试...", level='info')
+                                metrics.inc('retries', stage='download')
                                 time.sleep(wait_time)
                                 continue
                     except ValueError:
@@ -119,18 +343,30 @@ class M4ADownloader:
                 if attempt < self.max_retries:
                     wait_time = self.retry_delay * attempt  # 指数退避
                     log_func(f"等待{wait_time}秒后重试...", level='info')
+                    metrics.inc('retries', stage='download')
                     time.sleep(wait_time)
                 else:
                     log_func(f"多次重试失败，跳过该文件: {output_file}", level='error')
-                    # 保存进度以便断点续传
-                    if os.path.exists(output_file):
-                        log_func(f"保留部分下载文件以便续传: {output_file}", level='info')
+                    # 保留 .part 文件以便断点续传
+                    if os.path.exists(self.part_file(output_file)):
+                        log_func(f"保留部分下载文件以便续传: {self.part_file(output_file)}", level='info')
         return False
 
-    def get_track_download_url(self, track_id, album_id=None):
+    def get_track_download_url(self, track_id, album_id=None, use_cache=True):
         """
         统一获取track的真实下载url，外部只需传track_id和可选album_id
+        优先使用未过期的缓存地址，use_cache=False 时强制重新解析
         """
+        cache = get_url_cache()
+        if use_cache:
+            url = cache.get(track_id, album_id)
+            if url:
+                return url
+        url = self._resolve_track_download_url(track_id, album_id)
+        cache.put(track_id, album_id, url)
+        return url
+
+    def _resolve_track_download_url(self, track_id, album_id=None):
         from fetcher.track_fetcher import fetch_track_crypted_url
         from utils.utils import decrypt_url
         from requests.exceptions import SSLError
@@ -146,6 +382,7 @@ class M4ADownloader:
             except SSLError as e:
                 if attempt == max_retries:
                     raise
+                metrics.inc('retries', stage='baseinfo')
                 time.sleep(1 * attempt)  # 指数退避
             except TypeError:
                 if attempt == max_retries:
@@ -153,6 +390,7 @@ class M4ADownloader:
                     if crypted_url:
                         return decrypt_url(crypted_url)
                     return None
+                metrics.inc('retries', stage='baseinfo')
                 time.sleep(1 * attempt)
 
     def download_from_url(self, url, output_file, log_func=print):
@@ -160,27 +398,36 @@ class M4ADownloader:
         直接下载指定url到本地文件，带重试和日志
         """
         log_func(f'正在下载: {output_file}', level='info')
-        self.download_m4a(url, output_file, log_func=log_func)
+        if not self.download_m4a(url, output_file, log_func=log_func):
+            raise Exception(f'下载失败: {output_file}')
         log_func('下载完成', level='info')
         return True
 
-    def download_track_by_id(self, track_id, album_id=None, output_file=None, log_func=print):
+    def download_track_by_id(self, track_id, album_id=None, output_file=None, log_func=print, url=None):
         """
         通过track_id和album_id直接下载音频到指定文件
+        已解析过的播放地址可通过url传入，避免重复请求baseInfo
         """
         try:
-            url = self.get_track_download_url(track_id, album_id)
+            if not url:
+                url = self.get_track_download_url(track_id, album_id)
             if not url:
                 log_func(f'未获取到下载URL: track_id={track_id}', level='error')
                 raise Exception('未获取到下载URL')
-            self.download_from_url(url, output_file, log_func=log_func)
-        except Exception as e:
-            if output_file and os.path.exists(output_file):
-                try:
-                    os.remove(output_file)
-                    log_func(f'已清理失败下载文件: {output_file}', level='info')
-                except Exception as cleanup_err:
-                    log_func(f'清理失败文件出错: {cleanup_err}', level='warning')
+            try:
+                self.download_from_url(url, output_file, log_func=log_func)
+            except UrlExpiredError as e:
+                # 缓存或传入的地址已失效：丢弃缓存，重新解析一次再下载
+                log_func(f'{e}，重新解析播放地址: track_id={track_id}', level='warning')
+                get_url_cache().invalidate(track_id, album_id)
+                url = self.get_track_download_url(track_id, album_id, use_cache=False)
+                if not url:
+                    raise Exception('未获取到下载URL')
+                self.download_from_url(url, output_file, log_func=log_func)
+        except Exception:
+            # 未完成的数据保存在 .part 中，下次从断点继续，不再删除
+            if output_file and os.path.exists(self.part_file(output_file)):
+                log_func(f'保留部分下载文件以便续传: {self.part_file(output_file)}', level='info')
             raise
 
 # 兼容旧接口，统一对外调用
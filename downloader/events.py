@@ -0,0 +1,191 @@
+import itertools
+import threading
+from dataclasses import dataclass, asdict
+from typing import ClassVar, Optional
+
+# 下载过程的结构化事件：下载线程只构造事件并 publish，不做任何字符串格式化或界面调用；
+# 界面、命令行、指标统计各自订阅，需要限制刷新频率的订阅者套一层 CoalescingDispatcher
+
+
+@dataclass(frozen=True)
+class Event:
+    kind: ClassVar[str] = 'event'
+
+    @property
+    def coalesce_key(self):
+        """相同 key 的事件在分发前只保留最新一条，None 表示每条都要送达"""
+        return None
+
+    def to_dict(self):
+        return {'type': self.kind, **asdict(self)}
+
+
+@dataclass(frozen=True)
+class TrackQueued(Event):
+    kind: ClassVar[str] = 'track_queued'
+    album_id: Optional[int]
+    track_id: str
+    filename: str
+    index: int
+
+
+@dataclass(frozen=True)
+class TrackStarted(Event):
+    kind: ClassVar[str] = 'track_started'
+    album_id: Optional[int]
+    track_id: str
+    filename: str
+    index: int
+    attempt: int
+
+
+@dataclass(frozen=True)
+class BytesProgress(Event):
+    """单个文件的下载字节进度，path 为最终保存路径（与 TrackStarted 的 filename 对应）"""
+    kind: ClassVar[str] = 'bytes_progress'
+    path: str
+    done: int
+    total: int
+
+    @property
+    def coalesce_key(self):
+        return ('bytes', self.path)
+
+
+@dataclass(frozen=True)
+class TrackCompleted(Event):
+    kind: ClassVar[str] = 'track_completed'
+    album_id: Optional[int]
+    track_id: str
+    filename: str
+    path: str
+    size: Optional[int]
+
+
+@dataclass(frozen=True)
+class TrackFailed(Event):
+    """final=False 表示还会重试"""
+    kind: ClassVar[str] = 'track_failed'
+    album_id: Optional[int]
+    track_id: str
+    filename: str
+    error: str
+    final: bool
+
+
+@dataclass(frozen=True)
+class Blocked(Event):
+    kind: ClassVar[str] = 'blocked'
+    album_id: Optional[int]
+    reason: str
+
+
+@dataclass(frozen=True)
+class AlbumProgress(Event):
+    """专辑级进度，对应原来的 progress_func(current, total, filename)"""
+    kind: ClassVar[str] = 'album_progress'
+    album_id: int
+    current: int
+    total: int
+    filename: Optional[str]
+
+    @property
+    def coalesce_key(self):
+        return ('album', self.album_id)
+
+
+@dataclass(frozen=True)
+class AlbumFinished(Event):
+    kind: ClassVar[str] = 'album_finished'
+    album_id: int
+    downloaded: int
+    total: Optional[int]
+    failed: int
+    blocked: bool
+
+
+class EventBus:
+    """
+    进程内事件总线：publish 在调用线程中同步调用各订阅者，订阅者应当很快返回（或交给 CoalescingDispatcher）；
+    订阅者抛出的异常只计数，不影响下载
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = ()
+        self.errors = 0
+
+    def subscribe(self, handler, *types):
+        """订阅事件，types 为空时接收全部事件；返回 handler，便于之后取消订阅"""
+        with self._lock:
+            self._subscribers = self._subscribers + ((handler, types or (Event,)),)
+        return handler
+
+    def unsubscribe(self, handler):
+        with self._lock:
+            self._subscribers = tuple(s for s in self._subscribers if s[0] is not handler)
+
+    def publish(self, event):
+        for handler, types in self._subscribers:
+            if isinstance(event, types):
+                try:
+                    handler(event)
+                except Exception:
+                    self.errors += 1
+
+
+class CoalescingDispatcher:
+    """
+    合并分发器：作为订阅者收集事件，每 interval 秒最多向 handler 分发一批；
+    同一 coalesce_key 的事件（字节进度、专辑进度）只保留最新一条并保持首次出现的位置，其余事件按顺序全部送达。
+    可调用 start() 由后台线程定时分发，也可由界面线程自行定时调用 drain()（例如 Tk 的 after 循环）
+    """
+    def __init__(self, handler, interval=0.25):
+        self.handler = handler
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._counter = itertools.count()
+        self._stop = threading.Event()
+        self._thread = None
+        self.received = 0
+        self.dispatched = 0
+
+    def __call__(self, event):
+        key = event.coalesce_key
+        with self._lock:
+            self.received += 1
+            self._pending[key if key is not None else next(self._counter)] = event
+
+    def drain(self):
+        """把当前积压的事件分发给 handler，返回分发条数；在哪个线程调用就在哪个线程执行 handler"""
+        with self._lock:
+            if not self._pending:
+                return 0
+            pending, self._pending = self._pending, {}
+        for event in pending.values():
+            self.handler(event)
+        self.dispatched += len(pending)
+        return len(pending)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.drain()
+        self.drain()
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='event-dispatcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """停止后台线程并分发剩余事件"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.drain()
+
+# 如需在其他模块订阅下载事件，请使用：
+# from downloader.events import EventBus, CoalescingDispatcher, BytesProgress, AlbumProgress
@@ -0,0 +1,175 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from utils import metrics
+
+
+class ProgressStore:
+    """
+    专辑下载进度存储：download_progress.json 快照 + download_progress.journal 追加日志
+
+    每次状态变化只向日志追加一行 JSON，按批次/时间间隔统一 fsync（group commit），
+    日志条数达到阈值时再压缩成快照并清空日志。重启时读取快照并重放日志即可恢复。
+    快照格式与原先的 download_progress.json 相同：{页码: {'done': bool, 'tracks': {track_id: 状态}}, 'blocked': bool}
+    """
+    SNAPSHOT_NAME = 'download_progress.json'
+    JOURNAL_NAME = 'download_progress.journal'
+
+    def __init__(self, save_dir, sync_interval=1.0, sync_batch=64, compact_every=1000, log_func=print):
+        self.snapshot_file = os.path.join(save_dir, self.SNAPSHOT_NAME)
+        self.journal_file = os.path.join(save_dir, self.JOURNAL_NAME)
+        self.sync_interval = sync_interval  # 距上次 fsync 超过该秒数时同步
+        self.sync_batch = sync_batch  # 累积该数量的未同步记录时同步
+        self.compact_every = compact_every  # 日志记录数达到该值时压缩为快照
+        self.log = log_func
+        self.data = None
+        self._lock = threading.RLock()
+        self._journal = None
+        self._journal_entries = 0
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def load(self):
+        """读取快照并重放日志，返回进度字典"""
+        with self._lock:
+            data = {}
+            if os.path.exists(self.snapshot_file):
+                try:
+                    with open(self.snapshot_file, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                except Exception:
+                    data = {}
+            entries = 0
+            if os.path.exists(self.journal_file):
+                with open(self.journal_file, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            # 最后一行可能因进程中断而不完整，忽略其后的内容
+                            break
+                        self._apply(data, record)
+                        entries += 1
+            self.data = data
+            self._journal_entries = entries
+            return data
+
+    @staticmethod
+    def _apply(data, record):
+        if 't' in record:
+            page = data.setdefault(record['p'], {})
+            page.setdefault('tracks', {})[record['t']] = record['s']
+        elif 'done' in record:
+            data.setdefault(record['p'], {})['done'] = record['done']
+        elif 'k' in record:
+            data[record['k']] = record['v']
+
+    def _ensure_loaded(self):
+        if self.data is None:
+            self.load()
+
+    @metrics.timed('progress')
+    def _append(self, record):
+        self._ensure_loaded()
+        self._apply(self.data, record)
+        if self._journal is None:
+            self._journal = open(self.journal_file, 'a', encoding='utf-8')
+        self._journal.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self._journal.flush()
+        self._journal_entries += 1
+        self._unsynced += 1
+        if self._unsynced >= self.sync_batch or time.monotonic() - self._last_sync >= self.sync_interval:
+            self.sync()
+        if self._journal_entries >= self.compact_every:
+            self.compact()
+
+    def update_track(self, page, track_id, state):
+        with self._lock:
+            self._append({'p': str(page), 't': str(track_id), 's': state})
+
+    def mark_page_done(self, page, done=True):
+        with self._lock:
+            self._append({'p': str(page), 'done': done})
+
+    def mark_page_done_if_complete(self, page):
+        """本页已记录的track全部完成时标记整页完成"""
+        with self._lock:
+            page_progress = self.get_page(page)
+            tracks_progress = page_progress.get('tracks', {})
+            all_done = all(t.get('done') for t in tracks_progress.values()) and len(tracks_progress) >= 1
+            if all_done and not page_progress.get('done'):
+                self.mark_page_done(page)
+
+    def set(self, key, value):
+        with self._lock:
+            self._append({'k': key, 'v': value})
+
+    def get_page(self, page):
+        with self._lock:
+            self._ensure_loaded()
+            return self.data.get(str(page), {})
+
+    def sync(self):
+        """把已写入日志的记录落盘"""
+        with self._lock:
+            if self._journal is not None and self._unsynced:
+                os.fsync(self._journal.fileno())
+            self._unsynced = 0
+            self._last_sync = time.monotonic()
+
+    def replace(self, data):
+        """用完整的进度字典覆盖当前状态并立即压缩"""
+        with self._lock:
+            self.data = data
+            self.compact()
+
+    @metrics.timed('progress_compact')
+    def compact(self, max_retries=3, retry_delay=0.5):
+        """把当前状态原子写入快照，然后清空日志"""
+        with self._lock:
+            self._ensure_loaded()
+            for attempt in range(1, max_retries + 1):
+                tmp_file = None
+                try:
+                    # Windows兼容的原子写入方式
+                    tf = tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=os.path.dirname(self.snapshot_file), delete=False)
+                    tmp_file = tf.name
+                    json.dump(self.data, tf, ensure_ascii=False)
+                    tf.flush()
+                    os.fsync(tf.fileno())
+                    tf.close()  # 显式关闭文件句柄
+                    os.replace(tmp_file, self.snapshot_file)
+                    break
+                except Exception as e:
+                    if tmp_file and os.path.exists(tmp_file):
+                        try:
+                            os.remove(tmp_file)
+                        except OSError:
+                            pass
+                    if attempt == max_retries:
+                        self.log(f'保存进度失败(尝试{attempt}次): {e}', level='error')
+                        raise
+                    time.sleep(retry_delay * attempt)
+            # 快照已包含日志中的全部状态，日志可以清空
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            with open(self.journal_file, 'w', encoding='utf-8'):
+                pass
+            self._journal_entries = 0
+            self._unsynced = 0
+            self._last_sync = time.monotonic()
+
+    def close(self):
+        """结束时压缩为快照并关闭日志文件"""
+        with self._lock:
+            if self.data is None:
+                return
+            self.compact()
+            if os.path.exists(self.journal_file):
+                os.remove(self.journal_file)
+
+# 如需在其他模块调用 ProgressStore，请使用：
+# from downloader.progress_store import ProgressStore
@@ -1,7 +1,24 @@
 import os
 from downloader.downloader import Downloader
+from downloader.state_db import StateDB
+from downloader.events import TrackStarted, TrackCompleted, TrackFailed
 
-def download_single_track(track_id, album_id=None, filename=None, log_func=print, save_dir=None):
+def _done_path(state_db, track_id, filename=None, save_dir=None):
+    """状态库中已完成、且文件仍在本次保存目录中（指定了文件名时还需同名）的音频返回其路径，否则返回 None"""
+    if not state_db or not state_db.is_done(track_id):
+        return None
+    path = state_db.get_track(track_id)['path']
+    if not path or not os.path.exists(path):
+        return None
+    if os.path.dirname(os.path.abspath(path)) != os.path.abspath(save_dir or '.'):
+        return None
+    if filename and os.path.basename(path) != filename:
+        return None
+    return path
+
+
+def download_single_track(track_id, album_id=None, filename=None, log_func=print, save_dir=None, segments=1, state_db=None,
+                          events=None):
     """
     下载单个音频文件
     :param track_id: 音频ID
@@ -9,8 +26,19 @@ def download_single_track(track_id, album_id=None, filename=None, log_func=print
     :param filename: 保存文件名，默认使用音频标题.m4a
     :param log_func: 日志输出函数，支持level参数
     :param save_dir: 保存目录
+    :param segments: 分段并行下载的段数，大文件可提高下载速度
+    :param state_db: 可选的 SQLite 状态库（StateDB 实例或数据库路径），记录下载结果
+    :param events: 可选的事件总线（downloader.events.EventBus），发布开始/字节进度/完成/失败事件
     """
     from fetcher.track_info_fetcher import get_track_info
+    state_db = StateDB.open(state_db)
+    done_path = _done_path(state_db, track_id, filename, save_dir)
+    if done_path:
+        log_func(f'单曲已下载，跳过: {done_path}', level='info')
+        if events is not None:
+            events.publish(TrackCompleted(album_id, str(track_id), os.path.basename(done_path), done_path,
+                                          os.path.getsize(done_path)))
+        return True
     # 获取音频信息用于文件名
     track_info = get_track_info(int(track_id))
     if not track_info or not track_info.title:
@@ -24,11 +52,24 @@ def download_single_track(track_id, album_id=None, filename=None, log_func=print
         filepath = os.path.join(save_dir, filename)
     else:
         filepath = filename
-    downloader = Downloader()
+    downloader = Downloader(segments=segments, events=events)
+    if state_db:
+        state_db.mark_downloading(track_id, album_id, title=track_info.title, filename=filename, path=filepath)
+    if events is not None:
+        events.publish(TrackStarted(album_id, str(track_id), filename, 1, 1))
     try:
         downloader.download_track_by_id(track_id, album_id, filepath, log_func=log_func)
         log_func(f'单曲下载完成: {filename}', level='info')
+        size = os.path.getsize(filepath)
+        if state_db:
+            state_db.mark_done(track_id, album_id, path=filepath, size=size, md5=downloader.checksums.get(filepath))
+        if events is not None:
+            events.publish(TrackCompleted(album_id, str(track_id), filename, filepath, size))
         return True
     except Exception as e:
         log_func(f'单曲下载失败: {e}', level='error')
+        if state_db:
+            state_db.mark_failed(track_id, album_id, error=str(e))
+        if events is not None:
+            events.publish(TrackFailed(album_id, str(track_id), filename, str(e), True))
         return False
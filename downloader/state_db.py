@@ -0,0 +1,167 @@
+import os
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS albums (
+    album_id INTEGER PRIMARY KEY,
+    title TEXT,
+    save_dir TEXT,
+    update_date TEXT,
+    total_count INTEGER,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS tracks (
+    track_id INTEGER PRIMARY KEY,
+    album_id INTEGER,
+    idx INTEGER,
+    title TEXT,
+    filename TEXT,
+    path TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    bytes INTEGER DEFAULT 0,
+    total_bytes INTEGER,
+    md5 TEXT,
+    error TEXT,
+    attempts INTEGER DEFAULT 0,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_tracks_album_status ON tracks(album_id, status);
+CREATE INDEX IF NOT EXISTS idx_tracks_status ON tracks(status);
+"""
+
+# 下载状态
+STATUS_PENDING = 'pending'
+STATUS_DOWNLOADING = 'downloading'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+STATUS_BLOCKED = 'blocked'
+
+
+class StateDB:
+    """
+    可选的 SQLite 下载状态库：记录所有专辑与音频的下载状态、已下载字节、校验和与错误信息，
+    以 trackId / albumId 建索引，可跨专辑查询（例如所有失败的音频）
+    """
+    def __init__(self, path):
+        self.path = path
+        dir_name = os.path.dirname(os.path.abspath(path))
+        os.makedirs(dir_name, exist_ok=True)
+        self._lock = threading.Lock()
+        # 多个下载线程共用一个连接，由 _lock 串行化
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(SCHEMA)
+
+    @classmethod
+    def open(cls, state_db):
+        """接受 StateDB 实例或数据库文件路径，None 表示不启用"""
+        if state_db is None or isinstance(state_db, StateDB):
+            return state_db
+        return cls(state_db)
+
+    def _execute(self, sql, params=()):
+        with self._lock, self._conn:
+            return self._conn.execute(sql, params)
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    def upsert_album(self, album_id, title=None, save_dir=None, update_date=None, total_count=None):
+        self._execute(
+            """INSERT INTO albums (album_id, title, save_dir, update_date, total_count, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT(album_id) DO UPDATE SET
+                   title=COALESCE(excluded.title, title),
+                   save_dir=COALESCE(excluded.save_dir, save_dir),
+                   update_date=COALESCE(excluded.update_date, update_date),
+                   total_count=COALESCE(excluded.total_count, total_count),
+                   updated_at=excluded.updated_at""",
+            (int(album_id), title, save_dir, update_date, total_count, time.time()))
+
+    def get_album(self, album_id):
+        rows = self._query('SELECT * FROM albums WHERE album_id = ?', (int(album_id),))
+        return rows[0] if rows else None
+
+    def upsert_track(self, track_id, album_id=None, **fields):
+        """写入/更新单个音频的状态，fields 为 tracks 表的列（idx、title、filename、path、status 等）"""
+        fields = {k: v for k, v in fields.items() if v is not None}
+        fields['updated_at'] = time.time()
+        columns = ['track_id', 'album_id'] + list(fields)
+        values = [int(track_id), int(album_id) if album_id is not None else None] + list(fields.values())
+        updates = ', '.join(f'{col}=excluded.{col}' for col in fields)
+        if album_id is not None:
+            updates += ', album_id=excluded.album_id'
+        self._execute(
+            f"INSERT INTO tracks ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+            f"ON CONFLICT(track_id) DO UPDATE SET {updates}",
+            values)
+
+    def mark_downloading(self, track_id, album_id=None, **fields):
+        self.upsert_track(track_id, album_id, status=STATUS_DOWNLOADING, **fields)
+        self._execute('UPDATE tracks SET attempts = attempts + 1 WHERE track_id = ?', (int(track_id),))
+
+    def mark_done(self, track_id, album_id=None, path=None, size=None, md5=None, **fields):
+        self.upsert_track(track_id, album_id, status=STATUS_DONE, path=path, bytes=size, total_bytes=size, md5=md5, **fields)
+        self._execute("UPDATE tracks SET error = NULL WHERE track_id = ?", (int(track_id),))
+
+    def mark_failed(self, track_id, album_id=None, error='', partial_bytes=None, blocked=False, **fields):
+        status = STATUS_BLOCKED if blocked else STATUS_FAILED
+        self.upsert_track(track_id, album_id, status=status, error=error, bytes=partial_bytes, **fields)
+
+    def get_track(self, track_id):
+        rows = self._query('SELECT * FROM tracks WHERE track_id = ?', (int(track_id),))
+        return rows[0] if rows else None
+
+    def is_done(self, track_id):
+        rows = self._query('SELECT 1 FROM tracks WHERE track_id = ? AND status = ?', (int(track_id), STATUS_DONE))
+        return bool(rows)
+
+    def done_track_ids(self, album_id):
+        """专辑内已完成的 trackId 集合（一次索引查询）"""
+        rows = self._query('SELECT track_id FROM tracks WHERE album_id = ? AND status = ?', (int(album_id), STATUS_DONE))
+        return {row['track_id'] for row in rows}
+
+    def done_track_paths(self, album_id, save_dir=None):
+        """
+        专辑内已完成音频的 {trackId: 文件路径}（一次索引查询）；给出 save_dir 时只保留文件位于该目录中的记录，
+        同一专辑下载到其他目录时不会误认为已完成。文件是否仍存在由调用方核对
+        """
+        rows = self._query('SELECT track_id, path FROM tracks WHERE album_id = ? AND status = ?',
+                           (int(album_id), STATUS_DONE))
+        paths = {row['track_id']: row['path'] for row in rows if row['path']}
+        if save_dir is None:
+            return paths
+        save_dir = os.path.abspath(save_dir)
+        return {track_id: path for track_id, path in paths.items()
+                if os.path.dirname(os.path.abspath(path)) == save_dir}
+
+    def album_tracks(self, album_id, status=None):
+        if status:
+            return self._query('SELECT * FROM tracks WHERE album_id = ? AND status = ? ORDER BY idx', (int(album_id), status))
+        return self._query('SELECT * FROM tracks WHERE album_id = ? ORDER BY idx', (int(album_id),))
+
+    def failed_tracks(self, album_id=None):
+        """所有专辑（或指定专辑）中失败/被风控中断的音频"""
+        if album_id is not None:
+            return self._query('SELECT * FROM tracks WHERE album_id = ? AND status IN (?, ?) ORDER BY idx',
+                               (int(album_id), STATUS_FAILED, STATUS_BLOCKED))
+        return self._query('SELECT * FROM tracks WHERE status IN (?, ?) ORDER BY album_id, idx',
+                           (STATUS_FAILED, STATUS_BLOCKED))
+
+    def summary(self):
+        """按状态统计音频数量"""
+        rows = self._query('SELECT status, COUNT(*) AS count FROM tracks GROUP BY status')
+        return {row['status']: row['count'] for row in rows}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+# 如需在其他模块调用 StateDB，请使用：
+# from downloader.state_db import StateDB
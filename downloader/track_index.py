@@ -0,0 +1,118 @@
+import json
+import os
+import tempfile
+import threading
+
+# 文件大于该字节数才视为下载完成（与原先按文件名判断时的阈值相同）
+MIN_COMPLETE_SIZE = 1024 * 10
+
+
+class TrackIndex:
+    """
+    专辑目录的本地索引 track_index.json：{trackId: {'filename', 'size', 'md5'}}
+
+    打开时只对目录做一次 os.scandir（只读文件名，不逐个 stat），索引中文件已不存在的条目丢弃；
+    之后“某个 track 是否已下载”是一次字典查找，下载完成时增量更新。曲目换页、改名都不影响判断。
+    索引中没有的已有文件（旧版本下载的、或上次索引未来得及保存的）按文件名匹配，大小超过阈值时补进索引。
+    下载先写 .part 再改名，目录中的 .m4a 都是完整写完的，因此不再逐个核对大小
+    """
+    INDEX_NAME = 'track_index.json'
+
+    def __init__(self, save_dir, save_every=50):
+        self.save_dir = save_dir
+        self.index_file = os.path.join(save_dir, self.INDEX_NAME)
+        self.save_every = save_every  # 每下载完成该数量的音频落盘一次，其余在 close 时落盘
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # 串行化落盘，避免旧内容覆盖新内容
+        self._entries = {}
+        self._files = {}  # 目录中的 .m4a 文件名 -> DirEntry（scandir 结果，补入时才 stat），下载完成的记为大小
+        self._dirty = 0
+        self._recorded = 0
+        self.load()
+
+    def load(self):
+        """读取索引并与一次 scandir 的结果核对"""
+        entries = {}
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, 'r', encoding='utf-8') as f:
+                    entries = json.load(f)
+            except (OSError, ValueError):
+                entries = {}
+        with os.scandir(self.save_dir) as it:
+            files = {entry.name: entry for entry in it if entry.name.endswith('.m4a')}
+        stale = [track_id for track_id, item in entries.items() if item.get('filename') not in files]
+        for track_id in stale:
+            del entries[track_id]
+        with self._lock:
+            self._entries = entries
+            self._files = files
+            self._dirty = len(stale)
+        return entries
+
+    def lookup(self, track_id, filename=None):
+        """
+        返回已下载 track 的索引条目，未下载返回 None。
+        索引中没有时，若目录中存在同名且足够大的文件，视为已下载并补进索引
+        """
+        track_id = str(track_id)
+        with self._lock:
+            item = self._entries.get(track_id)
+            if item is not None:
+                return item
+            entry = self._files.get(filename) if filename else None
+            if entry is None:
+                return None
+            try:
+                size = entry if isinstance(entry, int) else entry.stat().st_size
+            except OSError:
+                return None
+            if size <= MIN_COMPLETE_SIZE:
+                return None
+            # 补入的条目下次仍能按文件名重建，不触发中途落盘，留到 close 时一起保存
+            item = self._entries[track_id] = {'filename': filename, 'size': size, 'md5': None}
+            self._dirty += 1
+        return item
+
+    def record(self, track_id, filename, size, md5=None):
+        """下载完成后更新索引，每累积 save_every 条落盘一次"""
+        with self._lock:
+            self._entries[str(track_id)] = {'filename': filename, 'size': size, 'md5': md5}
+            self._files[filename] = size
+            self._dirty += 1
+            self._recorded += 1
+            due = self._recorded % self.save_every == 0
+        if due:
+            self.save()
+
+    def discard(self, track_id):
+        with self._lock:
+            if self._entries.pop(str(track_id), None) is not None:
+                self._dirty += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def save(self):
+        """原子写入索引文件"""
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                data = json.dumps(self._entries, ensure_ascii=False)
+                self._dirty = 0
+            tf = tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=self.save_dir, delete=False)
+            try:
+                with tf:
+                    tf.write(data)
+                os.replace(tf.name, self.index_file)
+            except OSError:
+                if os.path.exists(tf.name):
+                    os.remove(tf.name)
+                raise
+
+    def close(self):
+        self.save()
+
+# 如需在其他模块调用 TrackIndex，请使用：
+# from downloader.track_index import TrackIndex
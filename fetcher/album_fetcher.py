@@ -1,10 +1,5 @@
-import requests
-import os
-from dotenv import load_dotenv
 from dataclasses import dataclass
-
-load_dotenv()
-XIMALAYA_COOKIES = os.getenv("XIMALAYA_COOKIES", "")
+from utils.metadata_cache import cached_get
 
 @dataclass
 class Album:
@@ -16,26 +11,19 @@ class Album:
     richIntro: str
     tracks: list
 
-def fetch_album(album_id):
+def _has_album_info(response):
+    try:
+        return bool(response.json().get("data", {}).get("albumPageMainInfo"))
+    except Exception:
+        return False
+
+def fetch_album(album_id, ttl=None):
+    """
+    获取专辑信息，结果经元数据缓存：有效期内不发请求，ttl=0 时强制向服务器确认
+    """
     url = f"https://www.ximalaya.com/revision/album/v1/simple?albumId={album_id}"
-    headers = {
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
-        "Accept-Language": "en-US,en;q=0.9",
-        "Cache-Control": "max-age=0",
-        "Connection": "keep-alive",
-        "Sec-Fetch-Dest": "document",
-        "Sec-Fetch-Mode": "navigate",
-        "Sec-Fetch-Site": "none",
-        "Sec-Fetch-User": "?1",
-        "Upgrade-Insecure-Requests": "1",
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36",
-        "sec-ch-ua": '"Google Chrome";v="131", "Chromium";v="131", "Not_A Brand";v="24"',
-        "sec-ch-ua-mobile": "?0",
-        "sec-ch-ua-platform": '"Windows"',
-        "Cookie": XIMALAYA_COOKIES
-    }
     try:
-        response = requests.get(url, headers=headers)
+        response = cached_get(url, "album", ttl=ttl, cacheable=_has_album_info)
         response.raise_for_status()  # Raise an error for bad responses
         if response.status_code == 200:
             data = response.json()
@@ -1,9 +1,7 @@
-import json
-import requests
+from utils import http_client
 from fetcher.track_fetcher import fetch_track_crypted_url
 from utils.utils import decrypt_url
-from dotenv import load_dotenv
-import os
+from utils.config import get_env
 
 
 # Track 类定义
@@ -17,8 +15,6 @@ class Track:
     def __str__(self):
         return f"{self.item_title} - {self.child_title} , (ItemID:{self.item_id} - childID: {self.child_id})"
 
-load_dotenv()
-
 # 从环境变量读取 cookie 字符串，并转为字典
 def parse_cookies(cookie_string):
     cookies = {}
@@ -30,26 +26,15 @@ def parse_cookies(cookie_string):
 
 
 
-# 模拟请求头和 Cookies（从你的 curl 命令中提取）
+# 模拟请求头（从你的 curl 命令中提取，其余公共请求头由 http_client 统一合并）
 headers = {
-    'Accept': '*/*',
-    'Accept-Language': 'en,zh;q=0.9,zh-CN;q=0.8,zh-TW;q=0.7,ja;q=0.6',
-    'Connection': 'keep-alive',
-    'Content-Type': 'application/x-www-form-urlencoded;charset=UTF-8',
     'DNT': '1',
-    'Referer': 'https://www.ximalaya.com/my/listened',
-    'Sec-Fetch-Dest': 'empty',
-    'Sec-Fetch-Mode': 'cors',
-    'Sec-Fetch-Site': 'same-origin',
     'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.0.0 Safari/537.36',
     'sec-ch-ua': '"Google Chrome";v="135", "Not-A.Brand";v="8", "Chromium";v="135"',
     'sec-ch-ua-mobile': '?0',
     'sec-ch-ua-platform': '"macOS"',
 }
 
-cookie_string = os.getenv("XIMALAYA_COOKIES")
-cookies = parse_cookies(cookie_string)
-
 # cookies = {
 #     '_xmLog': 'h5&b12e781c-7288-41ba-aecb-0dba6f70ee01&2.4.24',
 #     'Hm_lvt_4a7d8ec50cfd6af753c4f8aee3425070': '1742965419',
@@ -71,30 +56,42 @@ cookies = parse_cookies(cookie_string)
 #     'assva5': 'U2FsdGVkX19xCwcmUH/3Dte+8hs9+z64eEfZa0o23FsdEoTRBqkQSxZ9I4mDSA7WTyB5PqhP/DeWgeWugIGXsg==',
 # }
 
-url = 'https://www.ximalaya.com/revision/track/history/listen?includeChannel=false&includeRadio=false'
-
-# 请求数据
-response = requests.get(url, headers=headers, cookies=cookies)
-
-# 解析返回的 JSON
-data = response.json()
-print(data)
-
-# 提取信息
-result = []
-tracks = []
-
-for section in ['today', 'yesterday', 'earlier']:
-    for item in data.get('data', {}).get(section, []):
-        track = Track(
-            item_title=item.get('itemTitle'),
-            child_title=item.get('childTitle'),
-            item_id=item.get('itemId'),
-            child_id=item.get('childId')
-        )
-        tracks.append(track)
-
-# 打印结果
-print("result:")
-for track in tracks:
-    print(f"{track.item_title}:" + decrypt_url(fetch_track_crypted_url(track.child_id, track.item_id)))
+HISTORY_URL = 'https://www.ximalaya.com/revision/track/history/listen?includeChannel=false&includeRadio=false'
+
+
+def fetch_listen_history():
+    """
+    获取收听历史（需配置 XIMALAYA_COOKIES），返回 Track 列表；仅在调用时请求网络
+    """
+    cookies = parse_cookies(get_env("XIMALAYA_COOKIES", ""))
+    # 请求数据
+    response = http_client.get(HISTORY_URL, 'history', headers=headers, cookies=cookies)
+    # 解析返回的 JSON
+    data = response.json()
+    tracks = []
+    for section in ['today', 'yesterday', 'earlier']:
+        for item in data.get('data', {}).get(section, []):
+            track = Track(
+                item_title=item.get('itemTitle'),
+                child_title=item.get('childTitle'),
+                item_id=item.get('itemId'),
+                child_id=item.get('childId')
+            )
+            tracks.append(track)
+    return tracks
+
+
+def resolve_history_url(track):
+    """解析收听历史中某条记录的播放地址"""
+    return decrypt_url(fetch_track_crypted_url(track.child_id, track.item_id))
+
+# 如需在其他模块调用，请使用：
+# from fetcher.history_fetch import fetch_listen_history
+
+
+if __name__ == '__main__':
+    tracks = fetch_listen_history()
+    # 打印结果
+    print("result:")
+    for track in tracks:
+        print(f"{track.item_title}:" + resolve_history_url(track))
@@ -1,17 +1,13 @@
 class BlockedException(Exception):
     pass
-import requests
-import os
-from utils.utils import decrypt_url
-from dotenv import load_dotenv
+from utils.utils import decrypt_url, decrypt_many
+from utils import http_client
+from utils.rate_limiter import get_limiter
+from utils.url_cache import get_url_cache
+from utils.metadata_cache import cached_get
+from utils import metrics
 from dataclasses import dataclass
 from typing import List, Optional
-import urllib3
-# 忽略 InsecureRequestWarning
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-
-load_dotenv()
-XIMALAYA_COOKIES = os.getenv("XIMALAYA_COOKIES", "")
 
 @dataclass
 class Track:
@@ -27,6 +23,7 @@ class Track:
     pageSize: Optional[int] = None    # 每页音频数量
     cover: Optional[str] = None       # 专辑封面
 
+@metrics.timed('baseinfo')
 def fetch_track_crypted_url(track_id: int, album_id: int) -> str:
     url = f"https://www.ximalaya.com/mobile-playpage/track/v3/baseInfo/{album_id}"
     params = {
@@ -34,17 +31,14 @@ def fetch_track_crypted_url(track_id: int, album_id: int) -> str:
         "trackId": track_id,
         "trackQualityLevel": 1
     }
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36",
-        "Accept": "application/json",
-        "Cookie": XIMALAYA_COOKIES
-    }
-    response = requests.get(url, headers=headers, params=params)
+    response = http_client.get(url, "baseinfo", params=params)
     if response.status_code == 200:
         data = response.json()
         # 检查风控
         if data.get("ret") == 1001 or "系统繁忙" in data.get("msg", ""):
             print(f"风控触发: track {track_id}: {response.status_code}, {response.text}")
+            # 通知全局限速器降速
+            get_limiter("baseinfo").on_blocked()
             raise BlockedException(f"系统繁忙，风控触发: {response.text}")
         play_url_list = data.get("trackInfo", {}).get("playUrlList", [])
         if play_url_list:
@@ -52,7 +46,38 @@ def fetch_track_crypted_url(track_id: int, album_id: int) -> str:
     print(f"Failed to fetch cryptedUrl for track {track_id}: {response.status_code}, {response.text}")
     return ""
 
-def fetch_album_tracks(album_id: int, page: int, page_size: int) -> List[Track]:
+def resolve_track_url(track: Track, album_id: int) -> str:
+    """
+    按需解析track的真实播放地址，结果缓存在track对象上，同一track只请求一次baseInfo
+    """
+    if track.url:
+        return track.url
+    cache = get_url_cache()
+    track.url = cache.get(track.trackId, album_id) or ""
+    if track.url:
+        return track.url
+    if not track.cryptedUrl:
+        track.cryptedUrl = fetch_track_crypted_url(track.trackId, album_id)
+    track.url = decrypt_url(track.cryptedUrl) if track.cryptedUrl else ""
+    cache.put(track.trackId, album_id, track.url)
+    return track.url
+
+def _is_track_page(response) -> bool:
+    """风控提示等异常响应不写入元数据缓存"""
+    try:
+        data = response.json()
+    except Exception:
+        return False
+    return data.get("ret") != 1001 and "trackDetailInfos" in (data.get("data") or {})
+
+@metrics.timed('listing')
+def fetch_album_tracks(album_id: int, page: int, page_size: int, resolve_urls: bool = True,
+                       ttl: Optional[float] = None) -> List[Track]:
+    """
+    分页获取专辑曲目；resolve_urls=False 时只返回元数据，不逐条请求 baseInfo，
+    播放地址留空，需要时再通过 resolve_track_url 或下载器按需解析。
+    分页结果经元数据缓存，ttl=0 时强制向服务器确认
+    """
     url = f"https://m.ximalaya.com/m-revision/common/album/queryAlbumTrackRecordsByPage"
     params = {
         "albumId": album_id,
@@ -60,37 +85,31 @@ def fetch_album_tracks(album_id: int, page: int, page_size: int) -> List[Track]:
         "pageSize": page_size
     }
     headers = {
-        "Accept": "application/json, text/javascript, */*; q=0.01",
-        "Accept-Language": "zh-CN,zh;q=0.9",
-        "Cache-Control": "no-cache",
-        "Connection": "keep-alive",
-        "Pragma": "no-cache",
         "Referer": f"https://www.ximalaya.com/album/{album_id}",
-        "Origin": "https://www.ximalaya.com",
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36",
-        "sec-ch-ua": '"Google Chrome";v="131", "Chromium";v="131", "Not_A Brand";v="24"',
-        "sec-ch-ua-mobile": "?0",
-        "sec-ch-ua-platform": '"Windows"',
-        "Cookie": XIMALAYA_COOKIES,
-        "X-Requested-With": "XMLHttpRequest"
     }
-    response = requests.get(url, headers=headers, params=params)
+    response = cached_get(url, "listing", headers=headers, params=params, ttl=ttl, cacheable=_is_track_page)
     if response.status_code == 200:
         data = response.json()
+        if data.get("ret") == 1001 or "系统繁忙" in str(data.get("msg", "")):
+            get_limiter("listing").on_blocked()
         track_list = data.get("data", {}).get("trackDetailInfos", [])
         tracks = []
+        cache = get_url_cache()
         try:
             for track in track_list:
                 track_info = track['trackInfo']
-                try:
-                    crypted_url = fetch_track_crypted_url(track_info["id"], album_id)
-                except BlockedException as be:
-                    print(f"风控终止专辑曲目拉取: {be}")
-                    # 直接抛出到外层
-                    raise
-                if not crypted_url:
-                    print(f"跳过: {track_info['title']}，无有效播放链接")
-                    continue
+                crypted_url = ""
+                cached_url = cache.get(track_info["id"], album_id) if resolve_urls else None
+                if resolve_urls and not cached_url:
+                    try:
+                        crypted_url = fetch_track_crypted_url(track_info["id"], album_id)
+                    except BlockedException as be:
+                        print(f"风控终止专辑曲目拉取: {be}")
+                        # 直接抛出到外层
+                        raise
+                    if not crypted_url:
+                        print(f"跳过: {track_info['title']}，无有效播放链接")
+                        continue
                 cover_path = track_info.get("cover")
                 cover_url = f"https://imagev2.xmcdn.com/{cover_path}" if cover_path and not cover_path.startswith("http") else cover_path
                 tracks.append(
@@ -100,7 +119,7 @@ def fetch_album_tracks(album_id: int, page: int, page_size: int) -> List[Track]:
                         createTime=track_info["createdTime"],
                         updateTime=track_info["updatedTime"],
                         cryptedUrl=crypted_url,
-                        url=decrypt_url(crypted_url),
+                        url=cached_url or "",
                         duration=track_info.get("duration", 0),
                         totalCount=data.get("data", {}).get("totalCount"),  # 专辑音频总数
                         page=page,  # 当前页码
@@ -108,6 +127,12 @@ def fetch_album_tracks(album_id: int, page: int, page_size: int) -> List[Track]:
                         cover=cover_url,  # 拼接后的专辑封面
                     )
                 )
+            if resolve_urls:
+                # 缓存未命中的曲目整页一次批量解密
+                pending = [t for t in tracks if not t.url]
+                for track, url in zip(pending, decrypt_many([t.cryptedUrl for t in pending])):
+                    track.url = url
+                    cache.put(track.trackId, album_id, url)
             return tracks
         except BlockedException:
             # 直接抛出到外层
@@ -1,28 +1,22 @@
-import requests
-import os
-from dotenv import load_dotenv
 from dataclasses import dataclass
 from typing import Optional
+from utils.metadata_cache import cached_get
 
-load_dotenv()
-XIMALAYA_COOKIES = os.getenv("XIMALAYA_COOKIES", "")
+def _has_track_info(response) -> bool:
+    try:
+        return bool(response.json().get('data'))
+    except Exception:
+        return False
 
-def fetch_track_info(track_id: int) -> dict:
+def fetch_track_info(track_id: int, ttl: Optional[float] = None) -> dict:
     """
-    获取单个音频(track)的详细信息，返回字典
+    获取单个音频(track)的详细信息，返回字典；结果经元数据缓存，ttl=0 时强制向服务器确认
     """
     url = f"https://www.ximalaya.com/revision/track/simple?trackId={track_id}"
     headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36 Edg/137.0.0.0",
-        "Accept": "*/*",
-        "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8,en-GB;q=0.7,en-US;q=0.6",
-        "Content-Type": "application/x-www-form-urlencoded;charset=UTF-8",
-        "Cookie": XIMALAYA_COOKIES,
         "Referer": f"https://www.ximalaya.com/sound/{track_id}",
-        "x-kl-kfa-ajax-request": "Ajax_Request",
-        "Connection": "keep-alive",
     }
-    response = requests.get(url, headers=headers)
+    response = cached_get(url, "track_info", headers=headers, ttl=ttl, cacheable=_has_track_info)
     if response.status_code == 200:
         try:
             return response.json()
@@ -0,0 +1,82 @@
+import queue
+import threading
+import time
+
+# 界面更新调度：Tk 控件只能在主线程中操作，工作线程通过 UiDispatcher.call 把更新放入线程安全队列，
+# 主线程按固定节拍批量取出执行。本模块不导入 tkinter，root 只需提供 after(ms, func)
+
+
+class UiDispatcher:
+    """
+    主线程界面更新队列：call() 可在任意线程调用，只入队不触碰 Tk；
+    start() 之后主循环每 interval_ms 毫秒执行一批（最多 max_batch 个）更新，剩余的留到下一拍，避免一次卡住界面。
+    add_tick(func) 注册每拍都要执行的钩子（例如事件总线的 drain）
+    """
+    def __init__(self, root, interval_ms=50, max_batch=500):
+        self.root = root
+        self.interval_ms = interval_ms
+        self.max_batch = max_batch
+        self._queue = queue.SimpleQueue()
+        self._ticks = []
+        self._running = False
+        self._main_thread = threading.current_thread()
+        self.executed = 0
+        self.errors = 0
+        self.last_tick_ms = 0.0  # 上一拍实际耗时（毫秒），用于观察界面线程负载
+
+    def call(self, func, *args, **kwargs):
+        """在界面线程中执行 func(*args, **kwargs)，立即返回"""
+        self._queue.put((func, args, kwargs))
+
+    def in_main_thread(self):
+        return threading.current_thread() is self._main_thread
+
+    def add_tick(self, func):
+        self._ticks.append(func)
+        return func
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def drain(self, limit=None):
+        """在界面线程中执行积压的更新，返回执行条数"""
+        limit = self.max_batch if limit is None else limit
+        count = 0
+        while count < limit:
+            try:
+                func, args, kwargs = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            count += 1
+            try:
+                func(*args, **kwargs)
+            except Exception:
+                # 单个更新失败（例如窗口已关闭）不能中断整个调度循环
+                self.errors += 1
+        self.executed += count
+        return count
+
+    def _tick(self):
+        if not self._running:
+            return
+        start = time.perf_counter()
+        for func in self._ticks:
+            try:
+                func()
+            except Exception:
+                self.errors += 1
+        self.drain()
+        self.last_tick_ms = (time.perf_counter() - start) * 1000
+        self.root.after(self.interval_ms, self._tick)
+
+    def start(self):
+        if not self._running:
+            self._running = True
+            self.root.after(self.interval_ms, self._tick)
+        return self
+
+    def stop(self):
+        self._running = False
+
+# 如需在界面代码中使用，请使用：
+# from gui.dispatch import UiDispatcher
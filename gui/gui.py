@@ -1,14 +1,18 @@
 import tkinter as tk
 from tkinter import messagebox, scrolledtext
+import os
 import threading
+import time
 import re
 from PIL import Image, ImageTk
-import requests
-from io import BytesIO
+from utils.image_cache import get_image_cache
 from fetcher.album_fetcher import fetch_album
 from fetcher.track_fetcher import fetch_album_tracks
 from downloader.album_download import AlbumDownloader
 from downloader.single_track_download import download_single_track
+from downloader.events import EventBus, CoalescingDispatcher, AlbumProgress, BytesProgress
+from gui.dispatch import UiDispatcher
+from gui.log_panel import LogBuffer, LogPanel, LEVELS
 import tkinter.ttk as ttk
 
 class XimalayaGUI:
@@ -19,6 +23,37 @@ class XimalayaGUI:
         self.root.geometry('800x600')
         self._init_widgets()
         self.setup_log_tags()
+        # 工作线程不直接操作控件：界面更新经 self.ui 队列，由主循环每 UI_INTERVAL 毫秒批量执行
+        self.ui = UiDispatcher(root, interval_ms=self.UI_INTERVAL)
+        # 下载事件再合并一层，进度条每 EVENT_INTERVAL 毫秒最多刷新一次
+        self.events = EventBus()
+        self._dispatcher = CoalescingDispatcher(self._on_event, interval=self.EVENT_INTERVAL / 1000)
+        self.events.subscribe(self._dispatcher, AlbumProgress, BytesProgress)
+        self._album_progress = None
+        self._last_event_drain = 0.0
+        self.ui.add_tick(self._poll_events)
+        self.ui.add_tick(self.log_panel.render)
+        self.ui.start()
+
+    UI_INTERVAL = 50
+    EVENT_INTERVAL = 250
+
+    def _poll_events(self):
+        now = time.monotonic()
+        if now - self._last_event_drain >= self._dispatcher.interval:
+            self._last_event_drain = now
+            self._dispatcher.drain()
+
+    def _on_event(self, event):
+        """在界面线程中处理合并后的下载事件"""
+        if isinstance(event, AlbumProgress):
+            self._album_progress = event
+            self.set_progress(event.current, event.total, event.filename)
+        elif isinstance(event, BytesProgress) and event.total:
+            album = self._album_progress
+            prefix = f'({album.current}/{album.total}) ' if album else ''
+            name = os.path.basename(event.path)
+            self.progress_label.config(text=f'{prefix}{name} {event.done * 100 // event.total}%')
 
     def _init_widgets(self):
         # 统一宽度
@@ -79,12 +114,30 @@ class XimalayaGUI:
         self.progress_label.grid(row=1, column=0, sticky='w', padx=5, columnspan=2)
         # 日志输出区
         tk.Label(self.root, text='日志输出:').grid(row=0, column=2, sticky='nw', pady=5)
+        # 按级别筛选日志（隐藏而不删除，取消后原样恢复）
+        filter_frame = tk.Frame(self.root)
+        filter_frame.grid(row=0, column=2, sticky='ne', padx=10)
+        self.log_level_vars = {}
+        for level, text in zip(LEVELS, ('信息', '警告', '错误')):
+            var = tk.BooleanVar(value=True)
+            tk.Checkbutton(filter_frame, text=text, variable=var,
+                           command=lambda l=level, v=var: self.log_panel.set_level_visible(l, v.get())).pack(side='left')
+            self.log_level_vars[level] = var
         self.log_text = scrolledtext.ScrolledText(self.root, width=60, height=42, state='disabled')
         self.log_text.grid(row=1, column=2, rowspan=6, padx=10, sticky='nw')
         # 下载延迟输入
         tk.Label(self.root, text='下载延迟(秒):', width=label_width, anchor='w').grid(row=3, column=0, sticky='w')
+        delay_frame = tk.Frame(self.root)
+        delay_frame.grid(row=3, column=1, sticky='w')
         self.delay_var = tk.StringVar(value='3')
-        tk.Entry(self.root, textvariable=self.delay_var, width=entry_width).grid(row=3, column=1, sticky='w')
+        tk.Entry(delay_frame, textvariable=self.delay_var, width=10).pack(side='left')
+        # 并发下载线程数
+        tk.Label(delay_frame, text='线程数:').pack(side='left', padx=(10, 0))
+        self.workers_var = tk.StringVar(value='1')
+        tk.Entry(delay_frame, textvariable=self.workers_var, width=10).pack(side='left')
+        # 增量同步：只下载上次同步后新增的音频
+        self.incremental_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(delay_frame, text='增量同步', variable=self.incremental_var).pack(side='left', padx=(10, 0))
         # 自适应拉伸
         self.root.grid_columnconfigure(2, weight=1)
         self.root.grid_rowconfigure(6, weight=1)
@@ -95,13 +148,8 @@ class XimalayaGUI:
             return
         if callable(getattr(msg, '__call__', None)):
             msg = str(msg)
-        def append():
-            self.log_text.config(state='normal')
-            tag = level if level in ('info', 'warning', 'error') else 'info'
-            self.log_text.insert(tk.END, msg + '\n', tag)
-            self.log_text.see(tk.END)
-            self.log_text.config(state='disabled')
-        self.log_text.after(0, append)
+        # 只写入环形缓冲，由界面线程每拍批量渲染
+        self.log_buffer.append(msg, level)
 
     def log_info(self, msg):
         self.log(msg, level='info')
@@ -110,32 +158,51 @@ class XimalayaGUI:
     def log_error(self, msg):
         self.log(msg, level='error')
 
+    LOG_CAPACITY = 5000
+
     def setup_log_tags(self):
-        self.log_text.tag_config('info', foreground='black')
-        self.log_text.tag_config('warning', foreground='orange')
-        self.log_text.tag_config('error', foreground='red')
+        # 界面只保留最近 LOG_CAPACITY 条日志，完整日志写入下载目录下按大小轮转的 logs/gui.log
+        spill_path = os.path.join(self.default_download_dir, 'logs', 'gui.log') if self.default_download_dir else None
+        self.log_buffer = LogBuffer(self.LOG_CAPACITY, spill_path=spill_path)
+        self.log_panel = LogPanel(self.log_text, self.log_buffer)
 
     def run_in_thread(self, func):
         threading.Thread(target=func, daemon=True).start()
 
-    def show_cover_image(self, url):
-        target_size = (150, 150)
+    @staticmethod
+    def load_cover_image(url, target_size=(150, 150)):
+        """取缩放后的封面（可在工作线程中调用，不触碰控件），返回 PIL 图片；url 为空返回 None，失败时抛出异常"""
         if not url:
+            return None
+        # 原图与缩略图都经共享的封面缓存，同一封面只下载、解码一次
+        img = get_image_cache().thumbnail(url, target_size)
+        # 居中填充白底
+        bg = Image.new('RGBA', target_size, (255, 255, 255, 255))
+        offset = ((target_size[0] - img.width) // 2, (target_size[1] - img.height) // 2)
+        bg.paste(img, offset, img)
+        return bg
+
+    def set_cover_image(self, image, error=False):
+        """在界面线程中显示封面，PhotoImage 必须在主线程创建"""
+        if error:
+            self.cover_label.config(image='', text='加载失败')
+        elif image is None:
             self.cover_label.config(image='', text='无封面')
-            return
-        try:
-            response = requests.get(url, timeout=10)
-            img_data = response.content
-            img = Image.open(BytesIO(img_data)).convert('RGBA')
-            # 保持比例缩放并居中填充白底
-            img.thumbnail(target_size, Image.LANCZOS)
-            bg = Image.new('RGBA', target_size, (255, 255, 255, 255))
-            offset = ((target_size[0] - img.width) // 2, (target_size[1] - img.height) // 2)
-            bg.paste(img, offset, img if img.mode == 'RGBA' else None)
-            self.cover_imgtk = ImageTk.PhotoImage(bg)
+        else:
+            self.cover_imgtk = ImageTk.PhotoImage(image)
             self.cover_label.config(image=self.cover_imgtk, text='')
-        except Exception:
-            self.cover_label.config(image='', text='加载失败')
+
+    def show_cover_image(self, url):
+        """后台加载封面，完成后回到界面线程显示；连续切换专辑时只显示最后一次请求的封面"""
+        self._cover_url = url
+        def task():
+            try:
+                image, error = self.load_cover_image(url), False
+            except Exception:
+                image, error = None, True
+            if self._cover_url == url:
+                self.ui.call(self.set_cover_image, image, error)
+        self.run_in_thread(task)
 
     def set_progress(self, current, total, filename=None):
         percent = (current / total * 100) if total else 0
@@ -153,37 +220,34 @@ class XimalayaGUI:
             return
         self.log_info(f'获取专辑信息: {album_id}')
         def task():
+            # 网络请求与图片处理都在工作线程中完成，结果一次性交给界面线程显示
             album = fetch_album(int(album_id))
             if album:
-                self.album_title_var.set(album.albumTitle)
-                intro = re.sub('<[^<]+?>', '', album.richIntro or '')
-                self.intro_text.config(state='normal')
-                self.intro_text.delete('1.0', tk.END)
-                self.intro_text.insert(tk.END, intro)
-                self.intro_text.config(state='disabled')
-                self.album_create_var.set(album.createDate)
-                self.album_update_var.set(album.updateDate)
-                cover_url = album.cover if album.cover else ''
                 try:
-                    tracks = fetch_album_tracks(int(album_id), 1, 1)
+                    tracks = fetch_album_tracks(int(album_id), 1, 1, resolve_urls=False)
                     total_count = tracks[0].totalCount if tracks and tracks[0].totalCount else ''
                 except Exception:
                     total_count = ''
-                self.album_count_var.set(str(total_count))
-                self.show_cover_image(cover_url)
+                self.ui.call(self._show_album_info, album, total_count)
+                self.show_cover_image(album.cover or '')
                 self.log_info(f'获取专辑成功: {album.albumTitle}')
             else:
-                self.album_title_var.set('')
-                self.intro_text.config(state='normal')
-                self.intro_text.delete('1.0', tk.END)
-                self.intro_text.config(state='disabled')
-                self.album_create_var.set('')
-                self.album_update_var.set('')
-                self.album_count_var.set('')
-                self.show_cover_image('')
+                self.ui.call(self._show_album_info, None, '')
+                self.ui.call(self.set_cover_image, None)
                 self.log_error('获取专辑信息失败')
         self.run_in_thread(task)
 
+    def _show_album_info(self, album, total_count):
+        self.album_title_var.set(album.albumTitle if album else '')
+        self.intro_text.config(state='normal')
+        self.intro_text.delete('1.0', tk.END)
+        if album:
+            self.intro_text.insert(tk.END, re.sub('<[^<]+?>', '', album.richIntro or ''))
+        self.intro_text.config(state='disabled')
+        self.album_create_var.set(album.createDate if album else '')
+        self.album_update_var.set(album.updateDate if album else '')
+        self.album_count_var.set(str(total_count))
+
     def run_album_download(self):
         album_id = self.album_id_var.get().strip()
         if not album_id:
@@ -197,7 +261,12 @@ class XimalayaGUI:
         except Exception:
             delay = 1
         self.download_delay = delay
-        self.log_info(f'下载专辑: {album_id} (延迟: {delay}s)')
+        try:
+            max_workers = max(int(self.workers_var.get()), 1)
+        except Exception:
+            max_workers = 1
+        incremental = self.incremental_var.get()
+        self.log_info(f'下载专辑: {album_id} (延迟: {delay}s, 线程数: {max_workers}{", 增量同步" if incremental else ""})')
         # 直接传递已获取的album对象和曲目总数
         album_obj = getattr(self, 'album', None) if hasattr(self, 'album') else None
         total_count = None
@@ -209,20 +278,21 @@ class XimalayaGUI:
         def task():
             try:
                 self.log_info('下载线程已启动')
-                def progress_hook(current, total, filename=None):
-                    self.root.after(0, lambda: self.set_progress(current, total, filename))
+                self._album_progress = None
                 AlbumDownloader(
                     album_id,
                     log_func=self.log,
                     delay=delay,
                     save_dir=self.default_download_dir,
-                    progress_func=progress_hook,
+                    events=self.events,
                     album=album_obj,
-                    total_count=total_count
+                    total_count=total_count,
+                    max_workers=max_workers,
+                    incremental=incremental
                 ).download_album()
             except Exception as e:
                 self.log_error(f'下载线程异常: {e}')
-                messagebox.showerror('错误', f'下载线程异常: {e}')
+                self.ui.call(messagebox.showerror, '错误', f'下载线程异常: {e}')
         self.run_in_thread(task)
 
     def run_track_download(self):
@@ -233,7 +303,8 @@ class XimalayaGUI:
             return
         self.log_info(f'下载单曲: track_id={track_id}')
         def task():
-            download_single_track(track_id, log_func=self.log, save_dir=self.default_download_dir)
+            self._album_progress = None
+            download_single_track(track_id, log_func=self.log, save_dir=self.default_download_dir, events=self.events)
         self.run_in_thread(task)
 
 if __name__ == '__main__':
@@ -0,0 +1,143 @@
+import os
+import threading
+import time
+from collections import deque
+
+# 日志面板：固定容量的环形缓冲 + 批量渲染 + 按级别隐藏（Text 标签的 elide，不重新插入文本）+ 轮转文件落盘。
+# 本模块不导入 tkinter，LogBuffer 可在任意线程写入，LogPanel.render 只在界面线程调用
+
+LEVELS = ('info', 'warning', 'error')
+LEVEL_COLORS = {'info': 'black', 'warning': 'orange', 'error': 'red'}
+
+
+class RotatingFile:
+    """按大小轮转的追加写文件：path 写满 max_bytes 后依次改名为 path.1 ... path.{backup_count}"""
+    def __init__(self, path, max_bytes=5 * 1024 * 1024, backup_count=3):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+        self._size = self._file.tell()
+
+    def write(self, text):
+        self._file.write(text)
+        self._size += len(text.encode('utf-8'))
+        if self._size >= self.max_bytes:
+            self.rotate()
+
+    def rotate(self):
+        self._file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f'{self.path}.{i}'
+            if os.path.exists(source):
+                os.replace(source, f'{self.path}.{i + 1}')
+        if self.backup_count > 0:
+            os.replace(self.path, f'{self.path}.1')
+        self._file = open(self.path, 'w', encoding='utf-8')
+        self._size = 0
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class LogBuffer:
+    """
+    线程安全的日志环形缓冲：只保留最近 capacity 条，append 的开销与会话累计条数无关；
+    待渲染的记录另存一份（同样有上限，界面来不及渲染时丢弃最旧的），
+    配置 spill_path 时全部日志同时写入按大小轮转的文件
+    """
+    def __init__(self, capacity=5000, spill_path=None, max_bytes=5 * 1024 * 1024, backup_count=3):
+        self.capacity = capacity
+        self.records = deque(maxlen=capacity)
+        self._pending = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._spill = RotatingFile(spill_path, max_bytes, backup_count) if spill_path else None
+        self.total = 0
+        self.dropped = 0  # 未来得及渲染就被挤出的条数
+
+    def append(self, msg, level='info'):
+        record = (level if level in LEVELS else 'info', str(msg))
+        with self._lock:
+            self.records.append(record)
+            if len(self._pending) == self.capacity:
+                self.dropped += 1
+            self._pending.append(record)
+            self.total += 1
+            if self._spill is not None:
+                self._spill.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} [{record[0]}] {record[1]}\n")
+
+    def take_pending(self):
+        """取出自上次以来新增的记录"""
+        with self._lock:
+            records = list(self._pending)
+            self._pending.clear()
+        return records
+
+    def tail(self, count=None, levels=None):
+        with self._lock:
+            records = list(self.records)
+        if levels is not None:
+            records = [r for r in records if r[0] in levels]
+        return records[-count:] if count else records
+
+    def flush(self):
+        with self._lock:
+            if self._spill is not None:
+                self._spill.flush()
+
+    def close(self):
+        with self._lock:
+            if self._spill is not None:
+                self._spill.close()
+                self._spill = None
+
+
+class LogPanel:
+    """
+    把 LogBuffer 渲染到 Text 控件：每次 render 一次 insert 写入整批记录，
+    控件中最多保留 buffer.capacity 条，超出时从头部整条删除；级别过滤通过标签的 elide 属性实现
+    """
+    def __init__(self, text, buffer, autoscroll=True):
+        self.text = text
+        self.buffer = buffer
+        self.autoscroll = autoscroll
+        self._line_counts = deque()  # 控件中每条记录占用的行数
+        self.hidden = set()
+        for level, color in LEVEL_COLORS.items():
+            self.text.tag_config(level, foreground=color)
+
+    def set_level_visible(self, level, visible):
+        if visible:
+            self.hidden.discard(level)
+        else:
+            self.hidden.add(level)
+        self.text.tag_config(level, elide=not visible)
+
+    def render(self):
+        """在界面线程中渲染新增的日志，返回本次渲染的条数"""
+        records = self.buffer.take_pending()
+        self.buffer.flush()
+        if not records:
+            return 0
+        chunks = []
+        for level, msg in records:
+            chunks.append(msg + '\n')
+            chunks.append(level)
+            self._line_counts.append(msg.count('\n') + 1)
+        self.text.config(state='normal')
+        self.text.insert('end', *chunks)
+        excess = len(self._line_counts) - self.buffer.capacity
+        if excess > 0:
+            lines = sum(self._line_counts.popleft() for _ in range(excess))
+            self.text.delete('1.0', f'{lines + 1}.0')
+        self.text.config(state='disabled')
+        if self.autoscroll:
+            self.text.see('end')
+        return len(records)
+
+# 如需在界面代码中使用，请使用：
+# from gui.log_panel import LogBuffer, LogPanel
@@ -1,11 +1,8 @@
-from fetcher.track_fetcher import fetch_album_tracks, Track
-from fetcher.album_fetcher import fetch_album, Album
-from downloader.downloader import M4ADownloader
-from dataclasses import asdict
-import tkinter as tk
-from gui.gui import XimalayaGUI
 import os, sys
 
+# 启动入口：不带参数时打开图形界面；带参数时转给命令行入口（python main.py album 12345 等同于 python cli.py album 12345）
+# tkinter / PIL / requests 只在对应路径上才导入，命令行和定时任务不会为图形界面付出启动开销
+
 def main():
     if getattr(sys, 'frozen', False) and hasattr(sys, '_MEIPASS'):
         base_dir = os.path.dirname(sys.executable)
@@ -14,9 +11,14 @@ def main():
     default_download_dir = os.path.join(base_dir, 'AudioBook')
     if not os.path.exists(default_download_dir):
         os.makedirs(default_download_dir, exist_ok=True)
+    import tkinter as tk
+    from gui.gui import XimalayaGUI
     root = tk.Tk()
     app = XimalayaGUI(root, default_download_dir=default_download_dir)
     root.mainloop()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    if len(sys.argv) > 1:
+        from cli import main as cli_main
+        sys.exit(cli_main(sys.argv[1:]))
+    main()
@@ -0,0 +1,39 @@
+import pytest
+from utils.rate_limiter import configure_limiter, reset_limiters, DEFAULT_LIMITS
+from utils.url_cache import UrlCache, set_url_cache
+from utils.metadata_cache import MetadataCache, set_metadata_cache
+from utils.image_cache import ImageCache, set_image_cache
+
+
+@pytest.fixture(autouse=True)
+def fast_rate_limiters():
+    """测试中不需要真实限速：放开全局限速器，并在每个用例后丢弃其状态"""
+    reset_limiters()
+    for name in DEFAULT_LIMITS:
+        configure_limiter(name, rate=1000, burst=1000, cooldown=0)
+    yield
+    reset_limiters()
+
+
+@pytest.fixture(autouse=True)
+def memory_url_cache():
+    """测试中播放地址缓存只用内存，不写 downloads/.url_cache.db"""
+    set_url_cache(UrlCache())
+    yield
+    set_url_cache(None)
+
+
+@pytest.fixture(autouse=True)
+def memory_metadata_cache():
+    """测试中元数据缓存只用内存，并且每个用例互不影响"""
+    set_metadata_cache(MetadataCache())
+    yield
+    set_metadata_cache(None)
+
+
+@pytest.fixture(autouse=True)
+def memory_image_cache():
+    """测试中封面缓存只用内存，不写 downloads/.image_cache"""
+    set_image_cache(ImageCache())
+    yield
+    set_image_cache(None)
@@ -0,0 +1,89 @@
+import io
+import json
+import subprocess
+import sys
+from unittest.mock import patch
+import pytest
+import cli
+# 提前导入，避免在 patch AlbumDownloader 期间首次导入时绑定到 mock
+from downloader import batch_download
+
+
+def test_cli_import_does_not_load_gui_modules():
+    code = "import sys, cli; print(','.join(m for m in ('tkinter', 'PIL', 'gui.gui') if m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == ""
+
+
+def test_reporter_jsonl_events():
+    stream = io.StringIO()
+    reporter = cli.Reporter('jsonl', stream=stream)
+    reporter.log('开始下载', level='info')
+    reporter.log('\r下载进度: 50% (10KB/20KB)', level='info')  # 逐块进度不输出
+    reporter.progress(1, 3, 'a.m4a')
+    events = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [e['type'] for e in events] == ['log', 'progress']
+    assert events[0]['msg'] == '开始下载'
+    assert events[1]['current'] == 1 and events[1]['total'] == 3
+
+
+def test_reporter_text_quiet():
+    stream = io.StringIO()
+    reporter = cli.Reporter('text', stream=stream, quiet=True)
+    reporter.log('普通信息')
+    reporter.log('出错了', level='error')
+    assert stream.getvalue() == '[error] 出错了\n'
+
+
+@patch("downloader.album_download.AlbumDownloader")
+def test_album_single_uses_album_downloader(mock_cls, tmp_path):
+    mock_cls.return_value.summary.return_value = {'albumTitle': 'A', 'total': 3, 'downloaded': 3, 'failed': 0,
+                                                  'pending': 0, 'blocked': False}
+    code = cli.main(['--progress', 'jsonl', '--rate', 'cdn=3', 'album', '123', '-o', str(tmp_path), '-j', '2', '--incremental'])
+    assert code == cli.EXIT_OK
+    args, kwargs = mock_cls.call_args
+    assert args == (123,)
+    assert kwargs['max_workers'] == 2 and kwargs['incremental'] is True and kwargs['save_dir'] == str(tmp_path)
+    mock_cls.return_value.download_album.assert_called_once()
+    from utils.rate_limiter import get_limiter
+    assert get_limiter('cdn').rate == 3
+
+
+@pytest.mark.parametrize("summary, expected", [
+    ({'total': 3, 'downloaded': 2, 'failed': 1, 'pending': 0, 'blocked': False}, cli.EXIT_FAILED),
+    ({'total': 3, 'downloaded': 1, 'failed': 0, 'pending': 2, 'blocked': False}, cli.EXIT_FAILED),
+    ({'total': None, 'downloaded': 0, 'failed': 0, 'pending': 0, 'blocked': False}, cli.EXIT_FAILED),
+    ({'total': 3, 'downloaded': 1, 'failed': 0, 'pending': 2, 'blocked': True}, cli.EXIT_BLOCKED),
+])
+@patch("downloader.album_download.AlbumDownloader")
+def test_album_single_exit_code_follows_batch_rule(mock_cls, summary, expected, tmp_path):
+    mock_cls.return_value.summary.return_value = {'albumTitle': 'A', **summary}
+    assert cli.main(['album', '123', '-o', str(tmp_path)]) == expected
+
+
+@patch.object(batch_download, "BatchDownloader")
+def test_album_file_uses_batch_downloader(mock_cls, tmp_path):
+    ids_file = tmp_path / 'albums.txt'
+    ids_file.write_text('1\n2\n', encoding='utf-8')
+    mock_cls.return_value.run.return_value = {
+        1: {'albumTitle': 'A', 'total': 3, 'downloaded': 3, 'failed': 0, 'pending': 0, 'blocked': False},
+        2: {'albumTitle': 'B', 'total': 3, 'downloaded': 1, 'failed': 0, 'pending': 2, 'blocked': True},
+    }
+    with patch('sys.stdout', new_callable=io.StringIO) as out:
+        code = cli.main(['--progress', 'jsonl', 'album', str(ids_file), '3', '--max-per-album', '1'])
+    assert code == cli.EXIT_BLOCKED
+    assert mock_cls.call_args.args == ([1, 2, 3],)
+    assert mock_cls.call_args.kwargs['max_per_album'] == 1
+    results = [json.loads(line) for line in out.getvalue().splitlines() if '"result"' in line]
+    assert [r['albumId'] for r in results] == [1, 2]
+
+
+@patch("downloader.single_track_download.download_single_track", return_value=False)
+def test_track_failure_exit_code(mock_download):
+    assert cli.main(['track', '42', '--album-id', '7']) == cli.EXIT_FAILED
+    assert mock_download.call_args.kwargs['album_id'] == 7
+
+
+def test_invalid_rate_rejected():
+    with pytest.raises(SystemExit):
+        cli.main(['--rate', 'unknown=1', 'info', '1'])
@@ -2,32 +2,80 @@ import pytest
 from unittest.mock import patch, MagicMock, mock_open
 import requests
 import os
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from downloader.downloader import M4ADownloader
 
 # Test cases for M4ADownloader
 class TestM4ADownloader:
-    @patch("requests.get")
-    def test_download_once_success(self, mock_get):
+    @patch("requests.Session.get")
+    def test_download_once_success(self, mock_get, tmp_path):
         mock_response = MagicMock()
         mock_response.status_code = 200
-        mock_response.headers = {"content-length": "100"}
+        mock_response.headers = {"content-length": "18"}
         mock_response.iter_content.return_value = [b"chunk1", b"chunk2", b"chunk3"]
         mock_get.return_value = mock_response
 
         mock_log_func = MagicMock()
         downloader = M4ADownloader()
-        
-        with patch("builtins.open", mock_open()) as mocked_file:
-            result = downloader._download_once("http://test.url/file.m4a", "test_output.m4a", log_func=mock_log_func)
-            assert result is True
-            mock_get.assert_called_once_with("http://test.url/file.m4a", stream=True, timeout=20)
-            mocked_file.assert_called_once_with("test_output.m4a", 'wb')
-            mocked_file().write.assert_any_call(b"chunk1")
-            mocked_file().write.assert_any_call(b"chunk2")
-            mocked_file().write.assert_any_call(b"chunk3")
-            assert mock_log_func.call_count >= 2 # For progress and completion
-
-    @patch("requests.get")
+        output = tmp_path / "test_output.m4a"
+        result = downloader._download_once("http://test.url/file.m4a", str(output), log_func=mock_log_func)
+        assert result is True
+        assert mock_get.call_args.args == ("http://test.url/file.m4a",)
+        assert mock_get.call_args.kwargs["stream"] is True
+        assert "Range" not in mock_get.call_args.kwargs["headers"]
+        assert output.read_bytes() == b"chunk1chunk2chunk3"
+        assert not (tmp_path / "test_output.m4a.part").exists()
+        assert mock_log_func.call_count >= 2 # For progress and completion
+
+    @patch("requests.Session.get")
+    def test_download_once_resumes_from_part_file(self, mock_get, tmp_path):
+        output = tmp_path / "test_output.m4a"
+        (tmp_path / "test_output.m4a.part").write_bytes(b"chunk1")
+        mock_response = MagicMock()
+        mock_response.status_code = 206
+        mock_response.headers = {"content-length": "12", "Content-Range": "bytes 6-17/18"}
+        mock_response.iter_content.return_value = [b"chunk2", b"chunk3"]
+        mock_get.return_value = mock_response
+
+        downloader = M4ADownloader()
+        assert downloader._download_once("http://test.url/file.m4a", str(output), log_func=MagicMock()) is True
+        assert mock_get.call_args.kwargs["headers"]["Range"] == "bytes=6-"
+        assert output.read_bytes() == b"chunk1chunk2chunk3"
+        assert not (tmp_path / "test_output.m4a.part").exists()
+
+    @patch("requests.Session.get")
+    def test_download_once_restarts_when_range_ignored(self, mock_get, tmp_path):
+        output = tmp_path / "test_output.m4a"
+        (tmp_path / "test_output.m4a.part").write_bytes(b"stale")
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.headers = {"content-length": "12"}
+        mock_response.iter_content.return_value = [b"chunk1", b"chunk2"]
+        mock_get.return_value = mock_response
+
+        downloader = M4ADownloader()
+        assert downloader._download_once("http://test.url/file.m4a", str(output), log_func=MagicMock()) is True
+        assert output.read_bytes() == b"chunk1chunk2"
+
+    @patch("requests.Session.get")
+    def test_download_once_keeps_part_on_short_read(self, mock_get, tmp_path):
+        output = tmp_path / "test_output.m4a"
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.headers = {"content-length": "18"}
+        mock_response.iter_content.return_value = [b"chunk1"]
+        mock_get.return_value = mock_response
+
+        downloader = M4ADownloader()
+        with pytest.raises(Exception, match="文件大小不匹配"):
+            downloader._download_once("http://test.url/file.m4a", str(output), log_func=MagicMock())
+        assert not output.exists()
+        assert (tmp_path / "test_output.m4a.part").read_bytes() == b"chunk1"
+
+    @patch("requests.Session.get")
     def test_download_once_http_error(self, mock_get):
         mock_response = MagicMock()
         mock_response.status_code = 404
@@ -90,7 +138,8 @@ class TestM4ADownloader:
         downloader = M4ADownloader()
         url = downloader.get_track_download_url(123, 456)
         assert url is None
-        mock_fetch_crypted_url.assert_called_once_with(123, 456)
+        # 按专辑取不到时再以 album_id=0 兜底查询一次
+        assert [c.args for c in mock_fetch_crypted_url.call_args_list] == [(123, 456), (123, 0)]
         mock_decrypt_url.assert_not_called()
 
     @patch("fetcher.track_fetcher.fetch_track_crypted_url", side_effect=TypeError)
@@ -124,6 +173,44 @@ class TestM4ADownloader:
         mock_download_from_url.assert_called_once_with("http://download.url/track.m4a", "output.m4a", log_func=mock_log_func)
         mock_log_func.assert_not_called() # No error logs
 
+    @patch("fetcher.track_fetcher.fetch_track_crypted_url", return_value="crypted_url")
+    @patch("utils.utils.decrypt_url", side_effect=["http://cdn/old.m4a", "http://cdn/new.m4a"])
+    @patch("downloader.downloader.M4ADownloader.download_from_url")
+    def test_download_track_by_id_refreshes_expired_url(self, mock_download_from_url, mock_decrypt_url, mock_fetch_crypted_url):
+        from utils.url_cache import get_url_cache, UrlExpiredError
+        downloader = M4ADownloader()
+        assert downloader.get_track_download_url(123, 456) == "http://cdn/old.m4a"
+        # 已缓存的地址不再请求 baseInfo
+        assert downloader.get_track_download_url(123, 456) == "http://cdn/old.m4a"
+        assert mock_fetch_crypted_url.call_count == 1
+        mock_download_from_url.side_effect = [UrlExpiredError("播放地址已失效(HTTP 403)"), True]
+        downloader.download_track_by_id(123, 456, "output.m4a", log_func=MagicMock())
+        assert [c.args[0] for c in mock_download_from_url.call_args_list] == ["http://cdn/old.m4a", "http://cdn/new.m4a"]
+        assert get_url_cache().get(123, 456) == "http://cdn/new.m4a"
+
+    @patch("downloader.downloader.http_client.get")
+    def test_download_once_expired_url_not_retried(self, mock_get, tmp_path):
+        from utils.url_cache import UrlExpiredError
+        mock_get.return_value.status_code = 403
+        downloader = M4ADownloader(retry_delay=0)
+        with pytest.raises(UrlExpiredError):
+            downloader.download_m4a("http://cdn/old.m4a", str(tmp_path / "a.m4a"), log_func=MagicMock())
+        assert mock_get.call_count == 1
+
+    @patch("downloader.downloader.http_client.get")
+    def test_http_error_closes_streamed_response(self, mock_get, tmp_path):
+        response = mock_get.return_value
+        response.status_code = 500
+        response.raise_for_status.side_effect = requests.exceptions.HTTPError("500 Server Error")
+        downloader = M4ADownloader()
+        with pytest.raises(requests.exceptions.HTTPError):
+            downloader._download_once("http://cdn/a.m4a", str(tmp_path / "a.m4a"), log_func=MagicMock())
+        part_file = tmp_path / "b.m4a.part"
+        part_file.write_bytes(b"\0" * 10)
+        with pytest.raises(requests.exceptions.HTTPError):
+            downloader._download_segment("http://cdn/b.m4a", str(part_file), 0, 9, MagicMock())
+        assert response.close.call_count == 2
+
     @patch("downloader.downloader.M4ADownloader.get_track_download_url")
     def test_download_track_by_id_no_url(self, mock_get_track_download_url):
         mock_get_track_download_url.return_value = None
@@ -131,4 +218,776 @@ class TestM4ADownloader:
         downloader = M4ADownloader()
         with pytest.raises(Exception, match="未获取到下载URL"):
             downloader.download_track_by_id(123, 456, "output.m4a", log_func=mock_log_func)
-        mock_log_func.assert_called_once_with('未获取到下载URL: track_id=123', level='error')
\ No newline at end of file
+        mock_log_func.assert_called_once_with('未获取到下载URL: track_id=123', level='error')
+
+def _make_tracks(count, total_count=None, page=1, page_size=20, first_id=1):
+    from fetcher.track_fetcher import Track
+    return [
+        Track(trackId=i, title=f"Track {i}", createTime="", updateTime="", cryptedUrl="", url="",
+              duration=0, totalCount=total_count or count, page=page, pageSize=page_size)
+        for i in range(first_id, first_id + count)
+    ]
+
+
+def _fake_download(before=None, after=None, delay=0):
+    """download_track_by_id 的替身：写出 1 字节的文件，before/after 在写入前后以 (track_id, album_id) 调用"""
+    def download(track_id, album_id, output_file, log_func=print, url=None):
+        if before:
+            before(track_id, album_id)
+        if delay:
+            time.sleep(delay)
+        with open(output_file, 'wb') as f:
+            f.write(b'x')
+        if after:
+            after(track_id, album_id)
+    return download
+
+
+# Test cases for AlbumDownloader
+class TestAlbumDownloader:
+    @staticmethod
+    def _album_pages(total_count):
+        """模拟分页接口：trackId 等于其在专辑中的序号"""
+        def fetch(album_id, page, page_size, resolve_urls=True, ttl=None):
+            start = (page - 1) * page_size + 1
+            count = max(min(page_size, total_count - start + 1), 0)
+            return _make_tracks(count, total_count, page=page, page_size=page_size, first_id=start)
+        return fetch
+
+    @staticmethod
+    def _ordered_pages(track_ids):
+        """模拟分页接口：按 track_ids 给定的顺序（例如新音频在前）返回"""
+        def fetch(album_id, page, page_size, resolve_urls=True, ttl=None):
+            return [_make_tracks(1, len(track_ids), page=page, page_size=page_size, first_id=track_id)[0]
+                    for track_id in track_ids[(page - 1) * page_size:page * page_size]]
+        return fetch
+
+    @patch("downloader.downloader.M4ADownloader.get_track_download_url", return_value="http://cdn/a.m4a")
+    @patch("downloader.album_download.fetch_album_tracks")
+    @patch("downloader.downloader.M4ADownloader.download_track_by_id")
+    def test_incremental_sync_fetches_only_new_tracks(self, mock_download, mock_fetch_tracks, mock_get_url, tmp_path):
+        from types import SimpleNamespace
+        from downloader.album_download import AlbumDownloader
+        mock_download.side_effect = _fake_download()
+
+        def run(total_count, update_date):
+            mock_fetch_tracks.side_effect = self._album_pages(total_count)
+            downloader = AlbumDownloader(1, log_func=MagicMock(), incremental=True)
+            downloader.album = SimpleNamespace(updateDate=update_date)
+            downloader.save_dir = str(tmp_path)
+            downloader.fetch_and_download_tracks()
+
+        # 第一次没有同步记录，完整扫描
+        run(25, 'd1')
+        assert mock_download.call_count == 25
+        # 专辑未更新：不请求分页接口
+        mock_fetch_tracks.reset_mock()
+        mock_download.reset_mock()
+        run(25, 'd1')
+        mock_fetch_tracks.assert_not_called()
+        mock_download.assert_not_called()
+        # 新增两集：只请求尾页（强制向服务器确认），只下载新增的音频
+        run(27, 'd2')
+        assert [(c.args[1], c.kwargs['ttl']) for c in mock_fetch_tracks.call_args_list] == [(2, 0)]
+        assert sorted(c.args[0] for c in mock_download.call_args_list) == [26, 27]
+        # 新增跨页：从尾页一直拉到新的最后一页
+        mock_fetch_tracks.reset_mock()
+        mock_download.reset_mock()
+        run(45, 'd3')
+        assert [c.args[1] for c in mock_fetch_tracks.call_args_list] == [2, 3]
+        assert sorted(c.args[0] for c in mock_download.call_args_list) == list(range(28, 46))
+
+    @patch("downloader.downloader.M4ADownloader.get_track_download_url", return_value="http://cdn/a.m4a")
+    @patch("downloader.album_download.fetch_album_tracks")
+    @patch("downloader.downloader.M4ADownloader.download_track_by_id")
+    def test_incremental_sync_newest_first_and_reordered(self, mock_download, mock_fetch_tracks, mock_get_url, tmp_path):
+        from types import SimpleNamespace
+        from downloader.album_download import AlbumDownloader
+        mock_download.side_effect = _fake_download()
+
+        def run(track_ids, update_date):
+            mock_fetch_tracks.reset_mock()
+            mock_download.reset_mock()
+            mock_fetch_tracks.side_effect = self._ordered_pages(track_ids)
+            downloader = AlbumDownloader(1, log_func=MagicMock(), incremental=True)
+            downloader.album = SimpleNamespace(updateDate=update_date)
+            downloader.save_dir = str(tmp_path)
+            downloader.fetch_and_download_tracks()
+            return downloader.summary()
+
+        # 新音频在前：20 个音频同步后在开头新增 1 个
+        track_ids = list(range(20, 0, -1))
+        assert run(track_ids, 'd1')['downloaded'] == 20
+        track_ids = [21] + track_ids
+        summary = run(track_ids, 'd2')
+        assert [c.args[0] for c in mock_download.call_args_list] == [21]
+        assert [c.args[1] for c in mock_fetch_tracks.call_args_list] == [1, 2]
+        assert summary['downloaded'] == 21 and summary['pending'] == 0
+        run(track_ids, 'd2')
+        mock_fetch_tracks.assert_not_called()
+        # 新音频插在中间：无法增量，完整扫描不按页跳过，仍能找到新音频
+        track_ids = track_ids[:10] + [99] + track_ids[10:]
+        summary = run(track_ids, 'd3')
+        assert [c.args[0] for c in mock_download.call_args_list] == [99]
+        assert summary['downloaded'] == 22 and summary['pending'] == 0
+
+    @patch("downloader.downloader.M4ADownloader.get_track_download_url", return_value="http://cdn/a.m4a")
+    @patch("downloader.album_download.fetch_album_tracks")
+    @patch("downloader.downloader.M4ADownloader.download_track_by_id")
+    def test_pipeline_downloads_before_listing_finishes(self, mock_download, mock_fetch_tracks, mock_get_url, tmp_path):
+        from downloader.album_download import AlbumDownloader
+        order = []
+        pages = self._album_pages(45)
+
+        def fetch(album_id, page, page_size, resolve_urls=True, ttl=None):
+            order.append(("page", page))
+            return pages(album_id, page, page_size, resolve_urls, ttl)
+
+        mock_fetch_tracks.side_effect = fetch
+        mock_download.side_effect = _fake_download(before=lambda track_id, _: order.append(("download", track_id)))
+        downloader = AlbumDownloader(1, log_func=MagicMock())
+        downloader.save_dir = str(tmp_path)
+        downloader.fetch_and_download_tracks()
+
+        assert mock_download.call_count == 45 and mock_get_url.call_count == 45
+        # 有界队列：第 3 页请求之前已经开始下载
+        assert order.index(("download", 1)) < order.index(("page", 3))
+        assert downloader._downloaded == 45
+
+    @patch("downloader.downloader.M4ADownloader.get_track_download_url", return_value="http://cdn/a.m4a")
+    @patch("downloader.album_download.fetch_album_tracks")
+    @patch("downloader.downloader.M4ADownloader.download_track_by_id")
+    def test_concurrent_download_saves_progress(self, mock_download, mock_fetch_tracks, mock_get_url, tmp_path):
+        import json
+        from downloader.album_download import AlbumDownloader
+        mock_fetch_tracks.return_value = _make_tracks(8)
+        threads = set()
+        # 任务逐个流入下载阶段，下载需有耗时其他线程才会分到任务
+        mock_download.side_effect = _fake_download(before=lambda *_: threads.add(threading.current_thread().name),
+                                                   delay=0.02)
+        progress_calls = []
+        downloader = AlbumDownloader(1, log_func=MagicMock(), max_workers=4,
+                                     progress_func=lambda c, t, f=None: progress_calls.append((c, t)))
+        downloader.save_dir = str(tmp_path)
+        downloader.fetch_and_download_tracks()
+
+        assert mock_download.call_count == 8
+        assert mock_get_url.call_count == 8
+        assert mock_fetch_tracks.call_args.kwargs["resolve_urls"] is False
+        assert all(c.kwargs["url"] == "http://cdn/a.m4a" for c in mock_download.call_args_list)
+        assert len(threads) > 1
+        progress = json.loads((tmp_path / 'download_progress.json').read_text(encoding='utf-8'))
+        assert progress['1']['done'] is True
+        assert len(progress['1']['tracks']) == 8
+        assert all(t['done'] for t in progress['1']['tracks'].values())
+        assert progress_calls[-1] == (8, 8)
+        assert downloader.summary() == {'albumTitle': '', 'total': 8, 'downloaded': 8, 'failed': 0, 'pending': 0,
+                                        'blocked': False}
+
+    @patch("time.sleep", return_value=None)
+    @patch("downloader.downloader.M4ADownloader.get_track_download_url", return_value="http://cdn/a.m4a")
+    @patch("downloader.album_download.fetch_album_tracks")
+    @patch("downloader.downloader.M4ADownloader.download_track_by_id")
+    def test_concurrent_download_stops_on_blocked(self, mock_download, mock_fetch_tracks, mock_get_url, mock_sleep, tmp_path):
+        import json
+        from downloader.album_download import AlbumDownloader
+        from fetcher.track_fetcher import BlockedException
+        mock_fetch_tracks.return_value = _make_tracks(6)
+        mock_download.side_effect = BlockedException("风控触发")
+        downloader = AlbumDownloader(1, log_func=MagicMock(), max_workers=3)
+        downloader.save_dir = str(tmp_path)
+        downloader.fetch_and_download_tracks()
+
+        assert downloader._blocked is True
+        assert mock_download.call_count <= 3
+        progress = json.loads((tmp_path / 'download_progress.json').read_text(encoding='utf-8'))
+        assert progress['blocked'] is True
+
+    @patch("downloader.downloader.M4ADownloader.get_track_download_url", return_value="http://cdn/a.m4a")
+    @patch("downloader.album_download.fetch_album_tracks")
+    @patch("downloader.downloader.M4ADownloader.download_track_by_id")
+    def test_restart_after_partial_concurrent_run(self, mock_download, mock_fetch_tracks, mock_get_url, tmp_path):
+        import json
+        from downloader.album_download import AlbumDownloader
+        from fetcher.track_fetcher import BlockedException
+        mock_fetch_tracks.return_value = _make_tracks(3)
+        first_done = threading.Event()
+        write = _fake_download(after=lambda *_: first_done.set())
+
+        def download(track_id, album_id, output_file, log_func=print, url=None):
+            if track_id == 1:
+                return write(track_id, album_id, output_file)
+            # 邻居在第 1 个音频完成并更新进度之后才被风控中断
+            first_done.wait(5)
+            time.sleep(0.05)
+            raise BlockedException("风控触发")
+
+        mock_download.side_effect = download
+        downloader = AlbumDownloader(1, log_func=MagicMock(), max_workers=3)
+        downloader.save_dir = str(tmp_path)
+        downloader.fetch_and_download_tracks()
+        progress = json.loads((tmp_path / "download_progress.json").read_text(encoding="utf-8"))
+        assert not progress["1"].get("done")
+        assert sorted(t["done"] for t in progress["1"]["tracks"].values()) == [False, False, True]
+
+        mock_download.reset_mock()
+        mock_download.side_effect = _fake_download()
+        downloader = AlbumDownloader(1, log_func=MagicMock(), max_workers=3)
+        downloader.save_dir = str(tmp_path)
+        downloader.fetch_and_download_tracks()
+        assert sorted(c.args[0] for c in mock_download.call_args_list) == [2, 3]
+        progress = json.loads((tmp_path / "download_progress.json").read_text(encoding="utf-8"))
+        assert progress["1"]["done"] is True
+
+    @patch("time.sleep", return_value=None)
+    @patch("downloader.downloader.M4ADownloader.get_track_download_url", return_value="http://cdn/a.m4a")
+    @patch("downloader.album_download.fetch_album_tracks")
+    @patch("downloader.downloader.M4ADownloader.download_track_by_id")
+    def test_url_resolved_once_across_retries(self, mock_download, mock_fetch_tracks, mock_get_url, mock_sleep, tmp_path):
+        from downloader.album_download import AlbumDownloader
+        mock_fetch_tracks.return_value = _make_tracks(1)
+        mock_download.side_effect = [requests.exceptions.RequestException("Error"), None]
+        downloader = AlbumDownloader(1, log_func=MagicMock())
+        downloader.save_dir = str(tmp_path)
+        downloader.fetch_and_download_tracks()
+
+        assert mock_download.call_count == 2
+        mock_get_url.assert_called_once_with(1, 1)
+
+    @patch("downloader.downloader.M4ADownloader.get_track_download_url", return_value="http://cdn/a.m4a")
+    @patch("downloader.album_download.fetch_album_tracks")
+    @patch("downloader.downloader.M4ADownloader.download_track_by_id")
+    def test_resume_after_block_checks_every_track_id(self, mock_download, mock_fetch_tracks, mock_get_url, tmp_path):
+        from downloader.album_download import AlbumDownloader
+        from fetcher.track_fetcher import BlockedException
+        mock_fetch_tracks.return_value = _make_tracks(3)
+        write = _fake_download()
+
+        def first_then_blocked(track_id, album_id, output_file, log_func=print, url=None):
+            if track_id != 1:
+                raise BlockedException("风控触发")
+            write(track_id, album_id, output_file)
+
+        mock_download.side_effect = first_then_blocked
+        downloader = AlbumDownloader(1, log_func=MagicMock())
+        downloader.save_dir = str(tmp_path)
+        downloader.fetch_and_download_tracks()
+        assert downloader.blocked
+
+        # 重启：第 1 页只有 1 个音频完成，不能按页跳过
+        mock_download.reset_mock()
+        mock_download.side_effect = _fake_download()
+        downloader = AlbumDownloader(1, log_func=MagicMock())
+        downloader.save_dir = str(tmp_path)
+        downloader.fetch_and_download_tracks()
+        assert sorted(c.args[0] for c in mock_download.call_args_list) == [2, 3]
+        assert downloader.summary()["downloaded"] == 3 and downloader.summary()["pending"] == 0
+        assert len(list(tmp_path.glob("*.m4a"))) == 3
+
+    @patch("downloader.downloader.M4ADownloader.get_track_download_url", return_value="http://cdn/a.m4a")
+    @patch("downloader.album_download.fetch_album_tracks")
+    @patch("downloader.downloader.M4ADownloader.download_track_by_id")
+    def test_events_published_for_each_track(self, mock_download, mock_fetch_tracks, mock_get_url, tmp_path):
+        from downloader.album_download import AlbumDownloader
+        from downloader.events import EventBus
+        mock_fetch_tracks.return_value = _make_tracks(2)
+        events = []
+        bus = EventBus()
+        bus.subscribe(events.append)
+        downloader = AlbumDownloader(1, log_func=MagicMock(), events=bus)
+        downloader.save_dir = str(tmp_path)
+        downloader.fetch_and_download_tracks()
+
+        kinds = [e.kind for e in events]
+        assert kinds.count("track_queued") == 2 and kinds.count("track_completed") == 2
+        assert kinds.index("track_started") < kinds.index("track_completed")
+        assert kinds[-1] == "album_finished" and events[-1].downloaded == 2
+        assert [e.current for e in events if e.kind == "album_progress"][-1] == 2
+
+    @patch("downloader.downloader.M4ADownloader.get_track_download_url", return_value="http://cdn/a.m4a")
+    @patch("downloader.album_download.fetch_album")
+    @patch("downloader.album_download.fetch_album_tracks")
+    @patch("downloader.downloader.M4ADownloader.download_track_by_id")
+    def test_album_run_writes_metrics_summary(self, mock_download, mock_fetch_tracks, mock_fetch_album, mock_get_url,
+                                              tmp_path):
+        import json
+        from fetcher.album_fetcher import Album
+        from downloader.album_download import AlbumDownloader
+        from utils import metrics
+        mock_fetch_album.return_value = Album(albumId=1, albumTitle="A", cover="", createDate="", updateDate="",
+                                              richIntro="", tracks=[])
+        mock_fetch_tracks.return_value = _make_tracks(2)
+        downloader = AlbumDownloader(1, log_func=MagicMock(), save_dir=str(tmp_path))
+        assert downloader.fetch_album_info()
+        metrics.inc("bytes", 10, stage="download")
+        downloader.fetch_and_download_tracks()
+
+        summary = json.loads((tmp_path / "A" / "download_metrics.json").read_text(encoding="utf-8"))
+        assert summary["album_id"] == 1 and summary["downloaded"] == 2 and summary["blocked"] is False
+        assert summary["counters"]["bytes{stage=download}"] == 10
+        assert summary["stages"]["progress"]["count"] >= 2
+
+
+class _RangeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    payload = bytes(range(256)) * 4096  # 1MB
+    honor_range = True
+
+    def do_GET(self):
+        data = self.payload
+        range_header = self.headers.get("Range")
+        if range_header and self.honor_range:
+            start, end = range_header.split("=")[1].split("-")
+            start, end = int(start), int(end) if end else len(data) - 1
+            body = data[start:end + 1]
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+        else:
+            body = data
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def range_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _RangeHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class _TruncatingHandler(_RangeHandler):
+    """不带 Range 的请求只发送前 1000 字节就断开连接，带 Range 的请求正常返回"""
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(self.headers.get("Range"))
+        if self.headers.get("Range"):
+            return super().do_GET()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(self.payload)))
+        self.end_headers()
+        self.wfile.write(self.payload[:1000])
+        self.close_connection = True
+
+
+@pytest.fixture
+def truncating_server():
+    _TruncatingHandler.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _TruncatingHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+# Test cases for segmented download
+class TestSegmentedDownload:
+    def test_segmented_download_assembles_file(self, range_server, tmp_path):
+        url = f"http://127.0.0.1:{range_server.server_address[1]}/track.m4a"
+        output = tmp_path / "track.m4a"
+        mock_log_func = MagicMock()
+        downloader = M4ADownloader(segments=4, min_segment_size=64 * 1024)
+        assert downloader._download_segmented(url, str(output), log_func=mock_log_func) is True
+        assert output.read_bytes() == _RangeHandler.payload
+        assert not (tmp_path / "track.m4a.part").exists()
+        expected_md5 = hashlib.md5(_RangeHandler.payload).hexdigest()
+        assert any(expected_md5 in str(c.args[0]) for c in mock_log_func.call_args_list)
+
+    @patch.object(_RangeHandler, "honor_range", False)
+    def test_segmented_download_falls_back_without_range(self, range_server, tmp_path):
+        url = f"http://127.0.0.1:{range_server.server_address[1]}/track.m4a"
+        output = tmp_path / "track.m4a"
+        downloader = M4ADownloader(segments=4, min_segment_size=64 * 1024)
+        with patch.object(M4ADownloader, "_download_once", wraps=downloader._download_once) as mock_once:
+            assert downloader._download_segmented(url, str(output), log_func=MagicMock()) is True
+            mock_once.assert_called_once()
+        assert output.read_bytes() == _RangeHandler.payload
+
+
+
+# Test cases for the streaming write path
+class TestStreamingDownload:
+    def test_download_once_streams_into_reused_buffer(self, range_server, tmp_path):
+        url = f"http://127.0.0.1:{range_server.server_address[1]}/track.m4a"
+        output = tmp_path / "track.m4a"
+        mock_log_func = MagicMock()
+        downloader = M4ADownloader(chunk_size=64 * 1024, progress_interval=3600)
+        assert downloader._download_once(url, str(output), log_func=mock_log_func) is True
+        assert output.read_bytes() == _RangeHandler.payload
+        assert downloader.checksums[str(output)] == hashlib.md5(_RangeHandler.payload).hexdigest()
+        # 16 个数据块只输出完成时的一次进度
+        progress = [c.args[0] for c in mock_log_func.call_args_list if "下载进度" in c.args[0]]
+        assert progress == ["\r下载进度: 100% (1024KB/1024KB)"]
+
+    def test_dropped_connection_is_retried_and_resumed(self, truncating_server, tmp_path):
+        url = f"http://127.0.0.1:{truncating_server.server_address[1]}/track.m4a"
+        output = tmp_path / "track.m4a"
+        downloader = M4ADownloader(retry_delay=0, chunk_size=64 * 1024)
+        assert downloader.download_m4a(url, str(output), log_func=MagicMock()) is True
+        assert output.read_bytes() == _RangeHandler.payload
+        # 第一次请求中途断开，第二次从 .part 的 1000 字节处续传
+        assert _TruncatingHandler.requests == [None, "bytes=1000-"]
+
+    def test_progress_throttle_by_bytes(self):
+        from downloader.downloader import ProgressThrottle
+        mock_log_func = MagicMock()
+        progress = ProgressThrottle(1000, mock_log_func, interval=3600, min_bytes=300)
+        for _ in range(10):
+            progress.update(100)
+        assert mock_log_func.call_count == 4  # 300, 600, 900 字节以及完成时
+
+    def test_progress_throttle_without_content_length(self):
+        from downloader.downloader import ProgressThrottle
+        on_update = MagicMock()
+        progress = ProgressThrottle(0, None, on_update=on_update, interval=3600)
+        for _ in range(10):
+            progress.update(100)
+        on_update.assert_not_called()  # 总大小未知时不视为已完成，仍按时间间隔节流
+
+
+# Test cases for the progress event bus
+class TestEvents:
+    def test_dispatcher_coalesces_progress_and_keeps_other_events(self):
+        from downloader.events import EventBus, CoalescingDispatcher, BytesProgress, TrackStarted, TrackCompleted
+        received = []
+        dispatcher = CoalescingDispatcher(received.append)
+        bus = EventBus()
+        bus.subscribe(dispatcher)
+        bus.publish(TrackStarted(1, "11", "a.m4a", 1, 1))
+        for done in range(0, 1001, 100):
+            bus.publish(BytesProgress("a.m4a", done, 1000))
+        bus.publish(TrackCompleted(1, "11", "a.m4a", "a.m4a", 1000))
+        assert dispatcher.drain() == 3
+        assert [e.kind for e in received] == ["track_started", "bytes_progress", "track_completed"]
+        assert received[1].done == 1000
+        assert dispatcher.drain() == 0
+
+    def test_subscriber_errors_do_not_break_publish(self):
+        from downloader.events import EventBus, Blocked
+        bus = EventBus()
+        received = []
+        bus.subscribe(MagicMock(side_effect=RuntimeError("ui gone")))
+        bus.subscribe(received.append, Blocked)
+        bus.publish(Blocked(1, "风控"))
+        assert bus.errors == 1 and len(received) == 1
+
+    def test_download_publishes_bytes_instead_of_progress_strings(self, range_server, tmp_path):
+        from downloader.events import EventBus, BytesProgress
+        url = f"http://127.0.0.1:{range_server.server_address[1]}/track.m4a"
+        output = tmp_path / "track.m4a"
+        events = []
+        bus = EventBus()
+        bus.subscribe(events.append, BytesProgress)
+        mock_log_func = MagicMock()
+        downloader = M4ADownloader(chunk_size=64 * 1024, progress_interval=0, events=bus)
+        assert downloader._download_once(url, str(output), log_func=mock_log_func) is True
+        assert len(events) == 16 and events[-1] == BytesProgress(str(output), 1024 * 1024, 1024 * 1024)
+        assert not any("下载进度" in str(c.args[0]) for c in mock_log_func.call_args_list)
+
+
+# Test cases for BatchDownloader
+class TestBatchDownloader:
+    @staticmethod
+    def _fake_album(album_id, ttl=None):
+        from fetcher.album_fetcher import Album
+        return Album(albumId=album_id, albumTitle=f"Album {album_id}", cover="", createDate="", updateDate="u",
+                     richIntro="", tracks=[])
+
+    @staticmethod
+    def _fake_tracks(album_id, page, page_size, resolve_urls=True, ttl=None):
+        return _make_tracks(3, page_size=page_size, first_id=album_id * 100 + 1)
+
+    def test_read_album_ids(self, tmp_path):
+        from downloader.batch_download import read_album_ids
+        ids_file = tmp_path / "albums.txt"
+        ids_file.write_text("# 订阅列表\n123\nhttps://www.ximalaya.com/album/456?source=x\n\n123  # 重复\n", encoding="utf-8")
+        assert read_album_ids(str(ids_file)) == [123, 456]
+        assert read_album_ids("7, 8 9") == [7, 8, 9]
+        assert read_album_ids([10, "11"]) == [10, 11]
+        with pytest.raises(ValueError):
+            read_album_ids(["abc"])
+
+    @patch("downloader.downloader.M4ADownloader.get_track_download_url", return_value="http://cdn/a.m4a")
+    @patch("downloader.downloader.M4ADownloader.download_track_by_id")
+    def test_fair_round_robin_across_albums(self, mock_download, mock_get_url, tmp_path):
+        from downloader.batch_download import BatchDownloader
+        order = []
+        mock_download.side_effect = _fake_download(before=lambda track_id, album_id: order.append(album_id))
+        with patch("downloader.album_download.fetch_album", side_effect=self._fake_album), \
+                patch("downloader.album_download.fetch_album_tracks", side_effect=self._fake_tracks):
+            results = BatchDownloader([1, 2, 3], log_func=MagicMock(), save_dir=str(tmp_path), max_workers=1,
+                                      max_active_albums=3).run()
+        # 单线程时各专辑轮流下载
+        assert order == [1, 2, 3] * 3
+        for album_id in (1, 2, 3):
+            album_dir = tmp_path / f"Album {album_id}"
+            assert (album_dir / "album_info.json").exists()
+            assert len(list(album_dir.glob("*.m4a"))) == 3
+            assert results[album_id] == {"albumTitle": f"Album {album_id}", "total": 3, "downloaded": 3,
+                                         "failed": 0, "pending": 0, "blocked": False}
+
+    @patch("downloader.downloader.M4ADownloader.get_track_download_url", return_value="http://cdn/a.m4a")
+    @patch("downloader.downloader.M4ADownloader.download_track_by_id")
+    def test_global_and_per_album_concurrency_caps(self, mock_download, mock_get_url, tmp_path):
+        from downloader.batch_download import BatchDownloader
+        lock = threading.Lock()
+        state = {"running": 0, "max": 0, "per_album": {}, "max_per_album": 0}
+
+        def started(track_id, album_id):
+            with lock:
+                state["running"] += 1
+                state["per_album"][album_id] = state["per_album"].get(album_id, 0) + 1
+                state["max"] = max(state["max"], state["running"])
+                state["max_per_album"] = max(state["max_per_album"], state["per_album"][album_id])
+
+        def finished(track_id, album_id):
+            with lock:
+                state["running"] -= 1
+                state["per_album"][album_id] -= 1
+
+        mock_download.side_effect = _fake_download(before=started, after=finished, delay=0.02)
+        with patch("downloader.album_download.fetch_album", side_effect=self._fake_album), \
+                patch("downloader.album_download.fetch_album_tracks", side_effect=self._fake_tracks):
+            results = BatchDownloader([1, 2, 3, 4], log_func=MagicMock(), save_dir=str(tmp_path),
+                                      max_workers=3, max_per_album=1).run()
+        assert mock_download.call_count == 12
+        assert state["max"] <= 3
+        assert state["max_per_album"] == 1
+        assert all(r["downloaded"] == 3 for r in results.values())
+
+    @patch("time.sleep")
+    @patch("downloader.downloader.M4ADownloader.get_track_download_url", return_value="http://cdn/a.m4a")
+    @patch("downloader.downloader.M4ADownloader.download_track_by_id")
+    def test_blocked_stops_whole_batch(self, mock_download, mock_get_url, mock_sleep, tmp_path):
+        from fetcher.track_fetcher import BlockedException
+        from downloader.batch_download import BatchDownloader
+        mock_download.side_effect = BlockedException("风控")
+        with patch("downloader.album_download.fetch_album", side_effect=self._fake_album), \
+                patch("downloader.album_download.fetch_album_tracks", side_effect=self._fake_tracks):
+            results = BatchDownloader([1, 2, 3], log_func=MagicMock(), save_dir=str(tmp_path), max_workers=1).run()
+        assert mock_download.call_count == 1
+        assert all(r["blocked"] for r in results.values())
+
+
+# Test cases for the asyncio engine
+class TestAsyncEngine:
+    def test_download_albums_drives_real_downloader(self, range_server, tmp_path):
+        import json
+        from downloader.async_engine import run_albums
+        from downloader.events import EventBus
+        url = f"http://127.0.0.1:{range_server.server_port}/a.m4a"
+        events = []
+        bus = EventBus()
+        bus.subscribe(events.append)
+        with patch("downloader.album_download.fetch_album", side_effect=TestBatchDownloader._fake_album), \
+                patch("downloader.album_download.fetch_album_tracks", side_effect=TestBatchDownloader._fake_tracks), \
+                patch("downloader.downloader.M4ADownloader.get_track_download_url", return_value=url):
+            results = run_albums([1, 2], log_func=MagicMock(), save_dir=str(tmp_path), download_concurrency=2,
+                                 events=bus)
+
+        for album_id in (1, 2):
+            album_dir = tmp_path / f"Album {album_id}"
+            files = list(album_dir.glob("*.m4a"))
+            assert len(files) == 3 and all(f.read_bytes() == _RangeHandler.payload for f in files)
+            progress = json.loads((album_dir / "download_progress.json").read_text(encoding="utf-8"))
+            assert all(t["done"] for t in progress["1"]["tracks"].values())
+            assert results[album_id] == {"albumTitle": f"Album {album_id}", "total": 3, "downloaded": 3,
+                                         "failed": 0, "pending": 0, "blocked": False}
+        kinds = [e.kind for e in events]
+        assert kinds.count("track_completed") == 6 and kinds.count("album_finished") == 2
+        assert "bytes_progress" in kinds
+
+    @patch("downloader.downloader.M4ADownloader.get_track_download_url", return_value="http://cdn/a.m4a")
+    @patch("downloader.downloader.M4ADownloader.download_track_by_id")
+    def test_download_concurrency_is_global(self, mock_download, mock_get_url, tmp_path):
+        from downloader.async_engine import run_albums
+        lock = threading.Lock()
+        state = {"running": 0, "max": 0}
+
+        def started(track_id, album_id):
+            with lock:
+                state["running"] += 1
+                state["max"] = max(state["max"], state["running"])
+
+        def finished(track_id, album_id):
+            with lock:
+                state["running"] -= 1
+
+        mock_download.side_effect = _fake_download(before=started, after=finished, delay=0.02)
+        with patch("downloader.album_download.fetch_album", side_effect=TestBatchDownloader._fake_album), \
+                patch("downloader.album_download.fetch_album_tracks", side_effect=TestBatchDownloader._fake_tracks):
+            results = run_albums([1, 2, 3, 4], log_func=MagicMock(), save_dir=str(tmp_path),
+                                 download_concurrency=3)
+        assert mock_download.call_count == 12
+        assert 1 < state["max"] <= 3
+        assert all(r["downloaded"] == 3 for r in results.values())
+
+    @patch("time.sleep")
+    @patch("downloader.downloader.M4ADownloader.get_track_download_url", return_value="http://cdn/a.m4a")
+    @patch("downloader.downloader.M4ADownloader.download_track_by_id")
+    def test_blocked_album_pauses_the_rest(self, mock_download, mock_get_url, mock_sleep, tmp_path):
+        from fetcher.track_fetcher import BlockedException
+        from downloader.async_engine import run_albums
+        mock_download.side_effect = BlockedException("风控")
+        with patch("downloader.album_download.fetch_album", side_effect=TestBatchDownloader._fake_album), \
+                patch("downloader.album_download.fetch_album_tracks", side_effect=TestBatchDownloader._fake_tracks):
+            results = run_albums([1, 2, 3], log_func=MagicMock(), save_dir=str(tmp_path), download_concurrency=1,
+                                 max_active_albums=1)
+        assert mock_download.call_count == 1
+        assert all(r["blocked"] for r in results.values())
+
+
+# Test cases for ProgressStore
+class TestProgressStore:
+    def test_journal_replay_restores_state(self, tmp_path):
+        from downloader.progress_store import ProgressStore
+        store = ProgressStore(str(tmp_path))
+        store.load()
+        store.update_track(1, "11", {"done": True, "filename": "001_a.m4a"})
+        store.update_track(1, "12", {"done": False, "error": "timeout"})
+        store.set("blocked", True)
+        store.sync()
+        assert not (tmp_path / "download_progress.json").exists()
+
+        # 模拟进程中断后重启：最后一行写了一半
+        with open(tmp_path / "download_progress.journal", "a", encoding="utf-8") as f:
+            f.write('{"p":"1","t":"13","s":{"do')
+        data = ProgressStore(str(tmp_path)).load()
+        assert data["1"]["tracks"]["11"]["done"] is True
+        assert data["1"]["tracks"]["12"]["error"] == "timeout"
+        assert "13" not in data["1"]["tracks"]
+        assert data["blocked"] is True
+
+    def test_compaction_writes_snapshot_and_truncates_journal(self, tmp_path):
+        import json
+        from downloader.progress_store import ProgressStore
+        store = ProgressStore(str(tmp_path), compact_every=4)
+        store.load()
+        for track_id in range(5):
+            store.update_track(1, track_id, {"done": True})
+        store.mark_page_done_if_complete(1)
+        snapshot = json.loads((tmp_path / "download_progress.json").read_text(encoding="utf-8"))
+        assert len(snapshot["1"]["tracks"]) == 4
+        assert len((tmp_path / "download_progress.journal").read_text(encoding="utf-8").splitlines()) == 2
+
+        store.close()
+        assert not (tmp_path / "download_progress.journal").exists()
+        data = ProgressStore(str(tmp_path)).load()
+        assert len(data["1"]["tracks"]) == 5
+        assert data["1"]["done"] is True
+
+
+# Test cases for TrackIndex
+class TestTrackIndex:
+    def test_scandir_reconcile_adopt_and_persist(self, tmp_path):
+        from downloader.track_index import TrackIndex
+        (tmp_path / "001_a.m4a").write_bytes(b"x" * 20000)
+        (tmp_path / "002_b.m4a").write_bytes(b"x" * 100)  # 过小，视为未完成
+        index = TrackIndex(str(tmp_path))
+        assert index.lookup(11, "001_a.m4a")["size"] == 20000  # 旧文件按文件名补进索引
+        assert index.lookup(12, "002_b.m4a") is None
+        index.record(13, "003_c.m4a", 5, md5="abc")
+        assert index.lookup(13, "003_改名.m4a")["filename"] == "003_c.m4a"  # 改名后按 trackId 命中
+        index.close()
+
+        (tmp_path / "003_c.m4a").write_bytes(b"12345")
+        reopened = TrackIndex(str(tmp_path))
+        assert len(reopened) == 2 and reopened.lookup(13)["md5"] == "abc"
+        (tmp_path / "001_a.m4a").unlink()
+        assert TrackIndex(str(tmp_path)).lookup(11) is None  # 文件已删除的条目被丢弃
+
+    @patch("downloader.downloader.M4ADownloader.get_track_download_url", return_value="http://cdn/a.m4a")
+    @patch("downloader.album_download.fetch_album_tracks")
+    @patch("downloader.downloader.M4ADownloader.download_track_by_id")
+    def test_reordered_and_renamed_tracks_not_redownloaded(self, mock_download, mock_fetch_tracks, mock_get_url, tmp_path):
+        from downloader.album_download import AlbumDownloader
+        mock_download.side_effect = _fake_download()
+        mock_fetch_tracks.return_value = _make_tracks(3)
+        downloader = AlbumDownloader(1, log_func=MagicMock())
+        downloader.save_dir = str(tmp_path)
+        downloader.fetch_and_download_tracks()
+        assert mock_download.call_count == 3
+
+        # 进度记录丢失，服务器上曲目倒序且改了标题
+        (tmp_path / "download_progress.json").unlink()
+        tracks = _make_tracks(3)[::-1]
+        for track in tracks:
+            track.title += " (修订)"
+        mock_fetch_tracks.return_value = tracks
+        mock_download.reset_mock()
+        downloader = AlbumDownloader(1, log_func=MagicMock())
+        downloader.save_dir = str(tmp_path)
+        downloader.fetch_and_download_tracks()
+        mock_download.assert_not_called()
+
+
+# Test cases for StateDB
+class TestStateDB:
+    def test_track_status_lifecycle_and_cross_album_queries(self, tmp_path):
+        from downloader.state_db import StateDB
+        db = StateDB(str(tmp_path / "state.db"))
+        db.upsert_album(1, title="Album 1")
+        db.mark_downloading(11, 1, idx=1, filename="001_a.m4a")
+        db.mark_done(11, 1, path="/x/001_a.m4a", size=2048, md5="abc")
+        db.mark_failed(12, 1, error="timeout", partial_bytes=100)
+        db.mark_failed(21, 2, error="系统繁忙", blocked=True)
+
+        assert db.is_done(11)
+        assert db.done_track_ids(1) == {11}
+        track = db.get_track(11)
+        assert track["md5"] == "abc" and track["attempts"] == 1 and track["error"] is None
+        assert [t["track_id"] for t in db.failed_tracks()] == [12, 21]
+        assert db.failed_tracks(1)[0]["bytes"] == 100
+        assert db.summary() == {"done": 1, "failed": 1, "blocked": 1}
+        db.close()
+
+    @patch("downloader.downloader.M4ADownloader.get_track_download_url", return_value="http://cdn/a.m4a")
+    @patch("downloader.album_download.fetch_album_tracks")
+    @patch("downloader.downloader.M4ADownloader.download_track_by_id")
+    def test_album_downloader_uses_state_db_for_resume(self, mock_download, mock_fetch_tracks, mock_get_url, tmp_path):
+        from downloader.album_download import AlbumDownloader
+        from downloader.state_db import StateDB
+        db = StateDB(str(tmp_path / "state.db"))
+        # 1 在本目录中以旧文件名存在；2 记录的是另一个下载目录；3 的文件已被删除
+        (tmp_path / "old_name.m4a").write_bytes(b"x" * 20000)
+        db.mark_done(1, 1, path=str(tmp_path / "old_name.m4a"))
+        db.mark_done(2, 1, path=str(tmp_path / "other" / "002_Track 2.m4a"))
+        db.mark_done(3, 1, path=str(tmp_path / "003_Track 3.m4a"))
+        assert set(db.done_track_paths(1, str(tmp_path))) == {1, 3}
+        mock_fetch_tracks.return_value = _make_tracks(3)
+        downloader = AlbumDownloader(1, log_func=MagicMock(), state_db=db)
+        downloader.save_dir = str(tmp_path)
+        downloader.fetch_and_download_tracks()
+
+        assert sorted(c.args[0] for c in mock_download.call_args_list) == [2, 3]
+        assert db.done_track_ids(1) == {1, 2, 3}
+        assert db.get_track(2)["filename"] == "002_Track 2.m4a"
+
+    @patch("downloader.downloader.M4ADownloader.download_track_by_id")
+    @patch("fetcher.track_info_fetcher.get_track_info")
+    def test_single_track_skips_done_file_in_save_dir(self, mock_track_info, mock_download, tmp_path):
+        from types import SimpleNamespace
+        from downloader.single_track_download import download_single_track
+        from downloader.state_db import StateDB
+        db = StateDB(str(tmp_path / "state.db"))
+        (tmp_path / "a.m4a").write_bytes(b"x" * 2048)
+        db.mark_done(1, 9, path=str(tmp_path / "a.m4a"), size=2048)
+        assert download_single_track(1, 9, log_func=MagicMock(), save_dir=str(tmp_path), state_db=db) is True
+        mock_track_info.assert_not_called()
+        mock_download.assert_not_called()
+        # 文件已删除：重新下载并更新状态库
+        (tmp_path / "a.m4a").unlink()
+        mock_track_info.return_value = SimpleNamespace(title="a")
+        mock_download.side_effect = _fake_download()
+        assert download_single_track(1, 9, log_func=MagicMock(), save_dir=str(tmp_path), state_db=db) is True
+        mock_download.assert_called_once()
+        assert db.get_track(1)["status"] == "done" and (tmp_path / "a.m4a").exists()
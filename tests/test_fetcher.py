@@ -1,7 +1,7 @@
 import pytest
 import requests
 from unittest.mock import patch, MagicMock
-from fetcher.track_fetcher import fetch_track_crypted_url, fetch_album_tracks, BlockedException, Track
+from fetcher.track_fetcher import fetch_track_crypted_url, fetch_album_tracks, resolve_track_url, BlockedException, Track
 from fetcher.album_fetcher import fetch_album, Album
 import os
 
@@ -13,7 +13,7 @@ def mock_env_vars():
 
 # Test cases for fetch_track_crypted_url
 def test_fetch_track_crypted_url_success():
-    with patch("requests.get") as mock_get:
+    with patch("requests.Session.get") as mock_get:
         mock_response = MagicMock()
         mock_response.status_code = 200
         mock_response.json.return_value = {
@@ -26,18 +26,17 @@ def test_fetch_track_crypted_url_success():
         
         url = fetch_track_crypted_url(123, 456)
         assert url == "http://crypted.url/test"
-        mock_get.assert_called_once_with(
-            "https://www.ximalaya.com/mobile-playpage/track/v3/baseInfo/456",
-            headers={
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36",
-                "Accept": "application/json",
-                "Cookie": "test_cookie"
-            },
-            params={"device": "web", "trackId": 123, "trackQualityLevel": 1}
-        )
+        mock_get.assert_called_once()
+        args, kwargs = mock_get.call_args
+        assert args == ("https://www.ximalaya.com/mobile-playpage/track/v3/baseInfo/456",)
+        assert kwargs["params"] == {"device": "web", "trackId": 123, "trackQualityLevel": 1}
+        assert kwargs["headers"]["Accept"] == "application/json"
+        assert kwargs["headers"]["Cookie"] == "test_cookie"
+        assert kwargs["headers"]["User-Agent"].startswith("Mozilla/5.0")
+        assert kwargs["timeout"] == (5, 10)
 
 def test_fetch_track_crypted_url_blocked_ret_1001():
-    with patch("requests.get") as mock_get:
+    with patch("requests.Session.get") as mock_get:
         mock_response = MagicMock()
         mock_response.status_code = 200
         mock_response.json.return_value = {"ret": 1001, "msg": "系统繁忙"}
@@ -47,7 +46,7 @@ def test_fetch_track_crypted_url_blocked_ret_1001():
             fetch_track_crypted_url(123, 456)
 
 def test_fetch_track_crypted_url_blocked_msg():
-    with patch("requests.get") as mock_get:
+    with patch("requests.Session.get") as mock_get:
         mock_response = MagicMock()
         mock_response.status_code = 200
         mock_response.json.return_value = {"ret": 0, "msg": "系统繁忙"}
@@ -57,7 +56,7 @@ def test_fetch_track_crypted_url_blocked_msg():
             fetch_track_crypted_url(123, 456)
 
 def test_fetch_track_crypted_url_no_play_url():
-    with patch("requests.get") as mock_get:
+    with patch("requests.Session.get") as mock_get:
         mock_response = MagicMock()
         mock_response.status_code = 200
         mock_response.json.return_value = {
@@ -70,7 +69,7 @@ def test_fetch_track_crypted_url_no_play_url():
         assert url == ""
 
 def test_fetch_track_crypted_url_http_error():
-    with patch("requests.get") as mock_get:
+    with patch("requests.Session.get") as mock_get:
         mock_response = MagicMock()
         mock_response.status_code = 404
         mock_response.text = "Not Found"
@@ -81,9 +80,9 @@ def test_fetch_track_crypted_url_http_error():
 
 # Test cases for fetch_album_tracks
 @patch("fetcher.track_fetcher.fetch_track_crypted_url")
-@patch("requests.get")
-@patch("utils.utils.decrypt_url")
-def test_fetch_album_tracks_success(mock_decrypt_url, mock_requests_get, mock_fetch_crypted_url):
+@patch("requests.Session.get")
+@patch("fetcher.track_fetcher.decrypt_many")
+def test_fetch_album_tracks_success(mock_decrypt_many, mock_requests_get, mock_fetch_crypted_url):
     mock_requests_get.return_value.status_code = 200
     mock_requests_get.return_value.json.return_value = {
         "data": {
@@ -95,7 +94,7 @@ def test_fetch_album_tracks_success(mock_decrypt_url, mock_requests_get, mock_fe
         }
     }
     mock_fetch_crypted_url.side_effect = ["crypted_url_1", "crypted_url_2"]
-    mock_decrypt_url.side_effect = ["decrypted_url_1", "decrypted_url_2"]
+    mock_decrypt_many.return_value = ["decrypted_url_1", "decrypted_url_2"]
 
     tracks = fetch_album_tracks(789, 1, 2)
     assert len(tracks) == 2
@@ -110,9 +109,11 @@ def test_fetch_album_tracks_success(mock_decrypt_url, mock_requests_get, mock_fe
     assert tracks[0].totalCount == 2
     assert tracks[0].page == 1
     assert tracks[0].pageSize == 2
+    # 整页只批量解密一次
+    mock_decrypt_many.assert_called_once_with(["crypted_url_1", "crypted_url_2"])
 
 @patch("fetcher.track_fetcher.fetch_track_crypted_url")
-@patch("requests.get")
+@patch("requests.Session.get")
 def test_fetch_album_tracks_crypted_url_blocked(mock_requests_get, mock_fetch_crypted_url):
     mock_requests_get.return_value.status_code = 200
     mock_requests_get.return_value.json.return_value = {
@@ -129,7 +130,7 @@ def test_fetch_album_tracks_crypted_url_blocked(mock_requests_get, mock_fetch_cr
         fetch_album_tracks(789, 1, 1)
 
 @patch("fetcher.track_fetcher.fetch_track_crypted_url")
-@patch("requests.get")
+@patch("requests.Session.get")
 def test_fetch_album_tracks_no_crypted_url(mock_requests_get, mock_fetch_crypted_url):
     mock_requests_get.return_value.status_code = 200
     mock_requests_get.return_value.json.return_value = {
@@ -145,7 +146,36 @@ def test_fetch_album_tracks_no_crypted_url(mock_requests_get, mock_fetch_crypted
     tracks = fetch_album_tracks(789, 1, 1)
     assert len(tracks) == 0 # Should skip the track
 
-@patch("requests.get")
+@patch("fetcher.track_fetcher.fetch_track_crypted_url")
+@patch("requests.Session.get")
+def test_fetch_album_tracks_metadata_only(mock_requests_get, mock_fetch_crypted_url):
+    mock_requests_get.return_value.status_code = 200
+    mock_requests_get.return_value.json.return_value = {
+        "data": {
+            "trackDetailInfos": [
+                {"trackInfo": {"id": 1, "title": "Track 1", "createdTime": "t1", "updatedTime": "u1", "duration": 100, "cover": "cover1"}},
+                {"trackInfo": {"id": 2, "title": "Track 2", "createdTime": "t2", "updatedTime": "u2", "duration": 200, "cover": "cover2"}}
+            ],
+            "totalCount": 2
+        }
+    }
+
+    tracks = fetch_album_tracks(789, 1, 2, resolve_urls=False)
+    assert [t.trackId for t in tracks] == [1, 2]
+    assert tracks[0].url == ""
+    assert tracks[0].totalCount == 2
+    mock_fetch_crypted_url.assert_not_called()
+
+@patch("fetcher.track_fetcher.decrypt_url", return_value="decrypted_url")
+@patch("fetcher.track_fetcher.fetch_track_crypted_url", return_value="crypted_url")
+def test_resolve_track_url_only_once(mock_fetch_crypted_url, mock_decrypt_url):
+    track = Track(trackId=1, title="Track 1", createTime="", updateTime="", cryptedUrl="", url="", duration=0)
+    assert resolve_track_url(track, 789) == "decrypted_url"
+    assert resolve_track_url(track, 789) == "decrypted_url"
+    mock_fetch_crypted_url.assert_called_once_with(1, 789)
+    assert track.cryptedUrl == "crypted_url"
+
+@patch("requests.Session.get")
 def test_fetch_album_tracks_http_error(mock_requests_get):
     mock_requests_get.return_value.status_code = 500
     mock_requests_get.return_value.text = "Internal Server Error"
@@ -155,7 +185,7 @@ def test_fetch_album_tracks_http_error(mock_requests_get):
 
 # Test cases for fetch_album
 def test_fetch_album_success():
-    with patch("requests.get") as mock_get:
+    with patch("requests.Session.get") as mock_get:
         mock_response = MagicMock()
         mock_response.status_code = 200
         mock_response.json.return_value = {
@@ -182,7 +212,7 @@ def test_fetch_album_success():
         assert album.tracks == []
 
 def test_fetch_album_http_error():
-    with patch("requests.get") as mock_get:
+    with patch("requests.Session.get") as mock_get:
         mock_response = MagicMock()
         mock_response.status_code = 404
         mock_response.raise_for_status.side_effect = requests.exceptions.HTTPError("404 Client Error")
@@ -192,8 +222,24 @@ def test_fetch_album_http_error():
         assert album is None
 
 def test_fetch_album_exception():
-    with patch("requests.get") as mock_get:
+    with patch("requests.Session.get") as mock_get:
         mock_get.side_effect = Exception("Network Error")
 
         album = fetch_album(123)
-        assert album is None
\ No newline at end of file
+        assert album is None
+
+
+@patch("requests.Session.get")
+def test_fetch_listen_history_only_on_call(mock_get):
+    import importlib
+    import fetcher.history_fetch as history_fetch
+    importlib.reload(history_fetch)
+    # 导入模块时不发请求
+    mock_get.assert_not_called()
+    mock_get.return_value.json.return_value = {"data": {
+        "today": [{"itemTitle": "专辑A", "childTitle": "第1集", "itemId": 1, "childId": 11}],
+        "earlier": [{"itemTitle": "专辑B", "childTitle": "第2集", "itemId": 2, "childId": 22}],
+    }}
+    tracks = history_fetch.fetch_listen_history()
+    assert [(t.item_id, t.child_id) for t in tracks] == [(1, 11), (2, 22)]
+    assert mock_get.call_count == 1
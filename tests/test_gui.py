@@ -0,0 +1,104 @@
+import threading
+from gui.dispatch import UiDispatcher
+
+
+class _FakeRoot:
+    """只记录 after 回调，由测试手动推进主循环"""
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, ms, func, *args):
+        self.scheduled.append((func, args))
+
+    def run_once(self):
+        func, args = self.scheduled.pop(0)
+        func(*args)
+
+
+def test_worker_updates_run_on_tick_in_batches():
+    root = _FakeRoot()
+    ui = UiDispatcher(root, max_batch=3).start()
+    applied = []
+    threads = [threading.Thread(target=ui.call, args=(applied.append, i)) for i in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert applied == [] and ui.pending() == 5  # 工作线程只入队
+    root.run_once()
+    assert len(applied) == 3 and ui.pending() == 2
+    root.run_once()
+    assert sorted(applied) == [0, 1, 2, 3, 4]
+    assert len(root.scheduled) == 1  # 始终只保留下一拍
+
+
+def test_tick_hooks_and_errors_do_not_stop_loop():
+    root = _FakeRoot()
+    ui = UiDispatcher(root).start()
+    ticks = []
+    ui.add_tick(lambda: ticks.append(1))
+    ui.call(lambda: 1 / 0)
+    ui.call(ticks.append, 2)
+    root.run_once()
+    assert ticks == [1, 2] and ui.errors == 1
+    ui.stop()
+    root.run_once()
+    assert root.scheduled == []
+
+
+class _FakeText:
+    """记录 Text 控件调用，按行维护内容"""
+    def __init__(self):
+        self.lines = []
+        self.inserts = 0
+        self.tags = {}
+
+    def tag_config(self, tag, **options):
+        self.tags.setdefault(tag, {}).update(options)
+
+    def config(self, **options):
+        pass
+
+    def insert(self, index, *chunks):
+        self.inserts += 1
+        for text in chunks[::2]:
+            self.lines.extend(text.splitlines())
+
+    def delete(self, start, end):
+        del self.lines[:int(end.split('.')[0]) - 1]
+
+    def see(self, index):
+        pass
+
+
+def test_log_buffer_is_bounded_and_spills_to_rotating_file(tmp_path):
+    from gui.log_panel import LogBuffer
+    spill = tmp_path / "logs" / "gui.log"
+    buffer = LogBuffer(capacity=10, spill_path=str(spill), max_bytes=2048, backup_count=2)
+    for i in range(1000):
+        buffer.append(f"第{i}条", level="warning" if i % 2 else "info")
+    assert len(buffer.records) == 10 and buffer.total == 1000 and buffer.dropped == 990
+    assert buffer.take_pending()[-1] == ("warning", "第999条")
+    assert buffer.take_pending() == []
+    assert [r[1] for r in buffer.tail(2, levels={"info"})] == ["第996条", "第998条"]
+    buffer.close()
+    assert spill.exists() and (tmp_path / "logs" / "gui.log.1").exists() and (tmp_path / "logs" / "gui.log.2").exists()
+    assert not (tmp_path / "logs" / "gui.log.3").exists()
+    assert "第999条" in spill.read_text(encoding="utf-8")
+
+
+def test_log_panel_renders_batches_and_trims_widget():
+    from gui.log_panel import LogBuffer, LogPanel
+    text = _FakeText()
+    buffer = LogBuffer(capacity=5)
+    panel = LogPanel(text, buffer)
+    for i in range(3):
+        buffer.append(f"a{i}")
+    assert panel.render() == 3 and text.inserts == 1
+    buffer.append("多行\n第二行", level="error")
+    buffer.append("b")
+    buffer.append("c")
+    assert panel.render() == 3 and text.inserts == 2
+    assert text.lines == ["a1", "a2", "多行", "第二行", "b", "c"]
+    panel.set_level_visible("info", False)
+    assert text.tags["info"]["elide"] is True and panel.render() == 0
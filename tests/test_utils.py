@@ -0,0 +1,511 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+import pytest
+from utils.http_client import HttpClient
+from utils.rate_limiter import AdaptiveRateLimiter, get_limiter
+
+
+class _OkHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b'{"ret": 0}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def local_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _OkHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+# Test cases for HttpClient
+def test_build_headers_merges_family_cookie_and_caller_headers():
+    client = HttpClient()
+    with patch.dict(os.environ, {"XIMALAYA_COOKIES": "c=1"}):
+        headers = client.build_headers("listing", {"Referer": "https://www.ximalaya.com/album/1"})
+    assert headers["Cookie"] == "c=1"
+    assert headers["X-Requested-With"] == "XMLHttpRequest"
+    assert headers["Referer"] == "https://www.ximalaya.com/album/1"
+    assert headers["Connection"] == "keep-alive"
+    assert "Cookie" not in client.build_headers("cdn")
+
+
+def test_client_reuses_pooled_connections(local_server):
+    client = HttpClient()
+    for _ in range(5):
+        assert client.get(local_server + "/x", "baseinfo").json() == {"ret": 0}
+    stats = client.stats()
+    assert stats["requests"] == 5
+    assert stats["connections"] == 1
+    assert stats["reused"] == 4
+    assert stats["by_family"] == {"baseinfo": 5}
+    client.close()
+
+
+class TestAdaptiveRateLimiter:
+    def test_burst_then_throttle(self):
+        limiter = AdaptiveRateLimiter('test', rate=20, burst=2)
+        assert limiter.acquire() == 0
+        assert limiter.acquire() == 0
+        # 令牌用完后需要等待约 1/rate 秒
+        assert limiter.acquire() > 0
+
+    def test_aimd_adjusts_rate(self):
+        limiter = AdaptiveRateLimiter('test', rate=1.0, burst=1, min_rate=0.2, max_rate=2.0,
+                                      increase=0.5, decrease=0.5, success_threshold=2, cooldown=0)
+        limiter.on_success()
+        assert limiter.rate == 1.0
+        limiter.on_success()
+        assert limiter.rate == 1.5
+        for _ in range(4):
+            limiter.on_success()
+        assert limiter.rate == 2.0  # 不超过 max_rate
+        limiter.on_blocked()
+        assert limiter.rate == 1.0
+        for _ in range(5):
+            limiter.on_blocked()
+        assert limiter.rate == 0.2  # 不低于 min_rate
+        assert limiter.stats()['blocked'] == 6
+
+    def test_blocked_pauses_all_callers(self):
+        limiter = AdaptiveRateLimiter('test', rate=100, burst=5, cooldown=0.2)
+        limiter.on_blocked()
+        assert limiter.acquire() >= 0.15
+
+    def test_configure_can_lower_explicit_max_rate(self):
+        limiter = AdaptiveRateLimiter('test', rate=2.0, max_rate=10.0)
+        limiter.configure(rate=0.5, max_rate=0.5)
+        limiter.configure(max_rate=4.0)
+        assert limiter.max_rate == 4.0 and limiter.rate == 0.5
+        limiter.configure(max_rate=0.2)
+        assert limiter.rate == 0.2
+
+    def test_album_delay_does_not_touch_shared_cdn_limiter(self):
+        from downloader.album_download import AlbumDownloader
+        cdn = get_limiter('cdn')
+        rate, max_rate = cdn.rate, cdn.max_rate
+        downloader = AlbumDownloader(1, log_func=lambda *a, **k: None, delay=2)
+        assert downloader._delay_limiter.rate == 0.5
+        assert AlbumDownloader(1, delay=0)._delay_limiter is None
+        assert (cdn.rate, cdn.max_rate) == (rate, max_rate)
+
+    def test_http_client_feeds_back_status(self):
+        limiter = get_limiter('baseinfo')
+        rate = limiter.rate
+        client = HttpClient()
+        with patch('requests.Session.get') as mock_get:
+            mock_get.return_value.status_code = 429
+            client.get('http://example.invalid/', 'baseinfo')
+        assert limiter.rate < rate
+        assert limiter.blocked_count == 1
+
+    def test_blocked_response_slows_down_listing(self):
+        from fetcher.track_fetcher import fetch_album_tracks
+        limiter = get_limiter('listing')
+        rate = limiter.rate
+        with patch('requests.Session.get') as mock_get:
+            mock_get.return_value.status_code = 200
+            mock_get.return_value.json.return_value = {'ret': 1001, 'msg': '系统繁忙'}
+            fetch_album_tracks(1, 1, 20, resolve_urls=False)
+        assert limiter.rate < rate
+
+
+class TestXmSigner:
+    def _server_time_response(self, offset_ms=0):
+        import time
+        from unittest.mock import MagicMock
+        response = MagicMock()
+        response.text = str(round(time.time() * 1000) + offset_ms)
+        return response
+
+    def test_server_time_fetched_once(self):
+        from utils.ximalaya_xmsign import XmSigner
+        signer = XmSigner(server_time_url='http://example.invalid/time', ttl=600)
+        with patch('utils.http_client.get', return_value=self._server_time_response(60000)) as mock_get:
+            signs = [signer.sign() for _ in range(20)]
+        assert mock_get.call_count == 1
+        assert abs(signer.offset() - 60000) < 1000
+        # 签名中间部分为服务器时间，末尾为本机时间
+        server_time = int(signs[0].split(')')[1].split('(')[0])
+        local_time = int(signs[0].split(')')[-1])
+        assert abs(server_time - local_time - 60000) < 1000
+
+    def test_refresh_on_ttl_and_invalidate(self):
+        from utils.ximalaya_xmsign import XmSigner
+        signer = XmSigner(server_time_url='http://example.invalid/time', ttl=0)
+        with patch('utils.http_client.get', return_value=self._server_time_response()) as mock_get:
+            signer.sign()
+            signer.sign()
+            assert mock_get.call_count == 2
+            signer.ttl = 600
+            signer.invalidate()
+            signer.sign()
+            signer.sign()
+            assert mock_get.call_count == 3
+
+    def test_thread_safe_single_sync(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from utils.ximalaya_xmsign import XmSigner
+        signer = XmSigner(server_time_url='http://example.invalid/time')
+        with patch('utils.http_client.get', return_value=self._server_time_response()) as mock_get:
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                list(pool.map(lambda _: signer.sign(), range(50)))
+        assert mock_get.call_count == 1
+
+    def test_local_clock_mode_makes_no_request(self):
+        from utils.ximalaya_xmsign import XmSigner
+        signer = XmSigner(use_server_time=False)
+        with patch('utils.http_client.get') as mock_get:
+            headers = signer.sign_headers({})
+        mock_get.assert_not_called()
+        assert len(headers['xm-sign'].split('(')[0]) == 32
+
+    def test_signed_get_resyncs_when_sign_rejected(self):
+        from unittest.mock import MagicMock
+        from utils.ximalaya_xmsign import XmSigner, signed_get
+        signer = XmSigner(server_time_url='http://example.invalid/time', ttl=600)
+        rejected, accepted = MagicMock(status_code=200), MagicMock(status_code=200)
+        rejected.json.return_value = {'ret': 500, 'msg': 'sign error'}
+        accepted.json.return_value = {'ret': 200, 'data': {}}
+        api_responses = iter([rejected, accepted])
+
+        def fake_get(url, family, headers=None, **kwargs):
+            return self._server_time_response() if family == 'sign' else next(api_responses)
+
+        with patch('utils.http_client.get', side_effect=fake_get) as mock_get:
+            assert signed_get('http://example.invalid/api', 'listing', signer=signer) is accepted
+        families = [c.args[1] for c in mock_get.call_args_list]
+        assert families == ['sign', 'listing', 'sign', 'listing']
+        assert signer.sync_count == 2
+
+
+def _encrypt_url(plain, pad=None):
+    import base64
+    from Crypto.Cipher import AES
+    from utils.utils import key
+    data = plain.encode('utf-8')
+    pad_len = 16 - len(data) % 16
+    padding = pad if pad is not None else bytes([pad_len]) * pad_len
+    ciphertext = AES.new(key, AES.MODE_ECB).encrypt(data + padding)
+    return base64.urlsafe_b64encode(ciphertext).decode().rstrip('=')
+
+
+class TestDecryptor:
+    def test_decrypt_url_roundtrip(self):
+        from utils.utils import decrypt_url
+        url = 'https://aod.cos.tx.xmcdn.com/storages/abcd/test.m4a'
+        assert decrypt_url(_encrypt_url(url)) == url
+        assert decrypt_url('') == ''
+
+    def test_decrypt_many_matches_single(self):
+        from utils.utils import decrypt_many, decrypt_url
+        urls = [f'https://audio.xmcdn.com/track/{i}.m4a?sign={"x" * (i % 17)}' for i in range(50)]
+        ciphertexts = [_encrypt_url(u) for u in urls]
+        assert decrypt_many(ciphertexts) == urls
+        assert [decrypt_url(c) for c in ciphertexts] == urls
+
+    def test_invalid_input_isolated(self):
+        from utils.utils import Decryptor, decrypt_many
+        good = _encrypt_url('https://audio.xmcdn.com/a.m4a')
+        bad_padding = _encrypt_url('0123456789abcdef', pad=b'\x00' * 16)
+        results = decrypt_many([good, '', 'not-base64!!', 'QUJD', bad_padding, good])
+        assert results == ['https://audio.xmcdn.com/a.m4a', '', '', '', '', 'https://audio.xmcdn.com/a.m4a']
+        with pytest.raises(ValueError):
+            Decryptor().decrypt(bad_padding)
+
+
+class TestUrlCache:
+    def test_url_expiry_from_signed_params(self):
+        from utils.url_cache import url_expiry
+        now = 1_700_000_000
+        assert url_expiry(f'http://cdn/a.m4a?sign=x&expires={now + 600}', now=now) == now + 600
+        # 毫秒时间戳
+        assert url_expiry(f'http://cdn/a.m4a?timestamp={(now + 600) * 1000}', now=now) == now + 600
+        # 过去的时间视为签发时间
+        assert url_expiry(f'http://cdn/a.m4a?t={now - 100}', default_ttl=3600, now=now) == now + 3500
+        assert url_expiry('http://cdn/a.m4a?duration=300', default_ttl=3600, now=now) == now + 3600
+
+    def test_lru_and_expiry(self):
+        import time
+        from utils.url_cache import UrlCache
+        cache = UrlCache(max_entries=2, margin=0)
+        cache.put(1, 10, 'http://cdn/1.m4a')
+        cache.put(2, 10, 'http://cdn/2.m4a')
+        assert cache.get(1, 10) == 'http://cdn/1.m4a'
+        cache.put(3, 10, 'http://cdn/3.m4a')  # 淘汰最久未使用的 2
+        assert cache.get(2, 10) is None
+        assert cache.get(1, 10) == 'http://cdn/1.m4a'
+        assert cache.get(1, 11) is None  # 不同专辑是不同的键
+        cache.put(4, 10, 'http://cdn/4.m4a', expires_at=time.time() - 1)
+        assert cache.get(4, 10) is None
+        cache.invalidate(1, 10)
+        assert cache.get(1, 10) is None
+
+    def test_disk_tier_survives_restart(self, tmp_path):
+        from utils.url_cache import UrlCache
+        path = str(tmp_path / 'urls.db')
+        cache = UrlCache(path)
+        cache.put(1, 10, 'http://cdn/1.m4a')
+        cache.put(2, 10, 'http://cdn/2.m4a')
+        cache.invalidate(2, 10)
+        cache.close()
+        reopened = UrlCache(path)
+        assert reopened.get(1, 10) == 'http://cdn/1.m4a'
+        assert reopened.get(2, 10) is None
+        reopened.close()
+
+    def test_default_path_uses_cache_dir_and_falls_back_to_memory(self, tmp_path, monkeypatch):
+        from utils.url_cache import get_url_cache, set_url_cache
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.delenv('XIMALAYA_URL_CACHE', raising=False)
+        monkeypatch.setenv('XIMALAYA_CACHE_DIR', str(tmp_path / 'cache'))
+        set_url_cache(None)
+        assert get_url_cache().path == str(tmp_path / 'cache' / 'url_cache.db')
+        assert not (tmp_path / 'downloads').exists()
+        # 缓存目录不可创建时退回纯内存缓存
+        (tmp_path / 'blocked').write_text('')
+        monkeypatch.setenv('XIMALAYA_CACHE_DIR', str(tmp_path / 'blocked'))
+        set_url_cache(None)
+        cache = get_url_cache()
+        assert cache.path is None
+        cache.put(1, 10, 'http://cdn/1.m4a')
+        assert cache.get(1, 10) == 'http://cdn/1.m4a'
+
+
+class _FakeImageResponse:
+    def __init__(self, content, status_code=200):
+        self.content = content
+        self.status_code = status_code
+
+
+class TestImageCache:
+    def test_concurrent_requests_download_once(self, tmp_path):
+        import time
+        from utils.image_cache import ImageCache
+        cache = ImageCache(str(tmp_path / "images"))
+        calls = []
+
+        def slow_get(url, family):
+            calls.append(url)
+            time.sleep(0.05)
+            return _FakeImageResponse(b"jpeg-bytes")
+
+        with patch("utils.image_cache.http_client.get", side_effect=slow_get):
+            threads = [threading.Thread(target=cache.fetch, args=("http://img/a.jpg",)) for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            cache.save_to("http://img/a.jpg", str(tmp_path / "cover.jpg"))
+            # 内容相同的另一个地址只多一次请求，不多存一份
+            cache.fetch("http://img/a.jpg?v=2")
+        assert calls == ["http://img/a.jpg", "http://img/a.jpg?v=2"]
+        assert (tmp_path / "cover.jpg").read_bytes() == b"jpeg-bytes"
+        assert len(list((tmp_path / "images" / "objects").rglob("*"))) == 2  # 一个子目录 + 一个文件
+
+        reopened = ImageCache(str(tmp_path / "images"))
+        with patch("utils.image_cache.http_client.get") as mock_get:
+            assert reopened.get_bytes("http://img/a.jpg") == b"jpeg-bytes"
+        mock_get.assert_not_called()
+
+    def test_default_root_uses_cache_dir_and_falls_back_to_memory(self, tmp_path, monkeypatch):
+        from utils.image_cache import get_image_cache, set_image_cache
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.delenv('XIMALAYA_IMAGE_CACHE', raising=False)
+        monkeypatch.setenv('XIMALAYA_CACHE_DIR', str(tmp_path / 'cache'))
+        set_image_cache(None)
+        assert get_image_cache().root == str(tmp_path / 'cache' / 'image_cache')
+        assert not (tmp_path / 'downloads').exists()
+        (tmp_path / 'blocked').write_text('')
+        monkeypatch.setenv('XIMALAYA_CACHE_DIR', str(tmp_path / 'blocked'))
+        set_image_cache(None)
+        assert get_image_cache().root is None
+
+    def test_failed_download_is_not_cached(self):
+        from utils.image_cache import ImageCache
+        cache = ImageCache()
+        with patch("utils.image_cache.http_client.get", return_value=_FakeImageResponse(b"", 404)):
+            with pytest.raises(IOError):
+                cache.fetch("http://img/missing.jpg")
+        assert cache.lookup("http://img/missing.jpg") is None
+
+    def test_thumbnail_decoded_once_in_draft_mode(self):
+        Image = pytest.importorskip("PIL.Image")
+        from io import BytesIO
+        from utils.image_cache import ImageCache
+        buf = BytesIO()
+        Image.new("RGB", (1600, 1200), (200, 30, 30)).save(buf, "JPEG")
+        cache = ImageCache()
+        with patch("utils.image_cache.http_client.get", return_value=_FakeImageResponse(buf.getvalue())):
+            first = cache.thumbnail_async("http://img/big.jpg", (150, 150)).result()
+            second = cache.thumbnail("http://img/big.jpg", (150, 150))
+        assert first is second and first.size == (150, 112)
+        assert cache.stats()["decodes"] == 1 and cache.stats()["downloads"] == 1
+        cache.close()
+
+
+class _MetadataHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    requests_seen = []
+    body = b'{"ret": 200, "data": {"albumPageMainInfo": {"albumTitle": "A"}}}'
+
+    def do_GET(self):
+        type(self).requests_seen.append(dict(self.headers))
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.send_header("ETag", '"v1"')
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def metadata_server():
+    _MetadataHandler.requests_seen = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _MetadataHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+class TestMetadataCache:
+    def test_ttl_hit_and_conditional_revalidation(self, metadata_server, tmp_path):
+        from utils.metadata_cache import MetadataCache
+        cache = MetadataCache(str(tmp_path / "meta.db"))
+        url = f"{metadata_server}/album"
+        first = cache.get(url, "album", params={"albumId": 1})
+        assert first.status_code == 200
+        # 有效期内不发请求
+        second = cache.get(url, "album", params={"albumId": 1})
+        assert second.from_cache and second.json()["data"]["albumPageMainInfo"]["albumTitle"] == "A"
+        assert len(_MetadataHandler.requests_seen) == 1
+        # ttl=0 时发条件请求，304 时返回本地副本
+        third = cache.get(url, "album", params={"albumId": 1}, ttl=0)
+        assert third.from_cache and third.json() == second.json()
+        assert _MetadataHandler.requests_seen[-1]["If-None-Match"] == '"v1"'
+        assert cache.stats() == {"entries": 1, "hits": 1, "revalidated": 1, "misses": 1}
+        cache.close()
+        # 重启后磁盘上的缓存仍可用
+        reopened = MetadataCache(str(tmp_path / "meta.db"))
+        assert reopened.get(url, "album", params={"albumId": 1}).from_cache
+        assert len(_MetadataHandler.requests_seen) == 2
+        reopened.close()
+
+    def test_uncacheable_response_not_stored(self, metadata_server):
+        from utils.metadata_cache import MetadataCache
+        cache = MetadataCache()
+        url = f"{metadata_server}/album"
+        cache.get(url, "album", cacheable=lambda response: False)
+        cache.get(url, "album", cacheable=lambda response: False)
+        assert len(_MetadataHandler.requests_seen) == 2
+        assert "If-None-Match" not in _MetadataHandler.requests_seen[-1]
+
+    def test_default_path_uses_cache_dir_and_falls_back_to_memory(self, tmp_path, monkeypatch):
+        from utils.metadata_cache import get_metadata_cache, set_metadata_cache
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.delenv('XIMALAYA_METADATA_CACHE', raising=False)
+        monkeypatch.setenv('XIMALAYA_CACHE_DIR', str(tmp_path / 'cache'))
+        set_metadata_cache(None)
+        assert get_metadata_cache().path == str(tmp_path / 'cache' / 'metadata_cache.db')
+        assert not (tmp_path / 'downloads').exists()
+        (tmp_path / 'blocked').write_text('')
+        monkeypatch.setenv('XIMALAYA_CACHE_DIR', str(tmp_path / 'blocked'))
+        set_metadata_cache(None)
+        assert get_metadata_cache().path is None
+
+    def test_memory_tier_is_bounded_lru(self, metadata_server, tmp_path):
+        from utils.metadata_cache import MetadataCache
+        cache = MetadataCache(str(tmp_path / "meta.db"), max_entries=2)
+        for page in (1, 2, 3):
+            cache.get(f"{metadata_server}/album", "album", params={"page": page}, ttl=60)
+        assert cache.stats()["entries"] == 2
+        # 被挤出内存的条目从 SQLite 读回，不再请求
+        cache.get(f"{metadata_server}/album", "album", params={"page": 1}, ttl=60)
+        assert len(_MetadataHandler.requests_seen) == 3 and cache.stats()["hits"] == 1
+        assert cache.stats()["entries"] == 2
+        cache.close()
+
+
+@pytest.mark.parametrize("module", ["main", "cli", "fetcher.track_fetcher", "fetcher.history_fetch"])
+def test_entry_points_import_without_heavy_dependencies(module):
+    from benchmarks.import_bench import heavy_imports
+    assert heavy_imports(module) == []
+
+
+def test_get_env_loads_dotenv_once(monkeypatch):
+    from utils import config
+    monkeypatch.setattr(config, "_loaded", False)
+    with patch("dotenv.load_dotenv") as load_dotenv:
+        monkeypatch.setenv("XIMALAYA_TEST_VALUE", "1")
+        assert config.get_env("XIMALAYA_TEST_VALUE") == "1"
+        assert config.get_env("XIMALAYA_MISSING_VALUE", "x") == "x"
+    load_dotenv.assert_called_once()
+
+
+class TestMetrics:
+    def test_timed_histogram_and_summary_since_snapshot(self):
+        from utils.metrics import Metrics
+        metrics = Metrics()
+
+        @metrics.timed("listing")
+        def fetch(fail=False):
+            if fail:
+                raise ValueError("boom")
+            return 1
+
+        metrics.observe("listing", 0.2)
+        since = metrics.snapshot()
+        assert fetch() == 1
+        with pytest.raises(ValueError):
+            fetch(fail=True)
+        metrics.inc("bytes", 100, stage="download")
+        summary = metrics.summary(since)
+        assert summary["stages"]["listing"]["count"] == 2
+        assert summary["stages"]["listing"]["p95"] == 0.001
+        assert summary["counters"] == {"bytes{stage=download}": 100}
+
+    def test_render_prometheus(self, tmp_path):
+        from utils.metrics import Metrics
+        metrics = Metrics(buckets=(0.1, 1.0))
+        metrics.observe("download", 0.5)
+        metrics.observe("download", 2.0)
+        metrics.inc("retries", stage="baseinfo")
+        text = metrics.render_prometheus()
+        assert 'ximalaya_stage_seconds_bucket{stage="download",le="0.1"} 0' in text
+        assert 'ximalaya_stage_seconds_bucket{stage="download",le="1.0"} 1' in text
+        assert 'ximalaya_stage_seconds_bucket{stage="download",le="+Inf"} 2' in text
+        assert 'ximalaya_stage_seconds_count{stage="download"} 2' in text
+        assert 'ximalaya_retries_total{stage="baseinfo"} 1' in text
+        path = tmp_path / "metrics.prom"
+        metrics.write_prometheus(str(path))
+        assert path.read_text(encoding="utf-8") == metrics.render_prometheus()
+
+    def test_risk_control_hits_counted(self):
+        from utils.metrics import registry
+        since = registry.snapshot()
+        AdaptiveRateLimiter("baseinfo", rate=10, cooldown=0).on_blocked()
+        assert registry.summary(since)["counters"]["risk_control{limiter=baseinfo}"] == 1
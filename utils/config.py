@@ -0,0 +1,40 @@
+import os
+import threading
+
+_loaded = False
+_lock = threading.Lock()
+
+
+def load_env():
+    """首次调用时加载一次 .env（不覆盖已存在的环境变量），之后直接返回；导入本模块本身不读取任何配置"""
+    global _loaded
+    if _loaded:
+        return
+    with _lock:
+        if not _loaded:
+            from dotenv import load_dotenv
+            load_dotenv()
+            _loaded = True
+
+
+def get_env(name, default=None):
+    """读取配置项：先惰性加载 .env，再读环境变量"""
+    load_env()
+    return os.getenv(name, default)
+
+def cache_path(name):
+    """
+    缓存文件的默认位置：XIMALAYA_CACHE_DIR 指定的目录，否则为用户缓存目录下的 ximalaya-downloader
+    （Windows 为 %LOCALAPPDATA%，其他系统为 $XDG_CACHE_HOME 或 ~/.cache），与当前工作目录无关
+    """
+    root = get_env('XIMALAYA_CACHE_DIR')
+    if not root:
+        if os.name == 'nt':
+            base = os.getenv('LOCALAPPDATA') or os.path.expanduser('~')
+        else:
+            base = os.getenv('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        root = os.path.join(base, 'ximalaya-downloader')
+    return os.path.join(root, name)
+
+# 如需在其他模块读取配置，请使用：
+# from utils.config import get_env, cache_path
@@ -0,0 +1,234 @@
+import threading
+from utils.config import get_env
+from utils.rate_limiter import get_limiter
+
+DEFAULT_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36"
+
+# 所有请求共用的基础请求头
+BASE_HEADERS = {
+    "User-Agent": DEFAULT_USER_AGENT,
+    "Accept-Language": "zh-CN,zh;q=0.9",
+    "Connection": "keep-alive",
+}
+
+_CHROME_CLIENT_HINTS = {
+    "sec-ch-ua": '"Google Chrome";v="131", "Chromium";v="131", "Not_A Brand";v="24"',
+    "sec-ch-ua-mobile": "?0",
+    "sec-ch-ua-platform": '"Windows"',
+}
+
+# 各类接口的请求头、超时(连接, 读取)、是否携带Cookie、是否校验证书、使用哪个全局限速器、
+# 元数据缓存的有效期（秒，见 utils.metadata_cache）
+ENDPOINTS = {
+    # 专辑信息 fetch_album
+    "album": {
+        "limiter": "listing",
+        "cache_ttl": 600,
+        "timeout": (5, 15),
+        "cookie": True,
+        "headers": {
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
+            "Accept-Language": "en-US,en;q=0.9",
+            "Cache-Control": "max-age=0",
+            "Sec-Fetch-Dest": "document",
+            "Sec-Fetch-Mode": "navigate",
+            "Sec-Fetch-Site": "none",
+            "Sec-Fetch-User": "?1",
+            "Upgrade-Insecure-Requests": "1",
+            **_CHROME_CLIENT_HINTS,
+        },
+    },
+    # 专辑曲目分页 fetch_album_tracks
+    "listing": {
+        "limiter": "listing",
+        "cache_ttl": 300,
+        "timeout": (5, 15),
+        "cookie": True,
+        "headers": {
+            "Accept": "application/json, text/javascript, */*; q=0.01",
+            "Cache-Control": "no-cache",
+            "Pragma": "no-cache",
+            "Origin": "https://www.ximalaya.com",
+            "X-Requested-With": "XMLHttpRequest",
+            **_CHROME_CLIENT_HINTS,
+        },
+    },
+    # 播放地址 fetch_track_crypted_url
+    "baseinfo": {
+        "limiter": "baseinfo",
+        "timeout": (5, 10),
+        "cookie": True,
+        "headers": {
+            "Accept": "application/json",
+        },
+    },
+    # 单曲信息 fetch_track_info
+    "track_info": {
+        "limiter": "listing",
+        "cache_ttl": 3600,
+        "timeout": (5, 15),
+        "cookie": True,
+        "headers": {
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36 Edg/137.0.0.0",
+            "Accept": "*/*",
+            "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8,en-GB;q=0.7,en-US;q=0.6",
+            "Content-Type": "application/x-www-form-urlencoded;charset=UTF-8",
+            "x-kl-kfa-ajax-request": "Ajax_Request",
+        },
+    },
+    # 收听历史
+    "history": {
+        "timeout": (5, 15),
+        "cookie": True,
+        "headers": {
+            "Accept": "*/*",
+            "Content-Type": "application/x-www-form-urlencoded;charset=UTF-8",
+            "Referer": "https://www.ximalaya.com/my/listened",
+            "Sec-Fetch-Dest": "empty",
+            "Sec-Fetch-Mode": "cors",
+            "Sec-Fetch-Site": "same-origin",
+        },
+    },
+    # xm-sign 使用的服务器时间
+    "sign": {
+        "timeout": (5, 5),
+        "verify": False,
+        "headers": {},
+    },
+    # 音频 CDN
+    "cdn": {
+        "limiter": "cdn",
+        "timeout": (10, 20),
+        "verify": False,
+        "headers": {
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
+            "Referer": "https://www.ximalaya.com/",
+            "Accept": "audio/webm,audio/ogg,audio/wav,audio/*;q=0.9,application/ogg;q=0.7,video/*;q=0.6,*/*;q=0.5",
+            "Accept-Language": "zh-CN,zh;q=0.9,en-US;q=0.8,en;q=0.7",
+            # 音频本身已压缩，使用原始字节才能按 Range 续传并按 Content-Length 校验
+            "Accept-Encoding": "identity",
+            "Sec-Fetch-Dest": "audio",
+            "Sec-Fetch-Mode": "no-cors",
+            "Sec-Fetch-Site": "cross-site",
+            "Pragma": "no-cache",
+            "Cache-Control": "no-cache",
+        },
+    },
+    # 专辑封面等图片
+    "image": {
+        "timeout": (5, 10),
+        "headers": {
+            "Referer": "https://www.ximalaya.com/",
+        },
+    },
+}
+
+
+class HttpClient:
+    """
+    全局共享的HTTP客户端：一个 requests.Session，按主机维护 keep-alive 连接池，
+    按接口类别合并请求头和超时，并统计连接复用情况
+    """
+    def __init__(self, pool_connections=32, pool_maxsize=32):
+        # requests 较重，只在第一次真正发请求时导入
+        import requests
+        import urllib3
+        from requests.adapters import HTTPAdapter
+        # 忽略 InsecureRequestWarning（CDN 与 server time 接口关闭了证书校验）
+        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+        self.session = requests.Session()
+        self._adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", self._adapter)
+        self.session.mount("http://", self._adapter)
+        self._lock = threading.Lock()
+        self._requests_by_family = {}
+
+    def build_headers(self, family, headers=None):
+        """按 基础请求头 -> 接口类别请求头 -> Cookie -> 调用方请求头 的顺序合并"""
+        endpoint = ENDPOINTS.get(family, {})
+        merged = dict(BASE_HEADERS)
+        merged.update(endpoint.get("headers", {}))
+        if endpoint.get("cookie"):
+            merged["Cookie"] = get_env("XIMALAYA_COOKIES", "")
+        if headers:
+            merged.update(headers)
+        return merged
+
+    def get(self, url, family="api", headers=None, **kwargs):
+        endpoint = ENDPOINTS.get(family, {})
+        kwargs.setdefault("timeout", endpoint.get("timeout", (5, 15)))
+        if "verify" in endpoint:
+            kwargs.setdefault("verify", endpoint["verify"])
+        limiter = get_limiter(endpoint["limiter"]) if endpoint.get("limiter") else None
+        if limiter:
+            limiter.acquire()
+        with self._lock:
+            self._requests_by_family[family] = self._requests_by_family.get(family, 0) + 1
+        response = self.session.get(url, headers=self.build_headers(family, headers), **kwargs)
+        if limiter:
+            # HTTP 层面的限流信号；接口返回体里的风控（ret 1001）由各抓取器反馈
+            status = getattr(response, "status_code", None)
+            if status in (429, 503):
+                limiter.on_blocked()
+            elif isinstance(status, int) and status < 400:
+                limiter.on_success()
+        return response
+
+    def stats(self):
+        """
+        连接池统计：requests 为实际发出的请求数，connections 为新建的TCP连接数，
+        reused = requests - connections 即复用已有连接的次数
+        """
+        hosts = {}
+        poolmanager = self._adapter.poolmanager
+        for key in list(poolmanager.pools.keys()):
+            pool = poolmanager.pools.get(key)
+            if pool is None:
+                continue
+            host = f"{pool.scheme}://{pool.host}:{pool.port}"
+            hosts[host] = {
+                "requests": pool.num_requests,
+                "connections": pool.num_connections,
+                "reused": max(pool.num_requests - pool.num_connections, 0),
+            }
+        total_requests = sum(h["requests"] for h in hosts.values())
+        total_connections = sum(h["connections"] for h in hosts.values())
+        with self._lock:
+            by_family = dict(self._requests_by_family)
+        return {
+            "requests": total_requests,
+            "connections": total_connections,
+            "reused": max(total_requests - total_connections, 0),
+            "reuse_ratio": (total_requests - total_connections) / total_requests if total_requests else 0.0,
+            "hosts": hosts,
+            "by_family": by_family,
+        }
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """获取进程内共享的 HttpClient（惰性创建）"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = HttpClient()
+    return _client
+
+
+def get(url, family="api", headers=None, **kwargs):
+    return get_client().get(url, family=family, headers=headers, **kwargs)
+
+
+def pool_stats():
+    return get_client().stats()
+
+# 如需在其他模块发起请求，请使用：
+# from utils import http_client
+# http_client.get(url, "listing", params=params)
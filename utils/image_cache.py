@@ -0,0 +1,262 @@
+import hashlib
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+from utils import http_client
+from utils.config import get_env, cache_path
+
+# 封面图片缓存：原图按内容 SHA-256 存放（objects/ab/abcd....），封面地址到内容摘要的映射存放在 urls/ 下，
+# 同一张图即使地址不同也只存一份；缩略图按 (摘要, 尺寸) 缓存在内存 LRU 和 thumbs/ 下。
+# 界面预览与下载器保存 cover.jpg 共用同一个缓存，每个封面最多下载一次、解码一次。
+# 本模块只在生成缩略图时才导入 PIL，下载器保存原图不依赖 PIL
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class ImageCache:
+    """
+    以封面地址为键的图片缓存，线程安全：同一地址的并发请求只发起一次下载，其余调用等待同一结果。
+    root 为 None 时只缓存在内存中。thumbnail_async 在后台线程中生成缩略图，JPEG 使用 draft 模式按目标尺寸解码，
+    不必先解码整张大图
+    """
+    def __init__(self, root=None, max_thumbnails=256, max_memory_images=64, workers=2):
+        self.root = root
+        self.max_thumbnails = max_thumbnails
+        self.max_memory_images = max_memory_images
+        self._lock = threading.Lock()
+        self._urls = {}                   # 封面地址 -> 内容摘要
+        self._blobs = OrderedDict()       # 内容摘要 -> 原图字节（只在内存模式或刚下载时保留）
+        self._thumbs = OrderedDict()      # (摘要, 宽, 高) -> PIL 图片
+        self._inflight = {}               # 正在下载/生成的键 -> Future
+        self._executor = None
+        self.workers = workers
+        self.downloads = 0
+        self.decodes = 0
+        self.hits = 0
+        if root:
+            for sub in ('objects', 'urls', 'thumbs'):
+                os.makedirs(os.path.join(root, sub), exist_ok=True)
+
+    # ---- 路径 ----
+    @staticmethod
+    def url_key(url):
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def _object_path(self, digest):
+        return os.path.join(self.root, 'objects', digest[:2], digest)
+
+    def _url_path(self, url):
+        return os.path.join(self.root, 'urls', self.url_key(url))
+
+    def _thumb_path(self, digest, size):
+        return os.path.join(self.root, 'thumbs', f'{digest}-{size[0]}x{size[1]}.png')
+
+    @staticmethod
+    def _write_atomic(path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    # ---- 单次执行 ----
+    def _once(self, key, func):
+        """同一 key 同时只执行一次 func，并发调用者共享结果（或异常）"""
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            return future.result()
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    # ---- 原图 ----
+    def lookup(self, url):
+        """已缓存时返回内容摘要，否则返回 None（不发请求）"""
+        with self._lock:
+            digest = self._urls.get(url)
+            if digest is not None and not self.root and digest not in self._blobs:
+                return None  # 纯内存模式下原图已被挤出
+        if digest is None and self.root:
+            try:
+                with open(self._url_path(url), encoding='utf-8') as f:
+                    digest = f.read().strip() or None
+            except OSError:
+                return None
+            if digest and not os.path.exists(self._object_path(digest)):
+                return None
+            if digest:
+                with self._lock:
+                    self._urls[url] = digest
+        return digest
+
+    def _remember(self, digest, data):
+        with self._lock:
+            self._blobs[digest] = data
+            self._blobs.move_to_end(digest)
+            while len(self._blobs) > self.max_memory_images:
+                self._blobs.popitem(last=False)
+
+    def _fetch(self, url):
+        digest = self.lookup(url)
+        if digest is not None:
+            self.hits += 1
+            return digest
+        response = http_client.get(url, 'image')
+        if response.status_code != 200:
+            raise IOError(f'封面下载失败，状态码: {response.status_code}')
+        data = response.content
+        self.downloads += 1
+        digest = _digest(data)
+        if self.root:
+            if not os.path.exists(self._object_path(digest)):
+                self._write_atomic(self._object_path(digest), data)
+            self._write_atomic(self._url_path(url), digest.encode('ascii'))
+        self._remember(digest, data)
+        with self._lock:
+            self._urls[url] = digest
+        return digest
+
+    def fetch(self, url):
+        """确保封面已缓存并返回内容摘要；失败时抛出异常"""
+        return self._once(('fetch', url), lambda: self._fetch(url))
+
+    def get_bytes(self, url):
+        digest = self.fetch(url)
+        with self._lock:
+            data = self._blobs.get(digest)
+            if data is not None:
+                self._blobs.move_to_end(digest)
+                return data
+        with open(self._object_path(digest), 'rb') as f:
+            data = f.read()
+        self._remember(digest, data)
+        return data
+
+    def save_to(self, url, dest):
+        """把封面原图保存到 dest（已缓存时直接复制，不再请求）"""
+        digest = self.fetch(url)
+        if self.root:
+            tmp_path = dest + '.tmp'
+            shutil.copyfile(self._object_path(digest), tmp_path)
+            os.replace(tmp_path, dest)
+        else:
+            self._write_atomic(dest, self.get_bytes(url))
+        return dest
+
+    # ---- 缩略图 ----
+    def _decode_thumbnail(self, data, size):
+        from PIL import Image
+        img = Image.open(BytesIO(data))
+        if img.format == 'JPEG':
+            # draft 让解码器直接按 1/2、1/4、1/8 缩小解码，大封面不必完整解码
+            img.draft('RGB', size)
+        img = img.convert('RGBA')
+        img.thumbnail(size, Image.LANCZOS)
+        self.decodes += 1
+        return img
+
+    def _thumbnail(self, url, size):
+        digest = self.fetch(url)
+        key = (digest, size[0], size[1])
+        with self._lock:
+            img = self._thumbs.get(key)
+            if img is not None:
+                self._thumbs.move_to_end(key)
+                return img
+        img = None
+        if self.root and os.path.exists(self._thumb_path(digest, size)):
+            from PIL import Image
+            with Image.open(self._thumb_path(digest, size)) as f:
+                img = f.convert('RGBA')
+        if img is None:
+            img = self._decode_thumbnail(self.get_bytes(url), size)
+            if self.root:
+                buf = BytesIO()
+                img.save(buf, 'PNG')
+                self._write_atomic(self._thumb_path(digest, size), buf.getvalue())
+        with self._lock:
+            self._thumbs[key] = img
+            while len(self._thumbs) > self.max_thumbnails:
+                self._thumbs.popitem(last=False)
+        return img
+
+    def thumbnail(self, url, size=(150, 150)):
+        """返回保持比例、不超过 size 的 RGBA 缩略图（PIL 图片），同一封面同一尺寸只解码一次"""
+        size = tuple(size)
+        return self._once(('thumb', url, size), lambda: self._thumbnail(url, size))
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='image-cache')
+            return self._executor
+
+    def thumbnail_async(self, url, size=(150, 150)):
+        """在后台线程中生成缩略图，返回 Future"""
+        return self._get_executor().submit(self.thumbnail, url, size)
+
+    def prefetch(self, url):
+        """在后台下载原图（例如浏览专辑列表时提前缓存封面），返回 Future"""
+        return self._get_executor().submit(self.fetch, url)
+
+    def stats(self):
+        with self._lock:
+            return {'urls': len(self._urls), 'thumbnails': len(self._thumbs),
+                    'downloads': self.downloads, 'decodes': self.decodes, 'hits': self.hits}
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_image_cache():
+    """
+    全局共享的封面缓存，默认位于用户缓存目录（见 utils.config.cache_path），
+    目录可通过 XIMALAYA_IMAGE_CACHE 配置，设为空字符串则只用内存
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                root = get_env('XIMALAYA_IMAGE_CACHE', cache_path('image_cache'))
+                try:
+                    _cache = ImageCache(root or None)
+                except OSError:
+                    # 缓存目录不可创建时只缓存在内存中
+                    _cache = ImageCache()
+    return _cache
+
+
+def set_image_cache(cache):
+    """替换全局缓存（例如测试中使用纯内存缓存）"""
+    global _cache
+    with _cache_lock:
+        if _cache is not None and _cache is not cache:
+            _cache.close()
+        _cache = cache
+
+# 如需在其他模块使用封面缓存，请使用：
+# from utils.image_cache import get_image_cache
@@ -0,0 +1,213 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+from utils import http_client
+from utils.config import get_env, cache_path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    status INTEGER NOT NULL,
+    content BLOB NOT NULL,
+    headers TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at REAL NOT NULL
+);
+"""
+
+
+class CachedResponse:
+    """从缓存返回的响应，提供抓取器用到的 requests.Response 接口"""
+    from_cache = True
+
+    def __init__(self, status_code, content, headers=None, url=''):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        self.url = url
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        pass
+
+
+class MetadataCache:
+    """
+    元数据接口（专辑信息、曲目分页、单曲信息）的 HTTP 缓存：
+    有效期内直接返回本地副本；过期后带 If-None-Match / If-Modified-Since 发条件请求，
+    304 时续期并返回本地副本；只缓存 200 响应。内存中只保留最近使用的 max_entries 条（LRU），
+    其余留在 SQLite 中按需读回；path 为 None 时只缓存在内存中
+    """
+    def __init__(self, path=None, default_ttl=300, max_entries=512):
+        self.path = path
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._conn = None
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            with self._conn:
+                self._conn.execute('PRAGMA journal_mode=WAL')
+                self._conn.executescript(SCHEMA)
+
+    @staticmethod
+    def make_key(family, url, params=None):
+        if params:
+            url = f"{url}{'&' if '?' in url else '?'}{urlencode(sorted(params.items()))}"
+        return f"{family} {url}"
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _load(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+            elif self._conn is not None:
+                row = self._conn.execute(
+                    'SELECT status, content, headers, etag, last_modified, fetched_at FROM responses WHERE key = ?',
+                    (key,)).fetchone()
+                if row:
+                    entry = {'status': row[0], 'content': bytes(row[1]), 'headers': json.loads(row[2] or '{}'),
+                             'etag': row[3], 'last_modified': row[4], 'fetched_at': row[5]}
+                    self._remember(key, entry)
+            return entry
+
+    def _store(self, key, entry):
+        with self._lock:
+            self._remember(key, entry)
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute(
+                        'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)',
+                        (key, entry['status'], entry['content'], json.dumps(entry['headers']),
+                         entry['etag'], entry['last_modified'], entry['fetched_at']))
+
+    def _touch(self, key, entry):
+        with self._lock:
+            entry['fetched_at'] = time.time()
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute('UPDATE responses SET fetched_at = ? WHERE key = ?', (entry['fetched_at'], key))
+
+    def invalidate(self, family, url, params=None):
+        key = self.make_key(family, url, params)
+        with self._lock:
+            self._memory.pop(key, None)
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+
+    @staticmethod
+    def _header(response, name):
+        value = response.headers.get(name) if hasattr(response, 'headers') else None
+        return value if isinstance(value, str) else None
+
+    def get(self, url, family, headers=None, params=None, ttl=None, cacheable=None, **kwargs):
+        """
+        带缓存的 GET：ttl 为 None 时使用接口类别的 cache_ttl，ttl=0 表示每次都向服务器确认（条件请求）；
+        cacheable(response) 返回 False 的响应（例如风控提示）不写入缓存
+        """
+        if ttl is None:
+            ttl = http_client.ENDPOINTS.get(family, {}).get('cache_ttl', self.default_ttl)
+        key = self.make_key(family, url, params)
+        entry = self._load(key)
+        if entry is not None and time.time() - entry['fetched_at'] < ttl:
+            self.hits += 1
+            return CachedResponse(entry['status'], entry['content'], entry['headers'], url)
+
+        request_headers = dict(headers or {})
+        if entry is not None:
+            if entry['etag']:
+                request_headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                request_headers['If-Modified-Since'] = entry['last_modified']
+        if params is not None:
+            kwargs['params'] = params
+        response = http_client.get(url, family, headers=request_headers, **kwargs)
+        if entry is not None and response.status_code == 304:
+            self.revalidated += 1
+            self._touch(key, entry)
+            return CachedResponse(entry['status'], entry['content'], entry['headers'], url)
+        self.misses += 1
+        content = getattr(response, 'content', None)
+        if response.status_code == 200 and isinstance(content, bytes) and (cacheable is None or cacheable(response)):
+            content_type = self._header(response, 'Content-Type')
+            self._store(key, {
+                'status': 200,
+                'content': content,
+                'headers': {'Content-Type': content_type} if content_type else {},
+                'etag': self._header(response, 'ETag'),
+                'last_modified': self._header(response, 'Last-Modified'),
+                'fetched_at': time.time(),
+            })
+        return response
+
+    def stats(self):
+        with self._lock:
+            entries = len(self._memory)
+        return {'entries': entries, 'hits': self.hits, 'revalidated': self.revalidated, 'misses': self.misses}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_metadata_cache():
+    """
+    全局共享的元数据缓存，默认位于用户缓存目录（见 utils.config.cache_path），
+    磁盘位置可通过 XIMALAYA_METADATA_CACHE 配置，设为空字符串则只用内存
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                path = get_env('XIMALAYA_METADATA_CACHE', cache_path('metadata_cache.db'))
+                try:
+                    _cache = MetadataCache(path or None)
+                except (OSError, sqlite3.Error):
+                    # 缓存位置不可写时只缓存在内存中，抓取照常进行
+                    _cache = MetadataCache()
+    return _cache
+
+
+def set_metadata_cache(cache):
+    """替换全局缓存（例如测试中使用纯内存缓存）"""
+    global _cache
+    with _cache_lock:
+        if _cache is not None and _cache is not cache:
+            _cache.close()
+        _cache = cache
+
+
+def cached_get(url, family, headers=None, params=None, ttl=None, cacheable=None, **kwargs):
+    return get_metadata_cache().get(url, family, headers=headers, params=params, ttl=ttl, cacheable=cacheable, **kwargs)
+
+# 如需在其他模块调用元数据缓存，请使用：
+# from utils.metadata_cache import cached_get
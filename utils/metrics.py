@@ -0,0 +1,230 @@
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# 各阶段耗时直方图的桶上限（秒）
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 阶段名：listing 曲目分页、baseinfo 播放地址、decrypt 解密、download 音频下载、progress 进度落盘
+STAGE_HELP = 'Latency of each fetch/download stage in seconds'
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """按桶估算分位数（返回所在桶的上限）"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return self.buckets[i] if i < len(self.buckets) else self.max
+        return self.max
+
+    def copy(self):
+        other = Histogram(self.buckets)
+        other.counts = list(self.counts)
+        other.count, other.sum, other.max = self.count, self.sum, self.max
+        return other
+
+
+class Metrics:
+    """
+    进程内指标：各阶段耗时直方图（stage_seconds）与计数器（字节数、重试次数、风控次数等），线程安全。
+    render_prometheus() 输出 Prometheus 文本格式，summary() 输出 JSON 摘要；
+    连接复用情况在输出时从共享 HTTP 客户端读取
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def inc(self, name, value=1, **labels):
+        """计数器加 value，例如 inc('bytes', n, stage='download')、inc('retries', stage='baseinfo')"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def timed(self, stage):
+        """装饰器：记录函数每次调用的耗时（异常退出也会记录）"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(stage, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def snapshot(self):
+        """当前指标的副本，可传给 summary(since=...) 计算一段时间内的增量"""
+        with self._lock:
+            return ({stage: h.copy() for stage, h in self._histograms.items()}, dict(self._counters))
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    @staticmethod
+    def _pool_stats():
+        from utils import http_client
+        if http_client._client is None:
+            return None
+        return http_client.pool_stats()
+
+    def summary(self, since=None):
+        """
+        JSON 摘要：{stages: {阶段: {count, total_seconds, avg, p50, p95, max}}, counters: {...}, connections: {...}}；
+        since 为 snapshot() 的返回值时只统计之后的增量（max 仍为全程最大值）
+        """
+        histograms, counters = self.snapshot()
+        base_histograms, base_counters = since or ({}, {})
+        stages = {}
+        for stage, histogram in sorted(histograms.items()):
+            base = base_histograms.get(stage)
+            if base is not None:
+                histogram.counts = [a - b for a, b in zip(histogram.counts, base.counts)]
+                histogram.count -= base.count
+                histogram.sum -= base.sum
+            if not histogram.count:
+                continue
+            stages[stage] = {
+                'count': histogram.count,
+                'total_seconds': round(histogram.sum, 6),
+                'avg': round(histogram.sum / histogram.count, 6),
+                'p50': histogram.quantile(0.5),
+                'p95': histogram.quantile(0.95),
+                'max': round(histogram.max, 6),
+            }
+        result_counters = {}
+        for (name, labels), value in sorted(counters.items()):
+            value -= base_counters.get((name, labels), 0)
+            if value:
+                label = ','.join(f'{k}={v}' for k, v in labels)
+                result_counters[f'{name}{{{label}}}' if label else name] = value
+        pool = self._pool_stats()
+        connections = {key: pool[key] for key in ('requests', 'connections', 'reused', 'reuse_ratio')} if pool else {}
+        return {'stages': stages, 'counters': result_counters, 'connections': connections}
+
+    def render_prometheus(self, prefix='ximalaya'):
+        histograms, counters = self.snapshot()
+        lines = [f'# HELP {prefix}_stage_seconds {STAGE_HELP}', f'# TYPE {prefix}_stage_seconds histogram']
+        for stage, histogram in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+        typed = set()
+        for (name, labels), value in sorted(counters.items()):
+            metric = f'{prefix}_{name}_total'
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f'# TYPE {metric} counter')
+            label = ','.join(f'{k}="{v}"' for k, v in labels)
+            lines.append(f'{metric}{{{label}}} {value}' if label else f'{metric} {value}')
+        pool = self._pool_stats()
+        if pool:
+            for host, stats in sorted(pool['hosts'].items()):
+                for key in ('requests', 'connections', 'reused'):
+                    lines.append(f'{prefix}_http_{key}{{host="{host}"}} {stats[key]}')
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """原子写入 Prometheus 文本文件（可供 node_exporter 的 textfile collector 采集）"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+
+    def write_summary(self, path, since=None, **extra):
+        data = {**extra, **self.summary(since)}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        return data
+
+    def serve(self, port, host='127.0.0.1'):
+        """在后台线程中提供 /metrics 文本接口，返回 HTTPServer（调用 shutdown() 停止）"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        owner = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = owner.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+        return server
+
+
+# 进程内共享的指标注册表
+registry = Metrics()
+
+
+def timed(stage):
+    return registry.timed(stage)
+
+
+def timer(stage):
+    return registry.timer(stage)
+
+
+def inc(name, value=1, **labels):
+    registry.inc(name, value, **labels)
+
+# 如需在其他模块记录指标，请使用：
+# from utils import metrics
+# metrics.inc('retries', stage='download')；@metrics.timed('listing')；metrics.registry.summary()
@@ -0,0 +1,144 @@
+import threading
+import time
+from utils import metrics
+
+# 各类接口的默认限速：rate 为初始每秒请求数，burst 为令牌桶容量，max_rate/min_rate 为自适应调整的上下限
+DEFAULT_LIMITS = {
+    # 专辑信息、曲目分页等元数据接口
+    "listing": {"rate": 1.0, "burst": 3, "min_rate": 0.1, "max_rate": 5.0},
+    # baseInfo 播放地址接口，最容易触发风控
+    "baseinfo": {"rate": 1.0, "burst": 3, "min_rate": 0.05, "max_rate": 4.0},
+    # 音频 CDN
+    "cdn": {"rate": 2.0, "burst": 4, "min_rate": 0.1, "max_rate": 10.0},
+}
+
+
+class AdaptiveRateLimiter:
+    """
+    线程安全的令牌桶限速器，按 AIMD 自动调整速率：
+    连续成功 success_threshold 次后速率加 increase（加性增），
+    遇到风控（ret 1001 / 系统繁忙 / HTTP 429）时速率乘以 decrease（乘性减）并暂停 cooldown 秒
+    """
+    def __init__(self, name, rate=1.0, burst=1, min_rate=0.1, max_rate=None, increase=0.1, decrease=0.5,
+                 success_threshold=10, cooldown=5.0):
+        self.name = name
+        self.rate = float(rate)
+        self.burst = max(float(burst), 1.0)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate) if max_rate else self.rate
+        self.increase = increase
+        self.decrease = decrease
+        self.success_threshold = success_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._successes = 0
+        self.blocked_count = 0
+        self.total_wait = 0.0
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """阻塞直到拿到一个令牌，返回等待的秒数"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    wait_time = self._paused_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    self.total_wait += waited
+                    return waited
+                else:
+                    wait_time = (1 - self._tokens) / self.rate
+            time.sleep(wait_time)
+            waited += wait_time
+
+    def on_success(self):
+        with self._lock:
+            self._successes += 1
+            if self._successes >= self.success_threshold:
+                self._successes = 0
+                self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_blocked(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self._successes = 0
+            self._tokens = 0
+            self._paused_until = time.monotonic() + self.cooldown
+            self.blocked_count += 1
+        metrics.inc('risk_control', limiter=self.name)
+
+    def configure(self, **kwargs):
+        """运行时调整参数（例如命令行 --rate）；显式给出 max_rate 时可以调低上限，否则上限至少为 rate"""
+        with self._lock:
+            for key, value in kwargs.items():
+                if value is not None:
+                    setattr(self, key, float(value) if key != 'success_threshold' else int(value))
+            if kwargs.get('max_rate') is not None:
+                self.rate = min(self.rate, self.max_rate)
+            else:
+                self.max_rate = max(self.max_rate, self.rate)
+            self.burst = max(self.burst, 1.0)
+            self._tokens = min(self._tokens, self.burst)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rate": round(self.rate, 3),
+                "max_rate": self.max_rate,
+                "blocked": self.blocked_count,
+                "total_wait": round(self.total_wait, 3),
+            }
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name):
+    """获取指定接口类别的全局共享限速器（listing / baseinfo / cdn）"""
+    limiter = _limiters.get(name)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(name)
+            if limiter is None:
+                limiter = AdaptiveRateLimiter(name, **DEFAULT_LIMITS.get(name, {}))
+                _limiters[name] = limiter
+    return limiter
+
+
+def configure_limiter(name, **kwargs):
+    get_limiter(name).configure(**kwargs)
+
+
+def delay_limiter(delay):
+    """
+    把“下载延迟（秒）”换算为独立的固定速率限速器，由调用方（一次专辑/批量下载）自己持有，
+    不修改全局共享的 cdn 限速器，运行结束后不留下影响；delay 不大于 0 时返回 None
+    """
+    if not delay or delay <= 0:
+        return None
+    rate = 1.0 / delay
+    return AdaptiveRateLimiter('delay', rate=rate, burst=1, min_rate=rate, max_rate=rate)
+
+
+def limiter_stats():
+    with _limiters_lock:
+        return {name: limiter.stats() for name, limiter in _limiters.items()}
+
+
+def reset_limiters():
+    """丢弃全部限速器状态（主要用于测试）"""
+    with _limiters_lock:
+        _limiters.clear()
+
+# 如需在其他模块调用限速器，请使用：
+# from utils.rate_limiter import get_limiter
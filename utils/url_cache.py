@@ -0,0 +1,175 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+from utils.config import get_env, cache_path
+
+# 播放地址签名参数中可能携带过期时间的字段（秒或毫秒时间戳）
+EXPIRY_PARAMS = ('expires', 'expire', 'deadline', 'e', 'timestamp', 't', 'ts')
+# 默认音质档位：fetch_track_crypted_url 取 playUrlList 的第一项
+DEFAULT_QUALITY = 0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    track_id INTEGER NOT NULL,
+    album_id INTEGER NOT NULL,
+    quality INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (track_id, album_id, quality)
+);
+CREATE INDEX IF NOT EXISTS idx_urls_expires ON urls(expires_at);
+"""
+
+
+class UrlExpiredError(Exception):
+    """CDN 返回 403/410，说明缓存的播放地址已过期或签名失效"""
+    pass
+
+
+def url_expiry(url, default_ttl=3600, now=None):
+    """
+    从播放地址的签名参数推算过期时间（Unix 秒）：参数值在未来视为过期时间，
+    在过去视为签发时间并加上 default_ttl；找不到时按当前时间 + default_ttl
+    """
+    now = time.time() if now is None else now
+    try:
+        query = parse_qs(urlparse(url).query)
+    except ValueError:
+        query = {}
+    for name in EXPIRY_PARAMS:
+        for key in (name, name.upper(), name.capitalize()):
+            values = query.get(key)
+            if not values or not values[0].isdigit():
+                continue
+            value = int(values[0])
+            if value > 10 ** 12:
+                value /= 1000  # 毫秒时间戳
+            if value < 10 ** 9:
+                continue  # 不是时间戳（例如时长、序号）
+            return value if value > now else value + default_ttl
+    return now + default_ttl
+
+
+class UrlCache:
+    """
+    已解析播放地址缓存，以 (trackId, albumId, qualityLevel) 为键并记录过期时间：
+    内存 LRU 一层，可选的 SQLite 磁盘一层（重启后仍可命中），线程安全。
+    下载时 CDN 返回 403/410 应调用 invalidate 丢弃该地址
+    """
+    def __init__(self, path=None, max_entries=2048, default_ttl=3600, margin=60):
+        self.path = path
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.margin = margin  # 距过期不足该秒数时视为已过期，避免下载途中失效
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._conn = None
+        self.hits = 0
+        self.misses = 0
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            with self._conn:
+                self._conn.execute('PRAGMA journal_mode=WAL')
+                self._conn.executescript(SCHEMA)
+                # 启动时清理已过期的地址
+                self._conn.execute('DELETE FROM urls WHERE expires_at <= ?', (time.time(),))
+
+    @staticmethod
+    def _key(track_id, album_id, quality):
+        return int(track_id), int(album_id or 0), int(quality)
+
+    def _remember(self, key, url, expires_at):
+        self._memory[key] = (url, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, track_id, album_id=None, quality=DEFAULT_QUALITY):
+        """返回未过期的播放地址，没有则返回 None"""
+        key = self._key(track_id, album_id, quality)
+        deadline = time.time() + self.margin
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None and self._conn is not None:
+                row = self._conn.execute(
+                    'SELECT url, expires_at FROM urls WHERE track_id = ? AND album_id = ? AND quality = ?', key).fetchone()
+                if row:
+                    entry = (row[0], row[1])
+                    self._remember(key, *entry)
+            if entry is None or entry[1] <= deadline:
+                if entry is not None:
+                    self._discard(key)
+                self.misses += 1
+                return None
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, track_id, album_id, url, quality=DEFAULT_QUALITY, expires_at=None):
+        if not url:
+            return
+        key = self._key(track_id, album_id, quality)
+        expires_at = expires_at or url_expiry(url, self.default_ttl)
+        with self._lock:
+            self._remember(key, url, expires_at)
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute('INSERT OR REPLACE INTO urls VALUES (?, ?, ?, ?, ?)', key + (url, expires_at))
+
+    def _discard(self, key):
+        self._memory.pop(key, None)
+        if self._conn is not None:
+            with self._conn:
+                self._conn.execute('DELETE FROM urls WHERE track_id = ? AND album_id = ? AND quality = ?', key)
+
+    def invalidate(self, track_id, album_id=None, quality=DEFAULT_QUALITY):
+        with self._lock:
+            self._discard(self._key(track_id, album_id, quality))
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._memory), 'hits': self.hits, 'misses': self.misses}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_url_cache():
+    """
+    全局共享的播放地址缓存，默认位于用户缓存目录（见 utils.config.cache_path），
+    磁盘位置可通过 XIMALAYA_URL_CACHE 配置，设为空字符串则只用内存
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                path = get_env('XIMALAYA_URL_CACHE', cache_path('url_cache.db'))
+                try:
+                    _cache = UrlCache(path or None)
+                except (OSError, sqlite3.Error):
+                    # 缓存位置不可写（例如定时任务的环境）时只缓存在内存中，不影响下载
+                    _cache = UrlCache()
+    return _cache
+
+
+def set_url_cache(cache):
+    """替换全局缓存（例如测试中使用纯内存缓存）"""
+    global _cache
+    with _cache_lock:
+        if _cache is not None and _cache is not cache:
+            _cache.close()
+        _cache = cache
+
+# 如需在其他模块调用播放地址缓存，请使用：
+# from utils.url_cache import get_url_cache, UrlExpiredError
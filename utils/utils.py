@@ -1,28 +1,102 @@
-from Crypto.Cipher  import AES
 import base64
+import binascii
+import threading
+from utils import metrics
 
 # 使用 bytes.fromhex 将十六进制字符串转换为字节
 key = bytes.fromhex("aaad3e4fd540b0f79dca95606e72bf93")
+# AES 分组长度（字节）
+BLOCK_SIZE = 16
 
 
+class Decryptor:
+    """
+    播放地址解密器：AES ECB 对象只创建一次并复用（ECB 无链式状态，可多线程共用），
+    decrypt_many 把一批密文拼接后一次解密，再按长度切分
+    """
+    def __init__(self, key=key):
+        from Crypto.Cipher import AES
+        self.cipher = AES.new(key, AES.MODE_ECB)
+
+    @staticmethod
+    def decode(ciphertext):
+        """Base64url 解码 (添加填充以确保长度为4的倍数)，长度不是分组大小整数倍时抛出 ValueError"""
+        try:
+            data = base64.urlsafe_b64decode(ciphertext + "==")
+        except (binascii.Error, ValueError) as e:
+            raise ValueError(f"密文不是有效的Base64: {e}")
+        if not data or len(data) % BLOCK_SIZE:
+            raise ValueError(f"密文长度无效: {len(data)}")
+        return data
+
+    @staticmethod
+    def unpad(decrypted):
+        """校验并去除 PKCS#7 填充"""
+        pad_len = decrypted[-1]
+        if not 1 <= pad_len <= BLOCK_SIZE or decrypted[-pad_len:] != bytes([pad_len]) * pad_len:
+            raise ValueError("PKCS#7 填充无效")
+        return decrypted[:-pad_len]
+
+    def decrypt(self, ciphertext):
+        """解密单个密文，输入无效时抛出 ValueError"""
+        return self.unpad(self.cipher.decrypt(self.decode(ciphertext))).decode('utf-8')
+
+    def decrypt_many(self, ciphertexts):
+        """
+        批量解密，返回与输入一一对应的列表；空值或无效密文对应 ''，不影响其余结果
+        """
+        results = [''] * len(ciphertexts)
+        chunks = []
+        spans = []
+        offset = 0
+        for i, ciphertext in enumerate(ciphertexts):
+            if not ciphertext:
+                continue
+            try:
+                data = self.decode(ciphertext)
+            except ValueError:
+                continue
+            chunks.append(data)
+            spans.append((i, offset, offset + len(data)))
+            offset += len(data)
+        if not chunks:
+            return results
+        decrypted = self.cipher.decrypt(b''.join(chunks))
+        for i, start, end in spans:
+            try:
+                results[i] = self.unpad(decrypted[start:end]).decode('utf-8')
+            except (ValueError, UnicodeDecodeError):
+                pass
+        return results
+
+
+_decryptor = None
+_decryptor_lock = threading.Lock()
+
+
+def get_decryptor():
+    """全局共享的解密器，第一次解密时才导入 Crypto 并创建 AES 对象"""
+    global _decryptor
+    if _decryptor is None:
+        with _decryptor_lock:
+            if _decryptor is None:
+                _decryptor = Decryptor()
+    return _decryptor
+
+
+@metrics.timed('decrypt')
 def decrypt_url(ciphertext):
     if not ciphertext:
         return ''
-    # Base64url 解码 (添加填充以确保长度为4的倍数)
     try:
-        ciphertext_bytes = base64.urlsafe_b64decode(ciphertext + "==")
-    except Exception:
+        return get_decryptor().decrypt(ciphertext)
+    except (ValueError, UnicodeDecodeError):
         return ''
-    # 创建 AES ECB 模式的密钥
-    cipher = AES.new(key, AES.MODE_ECB)
-    # 解密密文
-    decrypted = cipher.decrypt(ciphertext_bytes)
-    if not decrypted:
-        return ''
-    pad_len = decrypted[-1]
-    decrypted = decrypted[:-pad_len]
-    # 将字节转换为字符串
-    return decrypted.decode('utf-8')
 
-# 如需在其他模块调用 decrypt_url，请使用：
-# from utils.utils import decrypt_url
\ No newline at end of file
+
+@metrics.timed('decrypt')
+def decrypt_many(ciphertexts):
+    return get_decryptor().decrypt_many(ciphertexts)
+
+# 如需在其他模块调用 decrypt_url / decrypt_many，请使用：
+# from utils.utils import decrypt_url, decrypt_many
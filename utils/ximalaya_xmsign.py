@@ -1,49 +1,125 @@
-import requests
 import time
 import hashlib
 import random
-import json
-import urllib3
-import os
-from dotenv import load_dotenv
+import threading
+from utils import http_client
+from utils.config import get_env
 
-# 禁用 InsecureRequestWarning
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-# 加载环境变量
-load_dotenv()
+class XmSigner:
+    """
+    xm-sign 签名器：只在首次使用、超过 ttl 秒或签名被服务器拒绝时请求一次服务器时间，
+    记录服务器与本机的时钟差，之后的签名都在本地推算，线程安全，可被多个下载线程共用。
+    use_server_time=False 时直接使用本机时间（即 xm-demo.py 中 XimalayaSign 的做法），不发任何请求
+    """
+    def __init__(self, server_time_url=None, ttl=600, use_server_time=True):
+        self.server_time_url = server_time_url or get_env("XIMALAYA_SERVER_TIME_URL")
+        self.ttl = ttl
+        self.use_server_time = use_server_time
+        self._lock = threading.Lock()
+        self._offset = None  # 服务器时间 - 本机时间（毫秒）
+        self._synced_at = 0.0
+        self.sync_count = 0
+
+    def _fetch_offset(self, headers=None):
+        start = time.time()
+        response = http_client.get(self.server_time_url, "sign", headers=headers)
+        end = time.time()
+        server_time = int(response.text.strip())
+        # 以请求往返的中点作为服务器返回时间对应的本机时间
+        return server_time - round((start + end) / 2 * 1000)
+
+    def offset(self, headers=None):
+        """服务器与本机的时钟差（毫秒），过期时重新同步"""
+        if not self.use_server_time:
+            return 0
+        with self._lock:
+            if self._offset is None or time.monotonic() - self._synced_at >= self.ttl:
+                try:
+                    self._offset = self._fetch_offset(headers)
+                    self.sync_count += 1
+                except Exception as e:
+                    # 同步失败时沿用旧的时钟差，没有可用值才抛出
+                    if self._offset is None:
+                        raise
+                    print(f"同步服务器时间失败，沿用上次的时钟差: {e}")
+                self._synced_at = time.monotonic()
+            return self._offset
+
+    def invalidate(self):
+        """签名被服务器拒绝时调用，下次签名前重新同步服务器时间"""
+        with self._lock:
+            self._offset = None
+
+    def sign(self, headers=None):
+        """生成 xm-sign：md5(himalaya-服务器时间)(随机数)服务器时间(随机数)本机时间"""
+        offset = self.offset(headers)
+        now_time = round(time.time() * 1000)
+        server_time = str(now_time + offset)
+        return hashlib.md5("himalaya-{}".format(server_time).encode()).hexdigest() + "({})".format(
+            round(random.random() * 100)) + server_time + "({})".format(round(random.random() * 100)) + str(now_time)
+
+    def sign_headers(self, headers):
+        headers["xm-sign"] = self.sign(headers)
+        return headers
+
+
+_signer = None
+_signer_lock = threading.Lock()
+
+
+def get_signer():
+    """获取全局共享的签名器"""
+    global _signer
+    if _signer is None:
+        with _signer_lock:
+            if _signer is None:
+                _signer = XmSigner()
+    return _signer
 
-# 从环境变量获取配置
-SERVER_TIME_URL = os.getenv("XIMALAYA_SERVER_TIME_URL")
-USER_AGENT = os.getenv("XIMALAYA_USER_AGENT")
 
 # 獲取sign簽名
 
 def get_sign(headers):
-    serverTimeUrl = SERVER_TIME_URL
-    response = requests.get(serverTimeUrl, headers=headers, verify=False)
-    serverTime = response.text
-    nowTime = str(round(time.time() * 1000))
-
-    sign = str(hashlib.md5("himalaya-{}".format(serverTime).encode()).hexdigest()) + "({})".format(
-        str(round(random.random() * 100))) + serverTime + "({})".format(str(round(random.random() * 100))) + nowTime
-    headers["xm-sign"] = sign
-    return headers
+    return get_signer().sign_headers(headers)
 
 
 def get_header():
     headers = {
-        "User-Agent": USER_AGENT
+        "User-Agent": get_env("XIMALAYA_USER_AGENT")
     }
     headers = get_sign(headers)
     return headers
 
 
-# 如需在其他模块调用 get_sign/get_header，请使用：
-# from utils.ximalaya_xmsign import get_sign, get_header
+def _sign_rejected(response):
+    """接口拒绝签名：HTTP 401/403，或返回体 ret 为失败值（1001 是风控，由各抓取器处理）"""
+    if response.status_code in (401, 403):
+        return True
+    try:
+        data = response.json()
+    except ValueError:
+        return False
+    return isinstance(data, dict) and data.get("ret") not in (None, 0, 200, 1001)
+
+
+def signed_get(url, family="api", headers=None, signer=None, **kwargs):
+    """
+    带 xm-sign 的请求。签名被拒绝时说明时钟差已过期，作废后重新同步服务器时间再试一次
+    """
+    signer = signer or get_signer()
+    response = http_client.get(url, family, headers=signer.sign_headers(dict(headers or {})), **kwargs)
+    if _sign_rejected(response):
+        signer.invalidate()
+        response = http_client.get(url, family, headers=signer.sign_headers(dict(headers or {})), **kwargs)
+    return response
+
+
+# 如需在其他模块调用 get_sign/get_header/signed_get，请使用：
+# from utils.ximalaya_xmsign import get_sign, get_header, get_signer, signed_get
 
 if __name__ == '__main__':
     # 這是一個搜索接口
     url = "https://www.ximalaya.com/revision/search/main?core=all&spellchecker=true&device=iPhone&kw=%E9%9B%AA%E4%B8%AD%E6%82%8D%E5%88%80%E8%A1%8C&page=1&rows=20&condition=relation&fq=&paidFilter=false"
-    s = requests.get(url, headers=get_header(), verify=False)
+    s = signed_get(url, headers={"User-Agent": get_env("XIMALAYA_USER_AGENT")}, verify=False)
     print(s.json())